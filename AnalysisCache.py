@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from Timings import phase
+
+# bump it whenever the layout of a cached result changes
+FORMAT_VERSION = 7
+
+class AnalysisCache:
+    def __init__(self, cacheDir=None, maxSize=256 << 20):
+        if cacheDir is None:
+            cacheDir = os.environ.get("MEMORYLAYOUT_CACHE_DIR")
+        if cacheDir is None:
+            cacheDir = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "memoryLayout")
+        self.cacheDir = cacheDir
+        self.maxSize = maxSize
+
+    def entryPath(self, name):
+        return os.path.join(self.cacheDir, name)
+
+    def read(self, name):
+        path = self.entryPath(name)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            # the modification time tracks the last use, for the LRU eviction
+            os.utime(path)
+            return value
+        except Exception:
+            # missing, truncated or written by another version: computed again
+            return None
+
+    def write(self, name, value):
+        tmpPath = None
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=self.cacheDir, prefix=".tmp-")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, self.entryPath(name))
+            tmpPath = None
+        except OSError:
+            return
+        finally:
+            # a failed write (disk full, unpicklable value) leaves no temporary file
+            if tmpPath is not None:
+                try:
+                    os.remove(tmpPath)
+                except OSError:
+                    pass
+        self.evict()
+
+    def fileDigest(self, fileName):
+        if fileName is None:
+            return ""
+        # hashing is skipped while the file is unchanged since the last time
+        stat = os.stat(fileName)
+        statKey = "%s:%d:%d:%d" % (os.path.abspath(fileName), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        statName = "s-" + hashlib.sha256(statKey.encode("utf-8")).hexdigest()
+        digest = self.read(statName)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(fileName, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+            self.write(statName, digest)
+        return digest
+
+    def key(self, kind, files, params=None):
+        keyData = json.dumps([FORMAT_VERSION, kind, [self.fileDigest(fileName) for fileName in files], params], sort_keys=True)
+        return "r-" + hashlib.sha256(keyData.encode("utf-8")).hexdigest()
+
+    def lookup(self, kind, files, params, compute):
+        try:
+            with phase("cache key"):
+                name = self.key(kind, files, params)
+        except OSError:
+            return compute()
+        with phase("cache read " + kind):
+            value = self.read(name)
+        if value is None:
+            value = compute()
+            with phase("cache write " + kind):
+                self.write(name, value)
+        return value
+
+    def evict(self):
+        try:
+            entries = []
+            totalSize = 0
+            for entry in os.scandir(self.cacheDir):
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                    totalSize += stat.st_size
+            if totalSize <= self.maxSize:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                os.remove(path)
+                totalSize -= size
+                if totalSize <= self.maxSize:
+                    break
+        except OSError:
+            pass
@@ -0,0 +1,254 @@
+import mmap
+import multiprocessing
+import os
+import re
+from array import array
+from IntervalIndex import IntervalIndex
+from MapParser import MapParser
+from SymbolTable import StringTable
+from Timings import phase
+
+# map files smaller than this are parsed in a single process
+SHARD_SIZE = 4 << 20
+
+# output section headers, at column 0, with the address and size on the same
+# line or on the next one when the name is long (or on none when the section is
+# empty); sections loaded elsewhere carry their load address:
+# .data           0x20000000       0x1c load address 0x600165a0
+patternOutputSection = re.compile(rb"^(\.[^\s]*|[^\s]+(?=(?:[ \t]*\r?\n)?[ \t]+0x))(?:(?:[ \t]*\r?\n)?[ \t]+0x([0-9a-fA-F]+)[ \t]+0x([0-9a-fA-F]+)(?:[ \t]+load address 0x([0-9a-fA-F]+))?)?", re.M)
+
+def splitObject(objectFile):
+    # "/path/libfoo.a(bar.o)" -> ("/path/libfoo.a", "bar.o"), plain objects have no archive
+    if objectFile.endswith(")") and "(" in objectFile:
+        index = objectFile.index("(")
+        return objectFile[:index], objectFile[index + 1:-1]
+    return "", objectFile
+
+def _attributeChunk(mapFile, start, end, regions):
+    # the input section entries of [start, end) of the memory map, which starts at
+    # an output section header: (columns, strings, totals) with codes local to
+    # the chunk and totals {(region, archive, member, section, load): [entries, size]}
+    regionIndex = IntervalIndex.fromRegions(regions)
+    result = AttributionResult(regions)
+    strings = result.strings
+    columns = result.columns
+    totals = result.totals
+    objects = {}
+    with open(mapFile, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            headers = [(matchObj.start(), matchObj.group(1).decode("utf-8"), matchObj.group(2), matchObj.group(4))
+                       for matchObj in patternOutputSection.finditer(data, start, end)]
+            headerIndex = -1
+            outputCode = strings["output"].intern("")
+            loadOffset = None
+            for matchObj in MapParser.patternMemMapEntry.finditer(data, start, end):
+                sectionName, addr, dim, objectFile = matchObj.groups()
+                dim = int(dim, 16)
+                if 0 == dim:
+                    continue
+                position = matchObj.start()
+                if headerIndex + 1 < len(headers) and headers[headerIndex + 1][0] < position:
+                    while headerIndex + 1 < len(headers) and headers[headerIndex + 1][0] < position:
+                        headerIndex += 1
+                    _, outputName, outputAddr, loadAddr = headers[headerIndex]
+                    outputCode = strings["output"].intern(outputName)
+                    loadOffset = int(loadAddr, 16) - int(outputAddr, 16) if loadAddr and outputAddr else None
+                codes = objects.get(objectFile)
+                if codes is None:
+                    archive, member = splitObject(objectFile.decode("utf-8"))
+                    codes = objects[objectFile] = (strings["archive"].intern(archive), strings["member"].intern(member))
+                sectionCode = strings["section"].intern(sectionName.decode("utf-8"))
+                addr = int(addr, 16)
+                # the image of an initialized section counts in its load region too
+                placements = ((addr, 0),) if loadOffset is None else ((addr, 0), (addr + loadOffset, 1))
+                for placedAddr, load in placements:
+                    regionCode = strings["region"].intern(regionIndex.find(placedAddr, "unknown"))
+                    columns["addr"].append(placedAddr)
+                    columns["size"].append(dim)
+                    columns["archive"].append(codes[0])
+                    columns["member"].append(codes[1])
+                    columns["section"].append(sectionCode)
+                    columns["output"].append(outputCode)
+                    columns["region"].append(regionCode)
+                    columns["load"].append(load)
+                    total = totals.get((regionCode, codes[0], codes[1], sectionCode, load))
+                    if total is None:
+                        total = totals[(regionCode, codes[0], codes[1], sectionCode, load)] = [0, 0]
+                    total[0] += 1
+                    total[1] += dim
+    return columns, dict((name, table.strings) for name, table in strings.items()), totals
+
+class AttributionResult:
+    # One row per input section entry of the memory map (two for the initialized
+    # ones: at their run address and, flagged load, at their load address), with
+    # archive, member, input section, output section and region interned as in
+    # SymbolTable, and the totals of every (region, archive, member, section).
+    GROUP_KEYS = ('region', 'archive', 'library', 'object', 'section', 'output')
+    # column name, array typecode, interned
+    COLUMNS = ( ("addr", 'Q', False),
+                ("size", 'Q', False),
+                ("archive", 'I', True),
+                ("member", 'I', True),
+                ("section", 'I', True),
+                ("output", 'I', True),
+                ("region", 'I', True),
+                ("load", 'B', False))
+
+    def __init__(self, regions=()):
+        self.strings = dict((name, StringTable()) for name, _, interned in self.COLUMNS if interned)
+        self.columns = dict((name, array(typecode)) for name, typecode, _ in self.COLUMNS)
+        self.totals = {}
+        # the region codes follow the memory configuration
+        for regionName in regions:
+            self.strings["region"].intern(regionName)
+
+    def merge(self, columns, strings, totals):
+        # appends the result of a chunk, translating its codes
+        translations = {}
+        for name, chunkStrings in strings.items():
+            intern = self.strings[name].intern
+            translations[name] = [intern(string) for string in chunkStrings]
+        for name, _, interned in self.COLUMNS:
+            translation = translations.get(name)
+            if interned and any(code != index for index, code in enumerate(translation)):
+                self.columns[name].extend(array(self.columns[name].typecode, (translation[code] for code in columns[name])))
+            else:
+                self.columns[name].extend(columns[name])
+        regions, archives, members, sections = (translations[name] for name in ("region", "archive", "member", "section"))
+        for (region, archive, member, section, load), (entries, size) in totals.items():
+            key = (regions[region], archives[archive], members[member], sections[section], load)
+            total = self.totals.get(key)
+            if total is None:
+                self.totals[key] = [entries, size]
+            else:
+                total[0] += entries
+                total[1] += size
+
+    def __len__(self):
+        return len(self.columns["addr"])
+
+    def __getitem__(self, index):
+        row = {}
+        for name, _, interned in self.COLUMNS:
+            value = self.columns[name][index]
+            row[name] = self.strings[name].strings[value] if interned else value
+        row["load"] = bool(row["load"])
+        return row
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def totalNames(self):
+        # (region, archive, library, object, section, entries, size) per total,
+        # the image of a section at its load address named "section (load)"
+        strings = dict((name, table.strings) for name, table in self.strings.items())
+        libraries = [os.path.basename(archive) for archive in strings["archive"]]
+        for (region, archive, member, section, load), (entries, size) in self.totals.items():
+            sectionName = strings["section"][section] + " (load)" if load else strings["section"][section]
+            yield strings["region"][region], strings["archive"][archive], libraries[archive], strings["member"][member], sectionName, entries, size
+
+    def groupBy(self, key, region=None):
+        # (key, entries, size) per group, biggest groups first, over all the regions or one
+        groups = {}
+        if 'output' == key:
+            regionCode = None if region is None else self.strings["region"].indexes.get(region, -1)
+            outputs = self.strings["output"].strings
+            for code, size, rowRegion in zip(self.columns["output"], self.columns["size"], self.columns["region"]):
+                if regionCode is None or rowRegion == regionCode:
+                    group = groups.setdefault(outputs[code], [0, 0])
+                    group[0] += 1
+                    group[1] += size
+        else:
+            keyIndex = {"region": 0, "archive": 1, "library": 2, "object": 3, "section": 4}[key]
+            for names in self.totalNames():
+                if region is None or names[0] == region:
+                    group = groups.setdefault(names[keyIndex], [0, 0])
+                    group[0] += names[5]
+                    group[1] += names[6]
+        result = [(groupName, entries, size) for groupName, (entries, size) in groups.items()]
+        result.sort(key=lambda group: (-group[2], group[0]))
+        return result
+
+    def tree(self):
+        # {region: {"size", "children": {library: {"size", "children": {object:
+        # {"size", "children": {section: {"size"}}}}}}}}, the regions in memory
+        # configuration order (then "unknown"), the other nodes biggest first
+        root = {}
+        for regionName, _, library, objectName, section, _, size in self.totalNames():
+            nodes = root
+            for name in (regionName, library, objectName, section):
+                node = nodes.get(name)
+                if node is None:
+                    node = nodes[name] = {"size": 0, "children": {}}
+                node["size"] += size
+                nodes = node["children"]
+
+        def sortNodes(nodes):
+            ordered = {}
+            for name, node in sorted(nodes.items(), key=lambda item: (-item[1]["size"], item[0])):
+                if node["children"]:
+                    node["children"] = sortNodes(node["children"])
+                else:
+                    del node["children"]
+                ordered[name] = node
+            return ordered
+        tree = {}
+        for regionName in self.strings["region"].strings:
+            if regionName in root:
+                root[regionName]["children"] = sortNodes(root[regionName]["children"])
+                tree[regionName] = root[regionName]
+        return tree
+
+class AttributionEngine:
+    # Attributes every input section of the memory map of a map file to its
+    # archive, archive member, input and output section and memory region. Big
+    # map files are cut at output section headers and the chunks are parsed and
+    # totalled by a pool of processes; the chunk results are merged in order.
+    def __init__(self, mapFile, regions, jobs=None):
+        self.mapFile = mapFile
+        self.regions = regions
+        self.jobs = jobs
+
+    def chunks(self, jobs):
+        # [start, end) of the memory map cut in about jobs * 4 chunks (for the
+        # balance), each one starting at an output section header
+        with open(self.mapFile, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                return []
+            with data:
+                matchObj = MapParser.patternMemMapIni.search(data)
+                if matchObj is None:
+                    return []
+                start = matchObj.end()
+                matchObj = MapParser.patternMemMapEnd.search(data, start)
+                end = matchObj.end() if matchObj else len(data)
+                count = max(1, min(jobs * 4, (end - start) // SHARD_SIZE)) if jobs > 1 else 1
+                cuts = [start]
+                for index in range(1, count):
+                    matchObj = patternOutputSection.search(data, max(cuts[-1] + 1, start + (end - start) * index // count), end)
+                    if matchObj is None:
+                        break
+                    cuts.append(matchObj.start())
+                cuts.append(end)
+        return [(cuts[index], cuts[index + 1]) for index in range(len(cuts) - 1) if cuts[index] < cuts[index + 1]]
+
+    def compute(self):
+        jobs = self.jobs
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        result = AttributionResult(self.regions)
+        with phase("input sections") as currentPhase:
+            chunks = self.chunks(jobs)
+            if len(chunks) <= 1:
+                chunkResults = [_attributeChunk(self.mapFile, start, end, self.regions) for start, end in chunks]
+            else:
+                with multiprocessing.Pool(min(jobs, len(chunks))) as pool:
+                    chunkResults = pool.starmap(_attributeChunk, [(self.mapFile, start, end, self.regions) for start, end in chunks])
+            for chunkResult in chunkResults:
+                result.merge(*chunkResult)
+            currentPhase.items = len(result)
+        return result
@@ -0,0 +1,137 @@
+import os
+import re
+from collections import deque
+from elftools.elf.constants import SH_FLAGS
+from Firmware import Firmware
+from IntervalIndex import IntervalIndex
+from LayoutEngine import SECTION_CLASSES
+
+# suffixes added by gcc to the clones of a function (or to the split parts of it)
+patternCloneSuffix = re.compile(r"(\.(constprop|isra|part|cold|lto_priv|clone)(\.\d+)?)+$")
+
+def loadBuild(elfFile, mapFile, cache=None, jobs=None):
+    firmware = Firmware(elfFile, mapFile, jobs=jobs, cache=cache)
+    regions = firmware.regions
+    layout = firmware.layout(True).usage
+    symbols = list(firmware.symbolTable.filter(fill=False))
+
+    def retrieveFileSizes():
+        # input sections are counted only if they are part of an allocated output section
+        allocIndex = IntervalIndex((addr, addr + size, name) for name, _, flags, addr, _, size, _ in firmware.sections
+                                   if 0 != (flags & SH_FLAGS.SHF_ALLOC))
+        fileSizes = {}
+        for element in firmware.mapParser.GetMemoryMap():
+            if 0 != element["dim"] and allocIndex.findContaining(element["addr"], element["dim"]) is not None:
+                fileSizes[element["file"]] = fileSizes.get(element["file"], 0) + element["dim"]
+        return fileSizes
+
+    fileSizes = firmware.lookup("fileSizes", (elfFile, mapFile), None, retrieveFileSizes)
+    firmware.close()
+    return {"regions": regions, "layout": layout, "files": fileSizes, "symbols": symbols}
+
+def deltaRow(name, oldSize, newSize, status=None):
+    if status is None:
+        if oldSize is None:
+            status = "added"
+        elif newSize is None:
+            status = "removed"
+        elif oldSize != newSize:
+            status = "changed"
+        else:
+            status = "unchanged"
+    return {"name": name, "old": oldSize or 0, "new": newSize or 0, "delta": (newSize or 0) - (oldSize or 0), "status": status}
+
+class BuildDiff:
+    def __init__(self, oldBuild, newBuild):
+        self.old = oldBuild
+        self.new = newBuild
+
+    def regionDeltas(self):
+        rows = []
+        for regionName in list(self.old["layout"]) + [r for r in self.new["layout"] if r not in self.old["layout"]]:
+            oldUsage = self.old["layout"].get(regionName)
+            newUsage = self.new["layout"].get(regionName)
+            rows.append(deltaRow(regionName, oldUsage and oldUsage["Tot"], newUsage and newUsage["Tot"]))
+        return rows
+
+    def sectionDeltas(self):
+        rows = []
+        for regionName in list(self.old["layout"]) + [r for r in self.new["layout"] if r not in self.old["layout"]]:
+            oldUsage = self.old["layout"].get(regionName)
+            newUsage = self.new["layout"].get(regionName)
+            for sectionClass in SECTION_CLASSES:
+                rows.append(deltaRow("%s/%s" % (regionName, sectionClass),
+                                     oldUsage and oldUsage[sectionClass], newUsage and newUsage[sectionClass]))
+        return rows
+
+    def fileDeltas(self):
+        oldFiles = self.old["files"]
+        newFiles = self.new["files"]
+        rows = [deltaRow(fileName, oldFiles[fileName], newFiles.get(fileName)) for fileName in oldFiles]
+        rows += [deltaRow(fileName, None, newFiles[fileName]) for fileName in newFiles if fileName not in oldFiles]
+        return rows
+
+    def symbolDeltas(self):
+        # symbols are paired with hash joins, from the most to the least strict key;
+        # each pass only sees what is still unpaired
+        def baseName(symbol):
+            return os.path.basename(symbol["file"])
+
+        joins = (
+            (lambda symbol: (symbol["name"], baseName(symbol)), False, None),
+            (lambda symbol: symbol["name"], True, "moved"),
+            (lambda symbol: (patternCloneSuffix.sub("", symbol["name"]), baseName(symbol)), True, "renamed"),
+            (lambda symbol: (symbol["attr"], symbol["dim"], baseName(symbol)), True, "renamed"),
+        )
+        unpairedOld = list(range(len(self.old["symbols"])))
+        unpairedNew = list(range(len(self.new["symbols"])))
+        pairs = []
+        for keyOf, uniqueOnly, status in joins:
+            oldByKey = {}
+            for index in unpairedOld:
+                oldByKey.setdefault(keyOf(self.old["symbols"][index]), deque()).append(index)
+            newCount = {}
+            if uniqueOnly:
+                for index in unpairedNew:
+                    key = keyOf(self.new["symbols"][index])
+                    newCount[key] = newCount.get(key, 0) + 1
+            stillUnpaired = []
+            for index in unpairedNew:
+                key = keyOf(self.new["symbols"][index])
+                candidates = oldByKey.get(key)
+                if candidates and (not uniqueOnly or (1 == len(candidates) and 1 == newCount[key])):
+                    # the oldest candidate first, in constant time
+                    pairs.append((candidates.popleft(), index, status))
+                else:
+                    stillUnpaired.append(index)
+            unpairedNew = stillUnpaired
+            pairedOld = set(oldIndex for oldIndex, _, _ in pairs)
+            unpairedOld = [index for index in unpairedOld if index not in pairedOld]
+
+        rows = []
+        for oldIndex, newIndex, status in pairs:
+            oldSymbol = self.old["symbols"][oldIndex]
+            newSymbol = self.new["symbols"][newIndex]
+            if status is None and oldSymbol["region"] != newSymbol["region"]:
+                status = "moved"
+            row = deltaRow(newSymbol["name"], oldSymbol["dim"], newSymbol["dim"], status)
+            if oldSymbol["name"] != newSymbol["name"]:
+                row["oldName"] = oldSymbol["name"]
+            row["region"] = newSymbol["region"]
+            if oldSymbol["region"] != newSymbol["region"]:
+                row["oldRegion"] = oldSymbol["region"]
+            row["file"] = newSymbol["file"]
+            rows.append(row)
+        for index in unpairedOld:
+            symbol = self.old["symbols"][index]
+            row = deltaRow(symbol["name"], symbol["dim"], None)
+            row["region"] = symbol["region"]
+            row["file"] = symbol["file"]
+            rows.append(row)
+        for index in unpairedNew:
+            symbol = self.new["symbols"][index]
+            row = deltaRow(symbol["name"], None, symbol["dim"])
+            row["region"] = symbol["region"]
+            row["file"] = symbol["file"]
+            rows.append(row)
+        return rows
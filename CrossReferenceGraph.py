@@ -0,0 +1,249 @@
+from array import array
+from collections import deque
+from IntervalIndex import IntervalIndex
+from MapParser import MapParser
+from SymbolTable import StringTable
+from Timings import phase
+
+class CrossReferenceGraph:
+    # The cross reference table of the map file as integer ids: the object defining
+    # every symbol and the objects referencing it, and the object graph derived
+    # from them (an object uses another one when it references a symbol defined
+    # there). Objects nothing references are the roots the linker starts from.
+    def __init__(self, crossRefFiles, objectSizes=None, symbolSizes=None):
+        self.objects = StringTable()
+        self.symbols = StringTable()
+        self.definers = array('I')
+        # the objects referencing symbol s are refObjects[refStarts[s]:refStarts[s + 1]]
+        self.refStarts = array('I', [0])
+        self.refObjects = array('I')
+        for name, files in crossRefFiles.items():
+            if not files:
+                continue
+            self.symbols.intern(name)
+            fileIds = [self.objects.intern(fileName) for fileName in files]
+            self.definers.append(fileIds[0])
+            self.refObjects.extend(fileIds[1:])
+            self.refStarts.append(len(self.refObjects))
+
+        objectSizes = objectSizes or {}
+        symbolSizes = symbolSizes or {}
+        self.objectSizes = array('Q', (objectSizes.get(name, 0) for name in self.objects.strings))
+        self.symbolSizes = array('Q', (symbolSizes.get(name, 0) for name in self.symbols.strings))
+
+        # object graph, each edge with the first symbol it comes from
+        objectCount = len(self.objects.strings)
+        self.uses = [[] for _ in range(objectCount)]
+        self.users = [[] for _ in range(objectCount)]
+        self.via = {}
+        for symbol, definer in enumerate(self.definers):
+            for index in range(self.refStarts[symbol], self.refStarts[symbol + 1]):
+                user = self.refObjects[index]
+                edge = (user, definer)
+                if user == definer or edge in self.via:
+                    continue
+                self.via[edge] = symbol
+                self.uses[user].append(definer)
+                self.users[definer].append(user)
+        self.rootList = None
+        self.dominatorTree = None
+
+    @classmethod
+    def fromFiles(cls, mapFile, regions, symbolTable=None, mapParser=None):
+        # object sizes are the input sections placed in the regions, symbol sizes
+        # come from the SymbolTable of MetadataRetriever; mapParser is the parsed
+        # mapFile (memory map and cross reference table) when already available
+        if mapParser is None:
+            with phase("map parse") as currentPhase:
+                mapParser = MapParser(mapFile, (MapParser.MEMORY_MAP, MapParser.CROSS_REFERENCE))
+                currentPhase.items = len(mapParser.GetCrossReferenceFiles())
+        with phase("cross reference graph") as currentPhase:
+            regionIndex = IntervalIndex.fromRegions(regions)
+            objectSizes = {}
+            for element in mapParser.GetMemoryMap():
+                if element["dim"] and regionIndex.find(element["addr"]) is not None:
+                    objectSizes[element["file"]] = objectSizes.get(element["file"], 0) + element["dim"]
+            symbolSizes = {}
+            if symbolTable is not None:
+                for name, _, size in symbolTable.filter(fill=False).groupBy("name"):
+                    symbolSizes[name] = size
+            graph = cls(mapParser.GetCrossReferenceFiles(), objectSizes, symbolSizes)
+            currentPhase.items = len(graph)
+        return graph
+
+    def __len__(self):
+        return len(self.symbols.strings)
+
+    def roots(self):
+        # the objects nothing references; the objects of a cycle nothing else
+        # references are rooted at the first of them
+        if self.rootList is not None:
+            return self.rootList
+        rootList = [obj for obj in range(len(self.users)) if not self.users[obj]]
+        seen = self.closure(rootList)
+        for obj in range(len(self.users)):
+            if obj not in seen:
+                rootList.append(obj)
+                seen |= self.closure([obj])
+        self.rootList = rootList
+        return rootList
+
+    def closure(self, start):
+        # the objects reachable from start (included)
+        seen = set(start)
+        queue = deque(start)
+        while queue:
+            for nextObj in self.uses[queue.popleft()]:
+                if nextObj not in seen:
+                    seen.add(nextObj)
+                    queue.append(nextObj)
+        return seen
+
+    def chain(self, obj):
+        # the shortest chain of references from a root down to obj, as
+        # (object, symbol it references in the next object) pairs
+        rootSet = set(self.roots())
+        parents = {obj: None}
+        queue = deque([obj])
+        while queue:
+            current = queue.popleft()
+            if current in rootSet:
+                break
+            for user in self.users[current]:
+                if user not in parents:
+                    parents[user] = current
+                    queue.append(user)
+        steps = []
+        while current is not None:
+            nextObj = parents[current]
+            steps.append((current, None if nextObj is None else self.via[(current, nextObj)]))
+            current = nextObj
+        return steps
+
+    def dominators(self):
+        # immediate dominator of every object (-1 under the virtual root joining
+        # the roots): the objects whose only way in is through obj are the ones
+        # that would go away with it. Cooper, Harvey and Kennedy, "A Simple, Fast
+        # Dominance Algorithm"
+        if self.dominatorTree is not None:
+            return self.dominatorTree
+        objectCount = len(self.uses)
+        virtualRoot = objectCount
+        rootList = self.roots()
+        successors = self.uses + [rootList]
+        predecessors = [list(users) for users in self.users] + [[]]
+        for root in rootList:
+            predecessors[root].append(virtualRoot)
+
+        # reverse postorder, from an iterative depth first visit
+        order = []
+        visited = bytearray(objectCount + 1)
+        visited[virtualRoot] = 1
+        stack = [(virtualRoot, iter(successors[virtualRoot]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if not visited[child]:
+                    visited[child] = 1
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+        order.reverse()
+        position = [0] * (objectCount + 1)
+        for index, node in enumerate(order):
+            position[node] = index
+
+        idom = [-1] * (objectCount + 1)
+        idom[virtualRoot] = virtualRoot
+        changed = True
+        while changed:
+            changed = False
+            for node in order[1:]:
+                newIdom = -1
+                for pred in predecessors[node]:
+                    if idom[pred] < 0:
+                        continue
+                    if newIdom < 0:
+                        newIdom = pred
+                        continue
+                    # intersect
+                    finger1, finger2 = pred, newIdom
+                    while finger1 != finger2:
+                        while position[finger1] > position[finger2]:
+                            finger1 = idom[finger1]
+                        while position[finger2] > position[finger1]:
+                            finger2 = idom[finger2]
+                    newIdom = finger1
+                if idom[node] != newIdom:
+                    idom[node] = newIdom
+                    changed = True
+
+        exclusive = array('Q', self.objectSizes)
+        for node in reversed(order[1:]):
+            if idom[node] != virtualRoot:
+                exclusive[idom[node]] += exclusive[node]
+        self.dominatorTree = ([-1 if parent == virtualRoot else parent for parent in idom[:objectCount]], exclusive)
+        return self.dominatorTree
+
+    def objectId(self, name):
+        return self.objects.indexes.get(name)
+
+    def symbolId(self, name):
+        return self.symbols.indexes.get(name)
+
+    def whyLinked(self, name):
+        # who references a symbol (or an object) and the chain of references from
+        # a root; None when the name is in the cross reference table as neither
+        symbol = self.symbolId(name)
+        if symbol is not None:
+            obj = self.definers[symbol]
+            referencers = [self.objects.strings[self.refObjects[index]] for index in range(self.refStarts[symbol], self.refStarts[symbol + 1])]
+            report = {"name": name, "kind": "symbol", "size": self.symbolSizes[symbol], "object": self.objects.strings[obj],
+                      "referencedBy": [{"object": referencer, "symbols": [name]} for referencer in referencers]}
+        else:
+            obj = self.objectId(name)
+            if obj is None:
+                return None
+            report = {"name": name, "kind": "object", "size": self.objectSizes[obj], "object": name, "referencedBy": []}
+            # the symbols of obj each user references
+            usedSymbols = {}
+            for definedSymbol, definer in enumerate(self.definers):
+                if definer != obj:
+                    continue
+                for index in range(self.refStarts[definedSymbol], self.refStarts[definedSymbol + 1]):
+                    usedSymbols.setdefault(self.refObjects[index], []).append(self.symbols.strings[definedSymbol])
+            usedSymbols.pop(obj, None)
+            for user in sorted(usedSymbols, key=lambda user: self.objects.strings[user]):
+                report["referencedBy"].append({"object": self.objects.strings[user], "symbols": usedSymbols[user]})
+        steps = self.chain(obj)
+        report["chain"] = [{"object": self.objects.strings[step], "symbol": None if via is None else self.symbols.strings[via]} for step, via in steps]
+        return report
+
+    def attributable(self, name):
+        # the size an object pulls in: everything reachable from it, and what only
+        # it keeps in (the objects it dominates); None for unknown objects
+        obj = self.objectId(name)
+        if obj is None:
+            return None
+        idom, exclusive = self.dominators()
+        reachable = self.closure([obj])
+        dominated = [obj]
+        for other in sorted(reachable):
+            parent = idom[other]
+            while parent >= 0 and parent != obj:
+                parent = idom[parent]
+            if parent == obj:
+                dominated.append(other)
+        return {"object": name, "size": self.objectSizes[obj],
+                "reachable": sum(self.objectSizes[other] for other in reachable), "reachableObjects": len(reachable),
+                "exclusive": exclusive[obj], "exclusiveObjects": sorted(((self.objects.strings[other], self.objectSizes[other]) for other in dominated),
+                                                                        key=lambda item: (-item[1], item[0]))}
+
+    def topAttributable(self, limit=None):
+        # (object, own size, exclusive size) of every object, biggest exclusive size first
+        _, exclusive = self.dominators()
+        rows = [(self.objects.strings[obj], self.objectSizes[obj], exclusive[obj]) for obj in range(len(self.uses))]
+        rows.sort(key=lambda row: (-row[2], row[0]))
+        return rows[:limit] if limit else rows
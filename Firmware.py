@@ -0,0 +1,173 @@
+import mmap
+import struct
+from functools import cached_property
+from Timings import phase
+
+class Firmware:
+    # An elf/map pair: regions, section headers, layout, symbols, cross references
+    # and line table are computed on first access and kept, so scripting several
+    # analyses parses nothing twice. The results go through the AnalysisCache
+    # with the keys the scripts use; the elf file is opened (and mapped) once,
+    # and only on a cache miss. The modules of an analysis are imported when it
+    # is first needed: the regions of a map file do not even load pyelftools.
+    # When the elf embeds an up to date .memory_index (see memIndex.py) the
+    # regions, the layouts and the symbols come from it, with no map file. The
+    # index is looked for only when no map file is given, unless useIndex is True
+    # (False never reads it).
+    def __init__(self, elfFile=None, mapFile=None, nmPrefix="", useNm=False, jobs=None, cache=None, useIndex=None):
+        self.elfFile = elfFile
+        self.mapFile = mapFile
+        self.useIndex = useIndex
+        self.nmPrefix = nmPrefix
+        self.useNm = useNm
+        self.jobs = jobs
+        self.cache = cache
+        self.elfStream = None
+        self.elfMap = None
+        self.layouts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+        return False
+
+    def close(self):
+        # what has been computed stays available, the elf is opened again if needed
+        if self.elfStream is not None:
+            self.__dict__.pop("elf", None)
+            self.elfMap.close()
+            self.elfStream.close()
+            self.elfStream = self.elfMap = None
+
+    def lookup(self, kind, files, params, compute):
+        if self.cache is None:
+            return compute()
+        return self.cache.lookup(kind, files, params, compute)
+
+    @cached_property
+    def elf(self):
+        from elftools.elf.elffile import ELFFile
+        self.elfStream = open(self.elfFile, 'rb')
+        self.elfMap = mmap.mmap(self.elfStream.fileno(), 0, access=mmap.ACCESS_READ)
+        return ELFFile(self.elfMap)
+
+    @cached_property
+    def index(self):
+        # the SymbolIndex embedded in the elf, None when there is none or it is stale;
+        # verifying it hashes the allocated sections, so map based runs skip it
+        if self.elfFile is None or self.useIndex is False or (self.mapFile is not None and not self.useIndex):
+            return None
+        from SymbolIndex import SymbolIndex
+        with phase("index") as currentPhase:
+            try:
+                index = SymbolIndex.fromElf(self.elfFile)
+            except (OSError, ValueError, struct.error):
+                index = None
+            currentPhase.items = 0 if index is None else len(index.symbolTable)
+        return index
+
+    @property
+    def hasSymbols(self):
+        # the symbols need the map file, or the index
+        return self.mapFile is not None or (self.index is not None and not self.useNm)
+
+    @cached_property
+    def mapParser(self):
+        # the memory map and the cross reference table, for symbols and cross references
+        from MapParser import MapParser
+        with phase("map parse") as currentPhase:
+            mapParser = MapParser(self.mapFile, (MapParser.MEMORY_MAP, MapParser.CROSS_REFERENCE))
+            currentPhase.items = len(mapParser.GetMemoryMap())
+        return mapParser
+
+    @cached_property
+    def regions(self):
+        from RegionRetriever import RegionRetriever
+        if self.index is not None:
+            return self.index.regions
+
+        def retrieveRegions():
+            elf = None
+            if self.elfFile is not None:
+                try:
+                    elf = self.elf
+                except Exception:
+                    pass
+            return RegionRetriever(self.elfFile, self.mapFile, None, elf).GetRegions()
+        return self.lookup("regions", (self.elfFile, self.mapFile), None, retrieveRegions)
+
+    @cached_property
+    def engine(self):
+        from LayoutEngine import LayoutEngine
+        return LayoutEngine(self.elfFile, self.elf)
+
+    @property
+    def sections(self):
+        return self.engine.sections
+
+    @property
+    def loadSegments(self):
+        return self.engine.loadSegments
+
+    def layout(self, rodata=False):
+        if rodata not in self.layouts and self.index is not None:
+            self.layouts[rodata] = self.index.layout(rodata)
+        if rodata not in self.layouts:
+            self.layouts[rodata] = self.lookup("layout", (self.elfFile,), [self.regions, rodata],
+                                               lambda: self.engine.compute(self.regions, rodata))
+        return self.layouts[rodata]
+
+    @property
+    def symbols(self):
+        # a view over the symbol table: iterating it yields the symbols as dicts
+        return self.symbolTable
+
+    @cached_property
+    def symbolTable(self):
+        from MetadataRetriever import MetadataRetriever
+        if self.index is not None and not self.useNm:
+            return self.index.symbolTable
+
+        def retreiveSymbolTable():
+            # with nm the map file is parsed while nm runs, unless it already is
+            mapParser = self.__dict__.get("mapParser") if self.useNm else self.mapParser
+            return MetadataRetriever(self.elfFile, self.mapFile, self.regions, self.nmPrefix, self.useNm, self.jobs,
+                                     None, None if self.useNm else self.elf, mapParser).retreiveSymbolTable()
+        return self.lookup("symbols", (self.elfFile, self.mapFile), MetadataRetriever.cacheParams(self.regions, self.nmPrefix, self.useNm),
+                           retreiveSymbolTable)
+
+    @cached_property
+    def crossReference(self):
+        from MetadataRetriever import MetadataRetriever
+        from CrossReferenceGraph import CrossReferenceGraph
+        return self.lookup("xref", (self.elfFile, self.mapFile), MetadataRetriever.cacheParams(self.regions, self.nmPrefix, self.useNm),
+                           lambda: CrossReferenceGraph.fromFiles(self.mapFile, self.regions, self.symbolTable, self.mapParser))
+
+    @cached_property
+    def lineRanges(self):
+        from LineRetriever import LineRetriever
+
+        def retrieveLineRanges():
+            with phase("debug info") as currentPhase:
+                lineRanges = LineRetriever(self.elfFile, self.jobs).lineRanges
+                currentPhase.items = len(lineRanges)
+            return lineRanges
+        return self.lookup("lines", (self.elfFile,), None, retrieveLineRanges)
+
+    @cached_property
+    def attribution(self):
+        from AttributionEngine import AttributionEngine
+        return self.lookup("attribution", (self.mapFile,), [self.regions],
+                           lambda: AttributionEngine(self.mapFile, self.regions, self.jobs).compute())
+
+    @cached_property
+    def thumb(self):
+        # ARM images may have thumb functions, whose address has bit 0 set
+        return 'EM_ARM' == self.elf['e_machine']
+
+    @cached_property
+    def gaps(self):
+        from GapAnalyzer import GapAnalyzer
+        return GapAnalyzer(self.regions, self.engine, self.symbolTable if self.hasSymbols else None, self.thumb)
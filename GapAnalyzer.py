@@ -0,0 +1,174 @@
+from elftools.elf.constants import SH_FLAGS
+from IntervalIndex import IntervalIndex
+from SymbolTable import CODE_TYPES
+
+def alignUp(addr, align):
+    return (addr + align - 1) // align * align if align > 1 else addr
+
+class GapAnalyzer:
+    # Sweep line over the sorted section and symbol intervals of each region. A
+    # single pass keeps the end of what has been covered so far (the farthest end,
+    # not the end of the previous interval, so nested and aliased intervals do
+    # not open bogus gaps) and classifies every gap: alignment padding when the
+    # next section starts at the first aligned address, a free hole otherwise.
+    # Between the symbols of a section the gaps are fill.
+    def __init__(self, memConf, engine, symbolTable=None, thumb=False):
+        self.memConf = memConf
+        self.thumb = thumb
+        regionIndex = IntervalIndex.fromRegions(memConf)
+        # later segments must win, as in LayoutEngine.computeResult()
+        segmentIndex = IntervalIndex((segment[0], segment[0] + segment[4], index)
+                                     for index, segment in reversed(list(enumerate(engine.loadSegments))))
+        # (start, end, name, align) per region: the sections at their run address
+        # and the images of the initialized ones at their load address
+        self.ranges = {regionName: [] for regionName in memConf}
+        for name, sectionType, flags, addr, offset, size, align in engine.sections:
+            if 0 == (flags & SH_FLAGS.SHF_ALLOC) or 0 == size:
+                continue
+            regionName = regionIndex.find(addr)
+            if regionName is not None:
+                self.ranges[regionName].append((addr, addr + size, name, align))
+            if 'SHT_NOBITS' != sectionType:
+                segment = engine.findLoadSegment(segmentIndex, addr, offset, size)
+                if segment is not None:
+                    loadAddr = segment[1] + addr - segment[0]
+                    regionName = regionIndex.find(loadAddr)
+                    if regionName is not None:
+                        self.ranges[regionName].append((loadAddr, loadAddr + size, name + " (load)", align))
+        for ranges in self.ranges.values():
+            ranges.sort(key=lambda item: (item[0], -item[1]))
+
+        # (start, end, row) of the symbols per region, fill entries excluded
+        self.table = symbolTable
+        self.symbols = {regionName: [] for regionName in memConf}
+        if symbolTable is not None:
+            columns = symbolTable.columns
+            attrs = symbolTable.strings["attr"].strings
+            regionNames = symbolTable.strings["region"].strings
+            for row, (addr, dim, fill, regionCode, attrCode) in enumerate(zip(columns["addr"], columns["dim"], columns["fill"],
+                                                                               columns["region"], columns["attr"])):
+                if fill or 0 == dim or regionNames[regionCode] not in self.symbols:
+                    continue
+                if thumb and addr & 1 and attrs[attrCode] in CODE_TYPES:
+                    addr -= 1
+                self.symbols[regionNames[regionCode]].append((addr, addr + dim, row))
+            for symbols in self.symbols.values():
+                symbols.sort(key=lambda item: (item[0], -item[1]))
+        # the section sweep of each region, done once for analyzeRegion() and fit()
+        self.sweeps = {}
+
+    def analyze(self, limit=None):
+        return {regionName: self.analyzeRegion(regionName, limit) for regionName in self.memConf}
+
+    def analyzeRegion(self, regionName, limit=None):
+        # one report per region; holes are listed biggest first, at most limit of
+        # them (and of the overlaps), all when limit is None
+        origin = self.memConf[regionName]["Origin"]
+        regionEnd = origin + self.memConf[regionName]["Length"]
+        report = {"Origin": origin, "Length": regionEnd - origin}
+        holes, overlaps, covered, used, padding, cursor = self.sweepSections(regionName)
+        free = sum(size for _, size in holes)
+        largest = max(holes, key=lambda hole: (hole[1], -hole[0])) if holes else (regionEnd, 0)
+        report["used"] = used
+        report["padding"] = padding
+        report["free"] = free
+        report["overflow"] = max(cursor - regionEnd, 0)
+        report["holes"] = len(holes)
+        report["largestFree"] = {"addr": largest[0], "size": largest[1]}
+        report["fragmentation"] = 1 - largest[1] / free if free else 0.0
+        holes = sorted(holes, key=lambda hole: (-hole[1], hole[0]))
+        report["holeList"] = [{"addr": addr, "size": size} for addr, size in holes[:limit]]
+        report["sectionOverlaps"] = overlaps[:limit]
+
+        if self.table is not None:
+            report.update(self.sweepSymbols(self.symbols[regionName], covered, limit))
+        return report
+
+    def sweepSections(self, regionName):
+        # holes (address order), padding and overlaps of the sections of a region,
+        # plus the merged covered intervals the symbol sweep needs to tell fill
+        # from holes; kept per region
+        sweep = self.sweeps.get(regionName)
+        if sweep is not None:
+            return sweep
+        origin = self.memConf[regionName]["Origin"]
+        regionEnd = origin + self.memConf[regionName]["Length"]
+        covered = []
+        holes = []
+        overlaps = []
+        used = padding = 0
+        cursor = origin
+        ownerName = None
+        for start, end, name, align in self.ranges[regionName]:
+            if start > cursor:
+                if alignUp(cursor, align) == start:
+                    padding += start - cursor
+                    # symbols on the two sides of the padding are still neighbours
+                    if covered:
+                        covered[-1][1] = start
+                else:
+                    holes.append((cursor, start - cursor))
+            elif start < cursor:
+                overlaps.append({"name": name, "with": ownerName, "addr": start, "size": min(end, cursor) - start})
+            if not covered or start > covered[-1][1]:
+                covered.append([start, end])
+            elif end > covered[-1][1]:
+                covered[-1][1] = end
+            if end > cursor:
+                used += end - max(start, cursor)
+                cursor = end
+                ownerName = name
+        if cursor < regionEnd:
+            holes.append((cursor, regionEnd - cursor))
+        sweep = self.sweeps[regionName] = (holes, overlaps, covered, used, padding, cursor)
+        return sweep
+
+    def sweepSymbols(self, symbols, covered, limit):
+        # symbol bytes (overlaps counted once), fill between the symbols of the
+        # same covered interval, exact aliases and partial or nested overlaps
+        names = self.table.strings["name"].strings
+        nameCodes = self.table.columns["name"]
+        symbolBytes = fill = fills = largestFill = aliases = overlapBytes = 0
+        overlaps = []
+        cursor = None
+        lastStart = lastEnd = None
+        owner = None
+        position = 0
+        for start, end, row in symbols:
+            if cursor is None:
+                symbolBytes += end - start
+            elif start < cursor:
+                if start == lastStart and end == lastEnd:
+                    aliases += 1
+                else:
+                    overlapBytes += min(end, cursor) - start
+                    overlaps.append({"name": names[nameCodes[row]], "with": names[nameCodes[owner]], "addr": start, "size": min(end, cursor) - start})
+                if end > cursor:
+                    symbolBytes += end - cursor
+            else:
+                symbolBytes += end - start
+                if start > cursor:
+                    # the covered interval holding the end of the previous symbols
+                    while position < len(covered) and covered[position][1] <= cursor:
+                        position += 1
+                    if position < len(covered) and covered[position][0] <= cursor and start <= covered[position][1]:
+                        fill += start - cursor
+                        fills += 1
+                        largestFill = max(largestFill, start - cursor)
+            lastStart, lastEnd = start, end
+            if cursor is None or end > cursor:
+                cursor = end
+                owner = row
+        overlaps.sort(key=lambda overlap: (-overlap["size"], overlap["addr"]))
+        return {"symbolBytes": symbolBytes, "fill": fill, "fillGaps": fills, "largestFill": largestFill,
+                "aliases": aliases, "overlaps": len(overlaps), "overlapBytes": overlapBytes, "overlapList": overlaps[:limit]}
+
+    def fit(self, regionName, size, align=1):
+        # the smallest hole of the region where size bytes aligned to align fit
+        # (best fit), as (aligned address, hole size); None when none does
+        best = None
+        for holeAddr, holeSize in self.sweepSections(regionName)[0]:
+            addr = alignUp(holeAddr, align)
+            if addr + size <= holeAddr + holeSize and (best is None or holeSize < best[1]):
+                best = (addr, holeSize)
+        return best
@@ -0,0 +1,117 @@
+import bisect
+import heapq
+
+class IntervalIndex:
+    # Containment queries over [start, end) ranges in O(log n). When more ranges
+    # match, the one added first wins, as the linear scans it replaces did.
+    def __init__(self, intervals):
+        self.values = []
+        self.ends = []
+        self.emptyIntervals = {}
+        self.endingAt = {}
+        self.intervals = []
+        events = []
+        for start, end, value in intervals:
+            index = len(self.values)
+            self.values.append(value)
+            self.ends.append(end)
+            if end > start:
+                events.append((start, 1, index))
+                events.append((end, 0, index))
+                self.endingAt.setdefault(end, index)
+                self.intervals.append((start, end, index))
+            elif end == start:
+                self.emptyIntervals.setdefault(start, index)
+        events.sort()
+
+        # the bounds split the address space in elementary segments; each one
+        # keeps only the range that wins there (None when no range covers it), so
+        # nested ranges cost linear memory; the ranges still active are a heap,
+        # the ended ones are dropped when they reach its top
+        self.bounds = []
+        self.owners = []
+        active = set()
+        heap = []
+        eventIndex = 0
+        while eventIndex < len(events):
+            point = events[eventIndex][0]
+            while eventIndex < len(events) and events[eventIndex][0] == point:
+                _, isStart, index = events[eventIndex]
+                if isStart:
+                    active.add(index)
+                    heapq.heappush(heap, index)
+                else:
+                    active.discard(index)
+                eventIndex += 1
+            while heap and heap[0] not in active:
+                heapq.heappop(heap)
+            self.bounds.append(point)
+            self.owners.append(heap[0] if heap else None)
+        self.tree = None
+
+    @classmethod
+    def fromRegions(cls, regions):
+        return cls((desc["Origin"], desc["Origin"] + desc["Length"], name) for name, desc in regions.items())
+
+    def _segment(self, addr):
+        return bisect.bisect_right(self.bounds, addr) - 1
+
+    def find(self, addr, default=None):
+        segment = self._segment(addr)
+        if segment < 0 or self.owners[segment] is None:
+            return default
+        return self.values[self.owners[segment]]
+
+    def findContaining(self, addr, dim, default=None):
+        segment = self._segment(addr)
+        best = None
+        if segment >= 0 and self.owners[segment] is not None:
+            best = self.owners[segment]
+            if self.ends[best] < addr + dim:
+                # the winner is too short: look at all the ranges covering addr
+                best = self._firstCovering(addr, addr + dim)
+        if 0 == dim:
+            # an empty range also fits at the very end of a range, or inside an empty one
+            for index in (self.endingAt.get(addr), self.emptyIntervals.get(addr)):
+                if index is not None and (best is None or index < best):
+                    best = index
+        if best is None:
+            return default
+        return self.values[best]
+
+    def _firstCovering(self, addr, end):
+        # centered interval tree, built on the first query that needs it: each
+        # node keeps the ranges holding its center sorted by start and by end
+        if self.tree is None:
+            self.tree = self._buildTree(sorted(self.intervals))
+        best = None
+        node = self.tree
+        while node is not None:
+            center, byStart, byEnd, left, right = node
+            if addr < center:
+                for start, stop, index in byStart:
+                    if start > addr:
+                        break
+                    if stop >= end and (best is None or index < best):
+                        best = index
+                node = left
+            else:
+                for start, stop, index in byEnd:
+                    if stop <= addr:
+                        break
+                    if stop >= end and (best is None or index < best):
+                        best = index
+                node = right
+        return best
+
+    @classmethod
+    def _buildTree(cls, intervals):
+        # intervals sorted by start; the center is the start of the median one
+        if not intervals:
+            return None
+        center = intervals[len(intervals) // 2][0]
+        left = [interval for interval in intervals if interval[1] <= center]
+        right = [interval for interval in intervals if interval[0] > center]
+        here = [interval for interval in intervals if interval[0] <= center < interval[1]]
+        return (center, here, sorted(here, key=lambda interval: -interval[1]),
+                cls._buildTree(left), cls._buildTree(right))
@@ -0,0 +1,160 @@
+import csv
+import json
+from elftools.elf.elffile import ELFFile
+from elftools.elf.constants import SH_FLAGS
+from IntervalIndex import IntervalIndex
+from Timings import phase
+
+SECTION_CLASSES = (".text", ".rodata", ".data", ".bss", "LoadMap")
+
+class LayoutResult:
+    def __init__(self, memConf, rodata):
+        self.memConf = memConf
+        self.rodata = rodata
+        self.usage = {}
+        for regionName in memConf:
+            self.usage[regionName] = {".text": 0, ".rodata": 0, ".data": 0, ".bss": 0, "LoadMap": 0, "Tot": 0}
+        # one entry per accounted section, in accounting order: kind is "add" for the
+        # section itself and "load" for its image in the load region
+        self.sections = []
+        # allocated sections that are not in any region
+        self.unplaced = []
+
+    def account(self, kind, name, regionName, sectionClass, addr, size, align, padding):
+        usage = self.usage[regionName]
+        usage['Tot'] += size + padding
+        usage[sectionClass if "add" == kind else "LoadMap"] += size + padding
+        self.sections.append({  "kind": kind,
+                                "name": name,
+                                "region": regionName,
+                                "class": sectionClass,
+                                "addr": addr,
+                                "size": size,
+                                "align": align,
+                                "padding": padding})
+
+    def toDict(self):
+        regions = {}
+        for regionName, usage in self.usage.items():
+            regions[regionName] = dict(usage)
+            regions[regionName]["Origin"] = self.memConf[regionName]["Origin"]
+            regions[regionName]["Length"] = self.memConf[regionName]["Length"]
+        return {"rodata": self.rodata, "regions": regions, "sections": self.sections, "unplaced": self.unplaced}
+
+    @classmethod
+    def fromDict(cls, layout, memConf):
+        # the inverse of toDict()
+        result = cls(memConf, layout["rodata"])
+        for regionName, usage in layout["regions"].items():
+            result.usage[regionName] = dict((key, value) for key, value in usage.items() if key not in ("Origin", "Length"))
+        result.sections = layout["sections"]
+        result.unplaced = layout["unplaced"]
+        return result
+
+    def toJson(self, indent=None):
+        return json.dumps(self.toDict(), indent=indent)
+
+    def writeCsv(self, file2out):
+        writer = csv.writer(file2out)
+        writer.writerow(["region"] + [sectionClass for sectionClass in SECTION_CLASSES if self.rodata or ".rodata" != sectionClass] + ["Tot", "Length", "Used%"])
+        for regionName, usage in self.usage.items():
+            length = self.memConf[regionName]["Length"]
+            writer.writerow([regionName] + [usage[sectionClass] for sectionClass in SECTION_CLASSES if self.rodata or ".rodata" != sectionClass] +
+                            [usage["Tot"], length, "%.2f" % (100 * usage["Tot"] / length if length else 0)])
+
+class LayoutEngine:
+    def __init__(self, elfFile, elf=None):
+        # section and segment headers are read once, everything else works on them;
+        # elf is the ELFFile of elfFile when it is already open
+        with phase("elf headers") as currentPhase:
+            if elf is None:
+                with open(elfFile, 'rb') as f:
+                    self.readHeaders(ELFFile(f))
+            else:
+                self.readHeaders(elf)
+            currentPhase.items = len(self.sections)
+
+    def readHeaders(self, elfFileObj):
+        self.sections = []
+        for section in elfFileObj.iter_sections():
+            if section.is_null():
+                continue
+            header = section.header
+            self.sections.append((section.name, header['sh_type'], header['sh_flags'], header['sh_addr'],
+                                  header['sh_offset'], header['sh_size'], header['sh_addralign']))
+        # only the load segments where LMA and VMA differ build the load map
+        self.loadSegments = []
+        for segment in elfFileObj.iter_segments():
+            header = segment.header
+            if 'PT_LOAD' == header['p_type'] and header['p_vaddr'] != header['p_paddr']:
+                self.loadSegments.append((header['p_vaddr'], header['p_paddr'], header['p_offset'],
+                                          header['p_filesz'], header['p_memsz']))
+
+    def findLoadSegment(self, segmentIndex, addr, offset, size):
+        # same containment rules of Segment.section_in_segment() for allocated
+        # sections with contents in PT_LOAD segments; the last matching segment wins
+        def contains(segment):
+            vaddr, paddr, poffset, filesz, memsz = segment
+            return (addr >= vaddr and addr - vaddr + size <= memsz and (memsz == 0 or addr - vaddr <= memsz - 1) and
+                    offset >= poffset and offset - poffset + size <= filesz and (filesz == 0 or offset - poffset <= filesz - 1))
+
+        if size:
+            candidate = segmentIndex.findContaining(addr, size)
+        else:
+            candidate = segmentIndex.find(addr)
+        if candidate is not None and contains(self.loadSegments[candidate]):
+            return self.loadSegments[candidate]
+        for segment in reversed(self.loadSegments):
+            if contains(segment):
+                return segment
+        return None
+
+    def classify(self, flags, sectionType, rodata):
+        if 0 != (flags & SH_FLAGS.SHF_EXECINSTR):
+            return '.text'
+        if 0 == (flags & SH_FLAGS.SHF_WRITE):
+            return '.rodata' if rodata else '.text'
+        if 'SHT_NOBITS' == sectionType:
+            return '.bss'
+        return '.data'
+
+    def compute(self, memConf, rodata):
+        with phase("layout") as currentPhase:
+            result = self.computeResult(memConf, rodata)
+            currentPhase.items = len(result.sections)
+        return result
+
+    def computeResult(self, memConf, rodata):
+        result = LayoutResult(memConf, rodata)
+        regionIndex = IntervalIndex.fromRegions(memConf)
+        # later segments must win, so they are indexed first
+        segmentIndex = IntervalIndex((segment[0], segment[0] + segment[4], index)
+                                     for index, segment in reversed(list(enumerate(self.loadSegments))))
+
+        loads = []
+        for name, sectionType, flags, addr, offset, size, align in self.sections:
+            if 0 == (flags & SH_FLAGS.SHF_ALLOC):
+                continue
+            regionName = regionIndex.find(addr)
+            if regionName is None:
+                result.unplaced.append(name)
+                continue
+            padding = result.usage[regionName]['Tot'] % align if align > 1 else 0
+            if padding != 0:
+                padding = align - padding
+            sectionClass = self.classify(flags, sectionType, rodata)
+            result.account("add", name, regionName, sectionClass, memConf[regionName]['Origin'] + result.usage[regionName]['Tot'] + padding, size, align, padding)
+            if 'SHT_NOBITS' != sectionType:
+                segment = self.findLoadSegment(segmentIndex, addr, offset, size)
+                if segment is not None:
+                    vaddr, paddr = segment[0], segment[1]
+                    loads.append((name, sectionClass, regionIndex.find(paddr), paddr + addr - vaddr, size, align))
+
+        # load images are accounted after all the sections
+        for name, sectionClass, regionName, loadAddr, size, align in loads:
+            if regionName is None:
+                result.unplaced.append(name)
+                continue
+            padding = (loadAddr - memConf[regionName]['Origin']) - result.usage[regionName]['Tot']
+            result.account("load", name, regionName, sectionClass, loadAddr, size, align, padding)
+        return result
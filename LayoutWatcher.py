@@ -0,0 +1,247 @@
+import json
+import mmap
+import os
+from bisect import bisect_right
+import struct
+import time
+from LayoutEngine import LayoutEngine, SECTION_CLASSES
+from MapParser import MapParser
+from BuildDiff import deltaRow
+from SymbolIndex import ElfHeaders
+from Timings import phase
+
+STT_SECTION = 3
+STT_FILE = 4
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xff00
+
+def fileStamp(fileName):
+    if fileName is None:
+        return None
+    try:
+        stat = os.stat(fileName)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def mergeIntervals(intervals):
+    # sorted and merged (start, end) intervals, for membership tests with bisect
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return [start for start, _ in merged], [end for _, end in merged]
+
+def readSymbols(elfFile, placed, objects):
+    # {object: {name: size}} of the defined symbols with a size, for the given
+    # objects only; placed are the (addr, end, object) input sections sorted by
+    # address. The section headers and the symbol table are unpacked with struct,
+    # without pyelftools
+    with open(elfFile, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+            headers = ElfHeaders(image)
+            symtab = headers.find('.symtab')
+            if symtab is None:
+                return {}
+            data = bytes(headers.sectionData(image, symtab))
+            strings = bytes(headers.sectionData(image, headers.headers[symtab][6]))
+            is64 = headers.is64
+            byteOrder = headers.order
+    symbols = dict((objectFile, {}) for objectFile in objects)
+    starts = [element[0] for element in placed]
+    if is64:
+        entries = ((name, value, size, info, shndx) for name, info, _, shndx, value, size in struct.iter_unpack(byteOrder + "IBBHQQ", data))
+    else:
+        entries = ((name, value, size, info, shndx) for name, value, size, info, _, shndx in struct.iter_unpack(byteOrder + "IIIBBH", data))
+    for nameOffset, value, size, info, shndx in entries:
+        if 0 == size or SHN_UNDEF == shndx or shndx >= SHN_LORESERVE or (info & 0xf) in (STT_SECTION, STT_FILE):
+            continue
+        # the start is enough to find the object (and it tolerates the thumb bit)
+        index = bisect_right(starts, value) - 1
+        if index < 0 or value >= placed[index][1]:
+            continue
+        objectSymbols = symbols.get(placed[index][2])
+        if objectSymbols is None:
+            continue
+        name = strings[nameOffset:strings.index(b"\0", nameOffset)].decode("utf-8", "replace")
+        objectSymbols[name] = objectSymbols.get(name, 0) + size
+    return symbols
+
+class LayoutWatcher:
+    # Keeps the analysis of an elf/map pair in memory and, when the files change,
+    # recomputes only the parts that depend on what changed: the layout when the
+    # section headers (or the regions) differ, the symbols of the input objects
+    # whose sections differ in the map file.
+    def __init__(self, elfFile, mapFile=None, rodata=False, symbols=False):
+        self.elfFile = elfFile
+        self.mapFile = mapFile
+        self.rodata = rodata
+        self.symbols = symbols and mapFile is not None
+        self.stamps = (None, None)
+        self.pendingStamps = None
+        self.engine = None
+        self.sectionHeaders = {}
+        self.memConfData = None
+        self.regions = None
+        self.result = None
+        self.objectSignatures = {}
+        self.objectSizes = {}
+        self.objectSymbols = {}
+        # the map placement of the objects, and the changed objects whose symbols
+        # are still to be read from an elf newer than the one they were read from
+        self.placed = []
+        self.pendingObjects = set()
+        self.elfChangedSinceSymbols = False
+        self.symbolsRead = False
+
+    def poll(self):
+        # an update once the files changed and then stayed the same for a poll
+        # (so they are not read while the linker is still writing them)
+        stamps = (fileStamp(self.elfFile), fileStamp(self.mapFile))
+        if stamps == self.stamps or stamps[0] is None:
+            self.pendingStamps = None
+            return None
+        if stamps != self.pendingStamps:
+            self.pendingStamps = stamps
+            return None
+        self.pendingStamps = None
+        try:
+            update = self.refresh(stamps[0] != self.stamps[0], stamps[1] != self.stamps[1])
+        except Exception:
+            # half written files, the next change will bring them back
+            return None
+        self.stamps = stamps
+        return update
+
+    def load(self):
+        self.stamps = (fileStamp(self.elfFile), fileStamp(self.mapFile))
+        return self.refresh(True, self.mapFile is not None)
+
+    def refresh(self, elfChanged, mapChanged):
+        # everything is computed first and kept only if no step failed, so a half
+        # written file leaves the state of the previous refresh untouched
+        start = time.perf_counter()
+        update = {"time": time.time(), "files": [], "sections": [], "regions": {}, "objects": [], "symbols": []}
+        if elfChanged:
+            update["files"].append(self.elfFile)
+        if mapChanged:
+            update["files"].append(self.mapFile)
+
+        layoutChanged = False
+        engine = self.engine
+        sectionHeaders = self.sectionHeaders
+        if elfChanged:
+            with phase("elf headers") as currentPhase:
+                engine = LayoutEngine(self.elfFile)
+                currentPhase.items = len(engine.sections)
+            sectionHeaders = dict((section[0], section) for section in engine.sections)
+            update["sections"] = sorted(name for name in set(sectionHeaders) | set(self.sectionHeaders)
+                                        if sectionHeaders.get(name) != self.sectionHeaders.get(name))
+            layoutChanged = bool(update["sections"])
+
+        # regions come from the .memory_configuration section (read only if it changed)
+        # or from the map file
+        memConfData = self.memConfData
+        regions = self.regions
+        memConfHeader = sectionHeaders.get(".memory_configuration")
+        if memConfHeader is not None and (elfChanged or regions is None):
+            with open(self.elfFile, 'rb') as f:
+                f.seek(memConfHeader[4])
+                data = f.read(memConfHeader[5])
+            if data != memConfData:
+                memConfData = data
+                regions = json.loads(data)
+                layoutChanged = True
+        elif memConfHeader is None and mapChanged:
+            with phase("regions"):
+                mapRegions = MapParser(self.mapFile, (MapParser.MEMORY_CONFIGURATION,)).GetMemoryConfiguration()
+            if mapRegions != regions:
+                regions = mapRegions
+                layoutChanged = True
+
+        result = self.result
+        if layoutChanged or result is None:
+            result = engine.compute(regions, self.rodata)
+        for regionName, usage in result.usage.items():
+            region = dict(usage)
+            region["Length"] = regions[regionName]["Length"]
+            oldUsage = self.result.usage.get(regionName) if self.result is not None else None
+            region["delta"] = dict((key, usage[key] - (oldUsage[key] if oldUsage else 0)) for key in SECTION_CLASSES + ("Tot",))
+            update["regions"][regionName] = region
+
+        objects = None
+        if self.symbols and mapChanged:
+            objects = self.refreshObjects(update, regions)
+        signatures, sizes, placed, pendingObjects = objects or (self.objectSignatures, self.objectSizes, self.placed, self.pendingObjects)
+        # the map and the elf may settle in different polls: the symbols of the
+        # objects changed in the map are read once the elf has changed too
+        elfChangedSinceSymbols = self.elfChangedSinceSymbols or elfChanged
+        objectSymbols = self.objectSymbols
+        symbolsRead = self.symbolsRead
+        if self.symbols and pendingObjects and elfChangedSinceSymbols:
+            objectSymbols = self.refreshSymbols(update, placed, signatures, pendingObjects)
+            pendingObjects = set()
+            elfChangedSinceSymbols = False
+            symbolsRead = True
+
+        self.engine = engine
+        self.sectionHeaders = sectionHeaders
+        self.memConfData = memConfData
+        self.regions = regions
+        self.result = result
+        self.objectSignatures, self.objectSizes, self.placed, self.pendingObjects = signatures, sizes, placed, pendingObjects
+        self.objectSymbols = objectSymbols
+        self.elfChangedSinceSymbols = elfChangedSinceSymbols
+        self.symbolsRead = symbolsRead
+        update["elapsed"] = time.perf_counter() - start
+        return update
+
+    def refreshObjects(self, update, regions):
+        # (signatures, sizes, placement, objects whose symbols are to be read) of the
+        # objects in the map, kept by refresh() once everything else succeeded
+        with phase("map parse") as currentPhase:
+            memoryMap = MapParser(self.mapFile, (MapParser.MEMORY_MAP,)).GetMemoryMap()
+            currentPhase.items = len(memoryMap)
+        regionStarts, regionEnds = mergeIntervals((region["Origin"], region["Origin"] + region["Length"]) for region in regions.values())
+        signatures = {}
+        sizes = {}
+        placed = []
+        for element in memoryMap:
+            # only the input sections placed in a region (no debug info and such)
+            index = bisect_right(regionStarts, element["addr"]) - 1
+            if 0 == element["dim"] or index < 0 or element["addr"] >= regionEnds[index]:
+                continue
+            # the addresses are left out, as they shift when an object before grows
+            signatures.setdefault(element["file"], []).append((element["section"], element["dim"]))
+            sizes[element["file"]] = sizes.get(element["file"], 0) + element["dim"]
+            placed.append((element["addr"], element["addr"] + element["dim"], element["file"]))
+        placed.sort()
+        changedObjects = set(objectFile for objectFile in set(signatures) | set(self.objectSignatures)
+                             if signatures.get(objectFile) != self.objectSignatures.get(objectFile))
+        if self.objectSignatures:
+            for objectFile in sorted(changedObjects):
+                update["objects"].append(deltaRow(objectFile, self.objectSizes.get(objectFile), sizes.get(objectFile)))
+        return signatures, sizes, placed, self.pendingObjects | changedObjects
+
+    def refreshSymbols(self, update, placed, signatures, changedObjects):
+        # the symbols of the objects, with those of changedObjects read again; no
+        # delta is reported the first time
+        with phase("symbols") as currentPhase:
+            symbols = readSymbols(self.elfFile, placed, changedObjects & set(signatures))
+            currentPhase.items = sum(len(fileSymbols) for fileSymbols in symbols.values())
+        objectSymbols = dict(self.objectSymbols)
+        for objectFile in sorted(changedObjects):
+            oldSymbols = objectSymbols.pop(objectFile, {})
+            newSymbols = symbols.get(objectFile, {})
+            if objectFile in symbols:
+                objectSymbols[objectFile] = newSymbols
+            if not self.symbolsRead:
+                continue
+            for name in sorted(set(oldSymbols) | set(newSymbols)):
+                if oldSymbols.get(name) != newSymbols.get(name):
+                    row = deltaRow(name, oldSymbols.get(name), newSymbols.get(name))
+                    row["file"] = objectFile
+                    update["symbols"].append(row)
+        return objectSymbols
@@ -0,0 +1,220 @@
+import multiprocessing
+import os
+from elftools.elf.elffile import ELFFile
+
+DW_OP_addr = 0x03
+
+def _fileName(lineProgram, index, compDir):
+    # same path composition as binutils' concat_filename()
+    if lineProgram is None:
+        return None
+    dwarf5 = lineProgram['version'] >= 5
+    if not dwarf5:
+        index -= 1
+    fileEntries = lineProgram['file_entry']
+    if index < 0 or index >= len(fileEntries):
+        return None
+    fileEntry = fileEntries[index]
+    name = fileEntry.name.decode("utf-8", "replace")
+    if os.path.isabs(name):
+        return name
+    dirs = lineProgram['include_directory']
+    dirIndex = fileEntry.dir_index if dwarf5 else fileEntry.dir_index - 1
+    subdir = None
+    if (dwarf5 or fileEntry.dir_index > 0) and dirIndex < len(dirs):
+        subdir = dirs[dirIndex].decode("utf-8", "replace")
+    if subdir and os.path.isabs(subdir):
+        return subdir + "/" + name
+    if compDir is None:
+        return subdir + "/" + name if subdir else name
+    if subdir and not (dwarf5 and subdir == compDir):
+        return compDir + "/" + subdir + "/" + name
+    return compDir + "/" + name
+
+def _decodeCUs(elfFile, cuOffsets):
+    functions = []
+    variables = []
+    lineRanges = []
+    with open(elfFile, 'rb') as f:
+        dwarfInfo = ELFFile(f).get_dwarf_info()
+        for cuOffset in cuOffsets:
+            cu = dwarfInfo.get_CU_at(cuOffset)
+            topDie = cu.get_top_DIE()
+            compDir = None
+            if 'DW_AT_comp_dir' in topDie.attributes:
+                compDir = topDie.attributes['DW_AT_comp_dir'].value.decode("utf-8", "replace")
+            lineProgram = dwarfInfo.line_program_for_CU(cu)
+            fileNames = {}
+
+            def cachedFileName(index):
+                if index not in fileNames:
+                    fileNames[index] = _fileName(lineProgram, index, compDir)
+                return fileNames[index]
+
+            for die in cu.iter_DIEs():
+                if die.tag not in ('DW_TAG_subprogram', 'DW_TAG_variable'):
+                    continue
+                attrs = die.attributes
+                # name, file and line may come from the DIE itself or from the ones it
+                # refers to (the first DIE providing each of them wins)
+                nameDie = None
+                fileDie = None
+                lineDie = None
+                referredDie = die
+                while referredDie is not None:
+                    if nameDie is None and 'DW_AT_name' in referredDie.attributes:
+                        nameDie = referredDie
+                    if fileDie is None and 'DW_AT_decl_file' in referredDie.attributes:
+                        fileDie = referredDie
+                    if lineDie is None and 'DW_AT_decl_line' in referredDie.attributes:
+                        lineDie = referredDie
+                    if nameDie is not None and fileDie is not None and lineDie is not None:
+                        break
+                    for reference in ('DW_AT_abstract_origin', 'DW_AT_specification'):
+                        if reference in referredDie.attributes:
+                            referredDie = referredDie.get_DIE_from_attribute(reference)
+                            break
+                    else:
+                        referredDie = None
+                if nameDie is None or fileDie is None or lineDie is None:
+                    continue
+                declFile = fileDie.attributes['DW_AT_decl_file'].value
+                if fileDie.cu is cu:
+                    fileName = cachedFileName(declFile)
+                else:
+                    fileName = _fileName(dwarfInfo.line_program_for_CU(fileDie.cu), declFile, compDir)
+                if fileName is None:
+                    continue
+                name = nameDie.attributes['DW_AT_name'].value.decode("utf-8", "replace")
+                declLine = lineDie.attributes['DW_AT_decl_line'].value
+                if 'DW_TAG_subprogram' == die.tag:
+                    if 'DW_AT_low_pc' not in attrs or 'DW_AT_high_pc' not in attrs:
+                        continue
+                    lowPc = attrs['DW_AT_low_pc'].value
+                    highPc = attrs['DW_AT_high_pc']
+                    if highPc.form == 'DW_FORM_addr':
+                        highPc = highPc.value
+                    else:
+                        highPc = lowPc + highPc.value
+                    functions.append((name, lowPc, highPc, fileName, declLine))
+                else:
+                    location = attrs.get('DW_AT_location')
+                    if location is not None:
+                        block = location.value
+                        if not isinstance(block, list) or len(block) != cu['address_size'] + 1 or block[0] != DW_OP_addr:
+                            continue
+                        addr = int.from_bytes(bytes(block[1:]), 'little' if dwarfInfo.config.little_endian else 'big')
+                        variables.append((die.offset, name, addr, fileName, declLine))
+                    elif 'DW_AT_external' in attrs:
+                        # declarations are kept (at address 0) because binutils does the same
+                        variables.append((die.offset, name, 0, fileName, declLine))
+
+            if lineProgram is None:
+                continue
+            previousState = None
+            for entry in lineProgram.get_entries():
+                state = entry.state
+                if state is None:
+                    continue
+                if previousState is not None and previousState.address < state.address and previousState.line != 0:
+                    fileName = cachedFileName(previousState.file)
+                    if fileName is not None:
+                        lineRanges.append((previousState.address, state.address, fileName, previousState.line))
+                previousState = None if state.end_sequence else state
+    return functions, variables, lineRanges
+
+def flattenRanges(lineRanges):
+    # (start, end, file, line) ranges sorted by start -> disjoint ones: the ranges
+    # of the line table may overlap (duplicated or nested sequences), each address
+    # goes to the covering range starting last, and past its end back to the one
+    # enclosing it. The open ranges are kept in start order, the ended ones are
+    # dropped when they reach the top.
+    flatRanges = []
+    openRanges = []
+    cursor = 0
+
+    def advance(cursor, limit):
+        # the segments of [cursor, limit) covered by the open ranges
+        while openRanges and cursor < limit:
+            start, end, fileName, line = openRanges[-1]
+            if end <= cursor:
+                openRanges.pop()
+                continue
+            segmentEnd = min(end, limit)
+            if flatRanges and flatRanges[-1][1] == cursor and flatRanges[-1][2:] == (fileName, line):
+                flatRanges[-1] = (flatRanges[-1][0], segmentEnd, fileName, line)
+            else:
+                flatRanges.append((cursor, segmentEnd, fileName, line))
+            cursor = segmentEnd
+        return limit
+
+    for lineRange in lineRanges:
+        if lineRange[1] <= lineRange[0]:
+            continue
+        cursor = advance(cursor, lineRange[0])
+        openRanges.append(lineRange)
+    advance(cursor, float("inf"))
+    return flatRanges
+
+class LineRetriever:
+    def __init__(self, elfFile, jobs=None):
+        def listCUOffsets(elfFile):
+            with open(elfFile, 'rb') as f:
+                elfFileObj = ELFFile(f)
+                if not elfFileObj.has_dwarf_info():
+                    return []
+                return [cu.cu_offset for cu in elfFileObj.get_dwarf_info().iter_CUs()]
+
+        def decode(elfFile, cuOffsets, jobs):
+            if jobs is None:
+                jobs = os.cpu_count() or 1
+            jobs = min(jobs, len(cuOffsets))
+            if jobs <= 1:
+                return [_decodeCUs(elfFile, cuOffsets)]
+            # round-robin keeps big and small CUs (usually adjacent) spread over the workers
+            chunks = [cuOffsets[i::jobs * 4] for i in range(jobs * 4)]
+            with multiprocessing.Pool(jobs) as pool:
+                return pool.starmap(_decodeCUs, [(elfFile, chunk) for chunk in chunks if chunk])
+
+        self.functions = {}
+        self.variables = {}
+        variableList = []
+        lineRanges = []
+        for functions, variables, ranges in decode(elfFile, listCUOffsets(elfFile), jobs):
+            for name, lowPc, highPc, fileName, line in functions:
+                self.functions.setdefault(name, []).append((lowPc, highPc, fileName, line))
+            variableList.extend(variables)
+            lineRanges.extend(ranges)
+        # like binutils, when several DIEs match the last one wins
+        variableList.sort()
+        for dieOffset, name, addr, fileName, line in variableList:
+            self.variables[(name, addr)] = (fileName, line)
+        lineRanges.sort()
+        self.lineRanges = flattenRanges(lineRanges)
+
+    def GetLocations(self, symbolRecords):
+        # symbolRecords are sorted by address and the line ranges are disjoint, so the
+        # line table is walked only once
+        rangeStarts = [lineRange[0] for lineRange in self.lineRanges]
+        rangeIndex = 0
+        locatedRecords = []
+        for record in symbolRecords:
+            addr = record[0]
+            name = record[3]
+            location = record[4]
+            if "" == location:
+                declaration = self.variables.get((name, addr))
+                if declaration is None:
+                    for lowPc, highPc, fileName, line in self.functions.get(name, ()):
+                        if lowPc <= addr < highPc:
+                            declaration = (fileName, line)
+                            break
+                if declaration is None:
+                    while rangeIndex < len(rangeStarts) and rangeStarts[rangeIndex] <= addr:
+                        rangeIndex += 1
+                    if rangeIndex > 0 and addr < self.lineRanges[rangeIndex - 1][1]:
+                        declaration = self.lineRanges[rangeIndex - 1][2:]
+                if declaration is not None:
+                    location = "%s:%d" % declaration
+            locatedRecords.append(record[:4] + (location,))
+        return locatedRecords
@@ -0,0 +1,130 @@
+import mmap
+import re
+
+class MapParser:
+    MEMORY_CONFIGURATION = "memoryConfiguration"
+    MEMORY_MAP = "memoryMap"
+    CROSS_REFERENCE = "crossReference"
+    ALL_SECTIONS = (MEMORY_CONFIGURATION, MEMORY_MAP, CROSS_REFERENCE)
+
+    patternMemConfIni = re.compile(rb"^Memory Configuration\r?$", re.M)
+    patternMemConf = re.compile(rb"^([A-Za-z0-9_\*]+)[ \t]+0x([0-9a-fA-F]{8,16})[ \t]+0x([0-9a-fA-F]{8,16})(?:[ \t]+([^\r\n]*))?\r?$", re.M)
+    patternMemMapIni = re.compile(rb"^Linker script and memory map\r?$", re.M)
+    patternMemMapEnd = re.compile(rb"^OUTPUT\(.*\)\r?$", re.M)
+    # input section entries, also in the form wrapped on two lines when the
+    # section name is too long:
+    #  .text.name     0x60002000       0x2a0 ./dir/file.o
+    #  .text.a_very_long_section_name
+    #                 0x60002000       0x2a0 /lib/libc.a(file.o)
+    patternMemMapEntry = re.compile(rb"^[ \t]([^\s]*)(?:\r?\n[ \t])?[ \t]+0x([0-9a-fA-F]+)[ \t]+0x([0-9a-fA-F]+)[ \t]+([^\s]+\.o\)?)\r?$", re.M)
+    patternCrossRefIni = re.compile(rb"^Cross Reference Table\r?$", re.M)
+    patternCrossRefHeader = re.compile(rb"^Symbol[ \t]+(File)\r?$", re.M)
+    # a symbol with the file defining it, the files referencing it on the next
+    # lines (with the symbol name left blank); the files start at the column of
+    # "File" in the header (50 for ld), as symbols and paths may hold spaces. A
+    # symbol name reaching the column is alone on its line and the defining
+    # file goes to the next one
+    #  symbol_name                                       ./dir/file.o
+    #                                                    ./dir/other.o
+    CROSS_REFERENCE_FILE_COLUMN = 50
+
+    def __init__(self, mapFile, sections=ALL_SECTIONS):
+        self.memConf = {}
+        self.memoryMap = []
+        self.crossRef = {}
+        self.crossRefFiles = {}
+
+        with open(mapFile, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                data = b""
+            try:
+                # the map file sections always come in this order, so they are
+                # located (and parsed, if requested) walking the file once
+                pos = 0
+                matchObj = self.patternMemConfIni.search(data, pos)
+                memConfStart = matchObj.end() if matchObj else None
+                matchObj = self.patternMemMapIni.search(data, memConfStart or 0)
+                memMapStart = matchObj.end() if matchObj else None
+                if memConfStart is not None and self.MEMORY_CONFIGURATION in sections:
+                    self.memConf = self.parseMemoryConfiguration(data, memConfStart, memMapStart or len(data))
+                if memMapStart is not None:
+                    matchObj = self.patternMemMapEnd.search(data, memMapStart)
+                    memMapEnd = matchObj.end() if matchObj else len(data)
+                    if self.MEMORY_MAP in sections:
+                        self.memoryMap = self.parseMemoryMap(data, memMapStart, memMapEnd)
+                    pos = memMapEnd
+                if self.CROSS_REFERENCE in sections:
+                    matchObj = self.patternCrossRefIni.search(data, pos)
+                    if matchObj:
+                        self.crossRefFiles = self.parseCrossReference(data, matchObj.end(), len(data))
+                        self.crossRef = dict((name, files[0]) for name, files in self.crossRefFiles.items() if files)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
+    def parseMemoryConfiguration(self, data, start, end):
+        keys = ("Origin","Length","Attributes")
+        memDict = {}
+        for matchObj in self.patternMemConf.finditer(data, start, end):
+            name = matchObj.group(1).decode("utf-8")
+            if "*default*" == name:
+                break
+            attributes = ' '.join((matchObj.group(4) or b"").decode("utf-8").split())
+            memDict[name] = dict(zip(keys, (int(matchObj.group(2), 16), int(matchObj.group(3), 16), attributes)))
+        return memDict
+
+    def parseMemoryMap(self, data, start, end):
+        memoryMap = []
+        for matchObj in self.patternMemMapEntry.finditer(data, start, end):
+            memoryMap.append({  "section": matchObj.group(1).decode("utf-8"),
+                                "addr": int(matchObj.group(2), 16),
+                                "dim": int(matchObj.group(3), 16),
+                                "file": matchObj.group(4).decode("utf-8")})
+        return memoryMap
+
+    def parseCrossReference(self, data, start, end):
+        column = self.CROSS_REFERENCE_FILE_COLUMN
+        matchObj = self.patternCrossRefHeader.search(data, start, end)
+        if matchObj:
+            start = matchObj.end()
+            column = matchObj.start(1) - matchObj.start()
+        crossRefFiles = {}
+        fileNames = {}
+        files = None
+        for line in data[start:end].split(b"\n"):
+            line = line.rstrip()
+            if not line:
+                continue
+            # ld pads the shorter symbol names to the column with at least two blanks
+            if len(line) > column and line[column - 2:column] == b"  ":
+                name = line[:column].rstrip()
+                fileName = line[column:]
+            else:
+                name = line
+                fileName = b""
+            if name:
+                files = crossRefFiles.setdefault(name.decode("utf-8"), [])
+            if fileName and files is not None:
+                # the same few files come up again and again
+                fileString = fileNames.get(fileName)
+                if fileString is None:
+                    fileString = fileNames[fileName] = fileName.decode("utf-8")
+                files.append(fileString)
+        return crossRefFiles
+
+    def GetMemoryConfiguration(self):
+        return self.memConf
+
+    def GetMemoryMap(self):
+        return self.memoryMap
+
+    def GetCrossReference(self):
+        # symbol -> the file defining it
+        return self.crossRef
+
+    def GetCrossReferenceFiles(self):
+        # symbol -> [the file defining it, the files referencing it...]
+        return self.crossRefFiles
@@ -1,110 +1,154 @@
 import subprocess
 import re
 from RegionRetriever import RegionRetriever
+from SymbolRetriever import SymbolRetriever
+from LineRetriever import LineRetriever
+from IntervalIndex import IntervalIndex
+from MapParser import MapParser
+from SymbolTable import SymbolTable
+from Timings import phase
+
+# the lines of "nm -S -l" for the defined symbols with a size: address and size
+# (8 or 16 digits, for 32 or 64 bit targets), type, name and the optional
+# file:line location
+NM_LINE_RE = re.compile(r"^([0-9a-fA-F]+) ([0-9a-fA-F]+) ([A-Za-z]) [ \t]*(\S+)[ \t]*(\S*)", re.MULTILINE)
+NM_CHUNK = 1 << 16
+
+async def startNm(nmPrefix, elfFile):
+    import asyncio
+    return await asyncio.create_subprocess_exec(nmPrefix + "nm", "-s", "-n", "-S", "-l", "--defined-only", elfFile,
+                                                stdout=asyncio.subprocess.PIPE)
+
+async def streamNmRecords(process, nmPrefix=""):
+    # the output of nm is parsed a chunk of complete lines at a time, as it
+    # arrives, so the whole text is never held along with the records
+    symbolRecords = []
+    pending = b""
+    while True:
+        data = await process.stdout.read(NM_CHUNK)
+        if not data:
+            break
+        complete, newline, pending = (pending + data).rpartition(b"\n")
+        if newline:
+            symbolRecords.extend((int(addr, 16), int(size, 16), attr, name, location)
+                                 for addr, size, attr, name, location in NM_LINE_RE.findall(complete.decode("utf-8")))
+    symbolRecords.extend((int(addr, 16), int(size, 16), attr, name, location)
+                         for addr, size, attr, name, location in NM_LINE_RE.findall(pending.decode("utf-8")))
+    returnCode = await process.wait()
+    if 0 != returnCode:
+        raise subprocess.CalledProcessError(returnCode, nmPrefix + "nm")
+    return symbolRecords
 
 class MetadataRetriever:
-    def __init__(self, elfFile, mapFile, regions=None, nmPrefix=""):
+    def __init__(self, elfFile, mapFile, regions=None, nmPrefix="", useNm=False, jobs=None, cache=None, elf=None, mapParser=None):
+        # elf and mapParser are the ELFFile and the MapParser (with the memory map
+        # and the cross reference table) of the two files when already available
+        self.mapParser = mapParser
         if None == regions:
-            memMapRetriever = RegionRetriever(elfFile, mapFile)
+            memMapRetriever = RegionRetriever(elfFile, mapFile, cache)
             regions = memMapRetriever.GetRegions()
         self.regions = regions
 
-        def retreiveSymbolLines(nmPrefix, elfFile):
-            cmdLine= nmPrefix + "nm -s -n -S -l --defined-only " +elfFile+ " | grep -E \"^[[:xdigit:]]{8} [[:xdigit:]]{8} [[:alpha:]] \""
-            process = subprocess.run(cmdLine, shell=True, stdout=subprocess.PIPE)
-            process.check_returncode()
-            return process.stdout.decode("utf-8").strip().splitlines()
-
-        self.symbolLineList = retreiveSymbolLines(nmPrefix, elfFile)
+        def loadSymbols():
+            if useNm:
+                # nm runs while the map file is parsed; asyncio is loaded only here
+                import asyncio
+                with phase("nm and map parse") as currentPhase:
+                    self.symbolRecords = asyncio.run(self.retreiveConcurrently(nmPrefix, elfFile, mapFile))
+                    currentPhase.items = len(self.symbolRecords)
+            else:
+                with phase("elf symbols") as currentPhase:
+                    symbolRecords = SymbolRetriever(elfFile, elf).GetSymbols()
+                    currentPhase.items = len(symbolRecords)
+                with phase("debug info") as currentPhase:
+                    lineRetriever = LineRetriever(elfFile, jobs)
+                    currentPhase.items = len(lineRetriever.lineRanges)
+                with phase("locations") as currentPhase:
+                    self.symbolRecords = lineRetriever.GetLocations(symbolRecords)
+                    currentPhase.items = len(self.symbolRecords)
+                with phase("map parse") as currentPhase:
+                    self.parseMap(mapFile)
+                    currentPhase.items = len(self.memoryMapList)
+            return self.buildSymbolTable()
 
-        def getMemoryMapSlice(mapFile):
-            cmdLine="sed -ne '/^Linker script and memory map$/,/^OUTPUT(.*)$/{ s/^[[:space:]][^[:space:]]*[[:space:]]\\+\\(0x[[:xdigit:]]\\+[[:space:]]\\+0x[[:xdigit:]]\\+[[:space:]]\\+[^[:space:]]\\+\\.o\\()\\|\\)\\)$/\\1/p}' " + mapFile + " | sort"
-            process = subprocess.run(cmdLine, shell=True, stdout=subprocess.PIPE)
-            MemoryMapList = []
-            if(process.returncode == 0):
-                MemoryMapText = process.stdout.decode("utf-8").strip().splitlines()
-                for line in MemoryMapText:
-                    MemoryMapDict = {}
-                    fields = line.split()
-                    MemoryMapDict["dim"] = int(fields[1], 16)
-                    if 0 == MemoryMapDict["dim"]:
-                        continue
-                    MemoryMapDict["addr"] = int(fields[0], 16)
-                    MemoryMapDict["file"] = fields[2]
-                    MemoryMapList.append(MemoryMapDict)
-            return MemoryMapList
+        if cache is None:
+            self.symbolTable = loadSymbols()
+        else:
+            self.symbolTable = cache.lookup("symbols", (elfFile, mapFile), self.cacheParams(regions, nmPrefix, useNm), loadSymbols)
 
-        self.memoryMapList = getMemoryMapSlice(mapFile)
+    @staticmethod
+    def cacheParams(regions, nmPrefix, useNm):
+        # the parameters of the cached symbols (and of what is derived from them)
+        return [regions, useNm, nmPrefix if useNm else ""]
 
-        def getCrossRefSection(mapFile):
-            cmdLine="sed -ne '/^Cross Reference Table$/,${ /^Symbol[[:space:]]\\+File$/n; /^[^[:space:]]\\+[[:space:]]\\+[^[:space:]]\\+$/p; } ' " + mapFile
-            process = subprocess.run(cmdLine, shell=True, stdout=subprocess.PIPE)
-            crossRefDict = {}
-            if(process.returncode == 0):
-                crossRefRawLines = process.stdout.decode("utf-8").strip().splitlines()
-                for line in crossRefRawLines:
-                    element = line.split()
-                    crossRefDict[element[0]] = element[1]
-            return crossRefDict
+    def parseMap(self, mapFile):
+        mapParser = self.mapParser
+        if mapParser is None:
+            mapParser = MapParser(mapFile, (MapParser.MEMORY_MAP, MapParser.CROSS_REFERENCE))
+        self.memoryMapList = sorted((element for element in mapParser.GetMemoryMap() if 0 != element["dim"]),
+                                    key=lambda element: (element["addr"], element["dim"], element["file"]))
+        self.crossRefDict = mapParser.GetCrossReference()
 
-        self.crossRefDict = getCrossRefSection(mapFile)
+    async def retreiveConcurrently(self, nmPrefix, elfFile, mapFile):
+        # the map file is parsed by a thread of the default executor while the
+        # event loop reads the output of nm; the time is the one of the slowest.
+        # nm is started first: the parsing thread hardly ever releases the GIL
+        import asyncio
+        process = await startNm(nmPrefix, elfFile)
+        mapParse = asyncio.get_running_loop().run_in_executor(None, self.parseMap, mapFile)
+        try:
+            symbolRecords = await streamNmRecords(process, nmPrefix)
+        finally:
+            await mapParse
+        return symbolRecords
 
     def retreiveSymbols(self):
-        def retreiveSymbolMetadata(line):
-            def getFileFromMemoryMap(addr, dim, MemoryMapList):
-                for element in MemoryMapList:
-                    if addr >= element["addr"] and (addr + dim) <= (element["addr"] + element["dim"]):
-                        return element["file"]
-                return ""
-            def findRegion(addr, Regions):
-                for region in Regions:
-                    metadata = Regions[region]
-                    if addr >= metadata["Origin"] and addr < (metadata["Origin"] + metadata["Length"]):
-                        return region
-                return "unknown"
-            fields=line.split()
-            symbolData = {}
-            symbolData["addr"] = int(fields[0], 16)
-            symbolData["dim"] = int(fields[1], 16)
-            symbolData["attr"] = fields[2]
-            symbolData["name"] = fields[3]
-            symbolData["fill"] = False
-            if(len(fields) == 4):
-                symbolData["line"] = 0
-                # if nm fails to retreive file info related to a symbol we try to find it in
-                # the cross reference section of map file.
-                symbolData["file"] = self.crossRefDict.get(symbolData["name"], "")
-                if "" == symbolData["file"]:
-                    # if also cross reference section does not contain file information we try
-                    # to find it in the memory map section. The infos can be all in 1 line or can
-                    # be splitted in two.
-                    symbolData["file"] = getFileFromMemoryMap(symbolData["addr"], symbolData["dim"], self.memoryMapList)
-            else:
-                p = re.compile(r"^.*:\d+$")
-                if p.match(fields[4]):
-                    symbolData["file"] = ':'.join(fields[4].split(':')[:-1])
-                    symbolData["line"] = int(fields[4].split(':')[-1])
-                else:
-                    symbolData["file"] = fields[4]
-                    symbolData["line"] = 0
-            symbolData["region"] = findRegion(symbolData["addr"], self.regions)
-            return symbolData
+        # the SymbolTable: iterating it yields the symbols as dicts
+        return self.symbolTable
 
-        symbolsList = []
-        symbolsList.append(retreiveSymbolMetadata(self.symbolLineList[0]))
-        for line in self.symbolLineList[1:]:
-            symbolData = retreiveSymbolMetadata(line)
-            if symbolData["region"] == symbolsList[-1]["region"] and (symbolsList[-1]["addr"] + symbolsList[-1]["dim"]) < symbolData["addr"]:
-                fillEntry = {}
-                fillEntry["name"] = "*fill*"
-                fillEntry["region"] = symbolData["region"]
-                fillEntry["addr"] = symbolsList[-1]["addr"] + symbolsList[-1]["dim"]
-                fillEntry["dim"] = symbolData["addr"] - fillEntry["addr"]
-                fillEntry["attr"] = " "
-                fillEntry["file"] = ""
-                fillEntry["line"] = 0
-                fillEntry["fill"] = True
-                symbolsList.append(fillEntry)
-            symbolsList.append(symbolData)
+    def retreiveSymbolTable(self):
+        return self.symbolTable
 
-        return symbolsList
\ No newline at end of file
+    def buildSymbolTable(self):
+        # the symbols are appended straight into the columns of the table, with the
+        # *fill* entries in between: the gap is measured from the farthest end of
+        # the symbols before in the same region, so symbols nested in (or aliasing)
+        # a bigger one add no fill
+        regionIndex = IntervalIndex.fromRegions(self.regions)
+        memoryMapIndex = IntervalIndex((element["addr"], element["addr"] + element["dim"], element["file"]) for element in self.memoryMapList)
+        patternLine = re.compile(r"^.*:\d+$")
+        symbolTable = SymbolTable()
+        append = symbolTable.appender()
+        fills = 0
+        with phase("attribution") as currentPhase:
+            lastRegion = None
+            coveredEnd = 0
+            for addr, dim, attr, name, location in self.symbolRecords:
+                objectFile = memoryMapIndex.findContaining(addr, dim, "")
+                if "" == location:
+                    line = 0
+                    # if nm fails to retreive file info related to a symbol we try to find it in
+                    # the cross reference section of map file.
+                    fileName = self.crossRefDict.get(name, "")
+                    if "" == fileName:
+                        # if also cross reference section does not contain file information we try
+                        # to find it in the memory map section. The infos can be all in 1 line or can
+                        # be splitted in two.
+                        fileName = objectFile
+                elif patternLine.match(location):
+                    fileName, _, line = location.rpartition(':')
+                    line = int(line)
+                else:
+                    fileName = location
+                    line = 0
+                region = regionIndex.find(addr, "unknown")
+                if region != lastRegion:
+                    coveredEnd = addr
+                    lastRegion = region
+                elif coveredEnd < addr:
+                    append(coveredEnd, addr - coveredEnd, " ", "*fill*", "", 0, "", region, 1)
+                    fills += 1
+                append(addr, dim, attr, name, fileName, line, objectFile, region, 0)
+                coveredEnd = max(coveredEnd, addr + dim)
+            currentPhase.items = len(symbolTable) - fills
+        return symbolTable
@@ -0,0 +1,181 @@
+import json
+import os
+from xml.sax.saxutils import escape
+
+BACKGROUND_COLOR = "rgb(75%,75%,85%)"
+FOREGROUND_COLORS = ("rgb(70%,60%,50%)", "rgb(60%,70%,50%)")
+
+def uniqueSymbols(symbolTable):
+    # (addr, dim, name, object file) of the symbols of a SymbolTable, read from
+    # its columns; symbols @address already populated and *fill* entries are not drawn
+    lastaddr = -1
+    for addr, dim, name, objectFile, fileName, fill in symbolTable.rows("addr", "dim", "name", "object", "file", "fill"):
+        if lastaddr == addr or fill:
+            continue
+        lastaddr = addr
+        yield addr, dim, name, objectFile or fileName
+
+def aggregateSymbols(symbols, minBytes):
+    # Symbols smaller than minBytes are merged with the adjacent small symbols of
+    # the same object file; yields (addr, size, label, count) blocks.
+    pending = None
+    for addr, dim, name, objectFile in symbols:
+        if dim < minBytes:
+            if (pending is not None and pending[4] == objectFile and
+                    addr - (pending[0] + pending[1]) < minBytes):
+                end = max(pending[0] + pending[1], addr + dim)
+                pending = (pending[0], end - pending[0], pending[2], pending[3] + 1, objectFile)
+                continue
+            if pending is not None:
+                yield blockOf(pending)
+            pending = (addr, dim, name, 1, objectFile)
+        else:
+            if pending is not None:
+                yield blockOf(pending)
+                pending = None
+            yield (addr, dim, symbolLabel(name, objectFile), 1)
+    if pending is not None:
+        yield blockOf(pending)
+
+def symbolLabel(name, objectFile):
+    if objectFile:
+        return "%s (%s)" % (name, os.path.basename(objectFile))
+    return name
+
+def blockOf(pending):
+    addr, size, name, count, objectFile = pending
+    if 1 == count:
+        return (addr, size, symbolLabel(name, objectFile), 1)
+    return (addr, size, "%s (%d symbols)" % (os.path.basename(objectFile) or "?", count), count)
+
+def writeSvg(fileName, region, symbols, bytesPerPixel, minPixels):
+    # the document is streamed to the file, one element at a time
+    heigth = region["Length"] / bytesPerPixel
+    width = heigth / 8
+    with open(fileName, "w") as f:
+        f.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+        f.write('<svg baseProfile="full" height="%s" version="1.1" width="%s" xmlns="http://www.w3.org/2000/svg" xmlns:ev="http://www.w3.org/2001/xml-events" xmlns:xlink="http://www.w3.org/1999/xlink"><defs />' % (heigth, width))
+        f.write('<rect fill="%s" height="%s" width="%s" x="0" y="0" />' % (BACKGROUND_COLOR, heigth, width))
+        blocks = 0
+        for addr, size, label, count in aggregateSymbols(uniqueSymbols(symbols), minPixels * bytesPerPixel):
+            f.write('<rect fill="%s" height="%s" width="%s" x="0" y="%s"><title>%s</title></rect>' % (
+                FOREGROUND_COLORS[blocks % len(FOREGROUND_COLORS)], size / bytesPerPixel, width,
+                (addr - region["Origin"]) / bytesPerPixel, escape("0x%08x %d B %s" % (addr, size, label))))
+            blocks += 1
+        f.write('</svg>\n')
+    return blocks
+
+HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>%(title)s</title>
+<style>
+body { margin: 0; font: 12px monospace; background: #333; color: #eee; }
+#view { display: block; cursor: grab; }
+#info { position: fixed; top: 4px; left: 4px; background: rgba(0,0,0,0.7); padding: 4px; white-space: pre; }
+</style></head>
+<body><canvas id="view"></canvas><div id="info"></div>
+<script type="application/json" id="meta">%(meta)s</script>
+"""
+
+HTML_TAIL = """<script>
+(function() {
+  var meta = JSON.parse(document.getElementById("meta").textContent);
+  var colors = ["rgb(70%,60%,50%)", "rgb(60%,70%,50%)"];
+  var canvas = document.getElementById("view"), ctx = canvas.getContext("2d");
+  var info = document.getElementById("info");
+  var tiles = {};
+  var scale = meta.levels[0].bytesPerPixel, top = 0, drag = null;
+  // tiles are parsed only when they become visible at their zoom level
+  function tile(level, index) {
+    var key = level + "-" + index;
+    if (!(key in tiles)) {
+      var element = document.getElementById("tile-" + key);
+      tiles[key] = element ? JSON.parse(element.textContent) : [];
+    }
+    return tiles[key];
+  }
+  function level() {
+    var chosen = 0;
+    for (var i = 0; i < meta.levels.length; i++)
+      if (meta.levels[i].bytesPerPixel >= scale) chosen = i;
+    return chosen;
+  }
+  function visibleBlocks() {
+    var l = level(), tileBytes = meta.levels[l].tileBytes, blocks = [];
+    var first = Math.max(0, Math.floor(top / tileBytes));
+    var last = Math.floor((top + canvas.height * scale) / tileBytes);
+    for (var t = first; t <= last; t++) blocks = blocks.concat(tile(l, t));
+    return blocks;
+  }
+  function draw() {
+    canvas.width = window.innerWidth; canvas.height = window.innerHeight;
+    ctx.fillStyle = "rgb(75%,75%,85%)";
+    ctx.fillRect(0, -top / scale, canvas.width, meta.length / scale);
+    visibleBlocks().forEach(function(b) {
+      ctx.fillStyle = colors[b[4]];
+      ctx.fillRect(0, (b[0] - top) / scale, canvas.width, Math.max(b[1] / scale, 0.5));
+    });
+  }
+  function describe(y) {
+    var offset = top + y * scale, found = null;
+    visibleBlocks().forEach(function(b) { if (offset >= b[0] && offset < b[0] + b[1]) found = b; });
+    var addr = "0x" + (meta.origin + Math.floor(offset)).toString(16);
+    info.textContent = meta.region + " " + addr + (found ? "\\n" + found[1] + " B " + meta.labels[found[2]] : "");
+  }
+  canvas.addEventListener("wheel", function(e) {
+    e.preventDefault();
+    var anchor = top + e.offsetY * scale;
+    scale = Math.min(meta.levels[0].bytesPerPixel, Math.max(scale * (e.deltaY > 0 ? 1.25 : 0.8), 1 / 64));
+    top = anchor - e.offsetY * scale;
+    draw(); describe(e.offsetY);
+  });
+  canvas.addEventListener("mousedown", function(e) { drag = {y: e.offsetY, top: top}; });
+  window.addEventListener("mouseup", function() { drag = null; });
+  canvas.addEventListener("mousemove", function(e) {
+    if (drag) { top = drag.top - (e.offsetY - drag.y) * scale; draw(); }
+    describe(e.offsetY);
+  });
+  window.addEventListener("resize", draw);
+  draw();
+})();
+</script></body></html>
+"""
+
+def writeHtml(fileName, regionName, region, symbols, bytesPerPixel, minPixels, tilePixels=1024, maxLevels=8):
+    # Level 0 is the whole region at bytesPerPixel, every further level doubles the
+    # resolution, until the symbols do not need to be merged any more or maxLevels
+    # are written: every level is embedded, and each one may hold a block per symbol,
+    # so maxLevels bounds the file. The blocks of every level are split in tiles of
+    # tilePixels; zooming in past the last level shows its blocks.
+    symbols = list(uniqueSymbols(symbols))
+    labels = []
+    labelIndexes = {}
+    levels = []
+    with open(fileName, "w") as f:
+        tileParts = []
+        levelBytesPerPixel = bytesPerPixel
+        while len(levels) < maxLevels:
+            tileBytes = tilePixels * levelBytesPerPixel
+            levelTiles = {}
+            blocks = 0
+            for addr, size, label, count in aggregateSymbols(symbols, minPixels * levelBytesPerPixel):
+                labelIndex = labelIndexes.get(label)
+                if labelIndex is None:
+                    labelIndex = labelIndexes[label] = len(labels)
+                    labels.append(label)
+                offset = addr - region["Origin"]
+                block = [offset, size, labelIndex, count, blocks % len(FOREGROUND_COLORS)]
+                for tileIndex in range(int(offset // tileBytes), int((offset + max(size, 1) - 1) // tileBytes) + 1):
+                    levelTiles.setdefault(tileIndex, []).append(block)
+                blocks += 1
+            for tileIndex, tileBlocks in levelTiles.items():
+                tileParts.append('<script type="application/json" id="tile-%d-%d">%s</script>\n' % (len(levels), tileIndex, json.dumps(tileBlocks, separators=(',', ':'))))
+            levels.append({"bytesPerPixel": levelBytesPerPixel, "tileBytes": tileBytes})
+            if blocks >= len(symbols) or levelBytesPerPixel <= 1:
+                break
+            levelBytesPerPixel /= 2
+        meta = {"region": regionName, "origin": region["Origin"], "length": region["Length"], "levels": levels, "labels": labels}
+        f.write(HTML_HEAD % {"title": escape(regionName), "meta": json.dumps(meta).replace("</", "<\\/")})
+        for part in tileParts:
+            f.write(part)
+        f.write(HTML_TAIL)
+    return len(levels)
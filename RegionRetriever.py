@@ -1,44 +1,39 @@
 import json
-import re
-from elftools.elf.elffile import ELFFile
+from MapParser import MapParser
+from Timings import phase
 
 class RegionRetriever:
-    def __init__(self, elfFile=None, mapFile=None):
+    def __init__(self, elfFile=None, mapFile=None, cache=None, elf=None):
+        # elf is the ELFFile of elfFile when it is already open
         def retrieveMemoryConfFromMap(mapfile):
-            patternIni = re.compile(r"^Memory Configuration$")
-            patternMem = re.compile(r"^[A-Za-z0-9_\*]+\s+0x[0-9a-fA-F]{8,16}\s+0x[0-9a-fA-F]{8,16}\s+.*$")
-            keys = ("Origin","Length","Attributes")
-            with open(mapfile, "r") as a_file:
-                line = a_file.readline()
-                while line:
-                    matchObj = patternIni.match(line)
-                    if matchObj:
-                        break
-                    line = a_file.readline()
-
-                memDict = {}
-                line = a_file.readline()
-                while line:
-                    matchObj = patternMem.match(line)
-                    if matchObj:
-                        memDesc = line.strip().split()
-                        if "*default*" == memDesc[0]:
-                            break
-                        memDict[memDesc[0]] = dict(zip(keys, (int(memDesc[1], 16), int(memDesc[2], 16), ' '.join(memDesc[3:]))))
-                    line = a_file.readline()
-            return memDict
+            return MapParser(mapfile, (MapParser.MEMORY_CONFIGURATION,)).GetMemoryConfiguration()
 
         def retrieveMemoryConfFromElf(elffile):
+            if elf is not None:
+                return json.loads(elf.get_section_by_name(".memory_configuration").data())
+            # pyelftools is loaded only when there is an elf to read
+            from elftools.elf.elffile import ELFFile
             memConf = None
             with open(elffile, 'rb') as f:
                 sect = ELFFile(f).get_section_by_name(".memory_configuration")
                 memConf = json.loads(sect.data())
             return memConf
 
-        try:
-            self.memConf = retrieveMemoryConfFromElf(elfFile)
-        except:
-            self.memConf = retrieveMemoryConfFromMap(mapFile)
+        def retrieveMemoryConf(elfFile, mapFile):
+            with phase("regions") as currentPhase:
+                try:
+                    if elfFile is None and elf is None:
+                        raise ValueError("no elf file")
+                    memConf = retrieveMemoryConfFromElf(elfFile)
+                except:
+                    memConf = retrieveMemoryConfFromMap(mapFile)
+                currentPhase.items = len(memConf)
+            return memConf
+
+        if cache is None:
+            self.memConf = retrieveMemoryConf(elfFile, mapFile)
+        else:
+            self.memConf = cache.lookup("regions", (elfFile, mapFile), None, lambda: retrieveMemoryConf(elfFile, mapFile))
 
     def GetRegionsJson(self):
         return json.dumps(self.memConf)
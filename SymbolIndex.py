@@ -0,0 +1,244 @@
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+from SymbolTable import SymbolTable, StringTable
+
+SECTION_NAME = ".memory_index"
+MAGIC = b"MEMINDEX"
+VERSION = 1
+# magic, version, blocks
+HEADER = struct.Struct("<8sII")
+# name, typecode ('s' for a string table), count, offset, size
+BLOCK = struct.Struct("<8scxxxIII")
+BLOCK_ALIGN = 8
+
+SHT_PROGBITS = 1
+SHT_NOBITS = 8
+SHF_ALLOC = 0x2
+
+def alignUp(value, align):
+    return (value + align - 1) // align * align
+
+class ElfHeaders:
+    # The section headers of an elf image (bytes or mmap) read with struct, so
+    # the index can be found without loading pyelftools
+    def __init__(self, data):
+        if data[:4] != b"\x7fELF":
+            raise ValueError("not an elf file")
+        self.is64 = 2 == data[4]
+        self.order = "<" if 1 == data[5] else ">"
+        if self.is64:
+            self.phoffAt, self.shoffAt, self.phnumAt, self.shnumAt = 0x20, 0x28, 0x36, 0x3c
+            self.entry = struct.Struct(self.order + "IIQQQQIIQQ")
+        else:
+            self.phoffAt, self.shoffAt, self.phnumAt, self.shnumAt = 0x1c, 0x20, 0x2a, 0x30
+            self.entry = struct.Struct(self.order + "IIIIIIIIII")
+        self.phoff, = struct.unpack_from(self.order + ("Q" if self.is64 else "I"), data, self.phoffAt)
+        phentsize, phnum = struct.unpack_from(self.order + "HH", data, self.phnumAt)
+        self.phend = self.phoff + phentsize * phnum
+        self.shoff, = struct.unpack_from(self.order + ("Q" if self.is64 else "I"), data, self.shoffAt)
+        shnum, self.shstrndx = struct.unpack_from(self.order + "HH", data, self.shnumAt)
+        if 0 == shnum and self.shoff:
+            raise ValueError("extended section numbering is not supported")
+        # name offset, type, flags, addr, offset, size, link, info, addralign, entsize
+        self.headers = [list(self.entry.unpack_from(data, self.shoff + index * self.entry.size)) for index in range(shnum)]
+        self.shstrtab = bytes(self.sectionData(data, self.shstrndx)) if self.headers else b""
+        self.names = [self.shstrtab[header[0]:self.shstrtab.index(b"\0", header[0])].decode("utf-8", "replace") for header in self.headers]
+
+    def sectionData(self, data, index):
+        header = self.headers[index]
+        return memoryview(data)[header[4]:header[4] + header[5]]
+
+    def find(self, name):
+        return self.names.index(name) if name in self.names else None
+
+    def digest(self, data):
+        # the allocated sections (headers and contents) identify the image: the
+        # index of another link is stale
+        digest = hashlib.sha1()
+        for index, (name, header) in enumerate(zip(self.names, self.headers)):
+            if 0 == header[2] & SHF_ALLOC:
+                continue
+            digest.update(struct.pack("<IQQQ", header[1], header[2], header[3], header[5]) + name.encode() + b"\0")
+            if SHT_NOBITS != header[1]:
+                digest.update(self.sectionData(data, index))
+        return digest.hexdigest()
+
+    def trailingOffset(self, index):
+        # the offset of section index when it is at the end of the file, followed at
+        # most by the section name string table and the section header table (as
+        # withSection() leaves it): the file can be cut there and written again
+        start = self.headers[index][4]
+        if self.phend > start:
+            return None
+        for other, header in enumerate(self.headers):
+            if other == index or SHT_NOBITS == header[1] or 0 == header[5]:
+                continue
+            if header[4] + header[5] > start and not (other == self.shstrndx and header[4] >= start):
+                return None
+        return start
+
+    def withSection(self, data, name, payload):
+        # a copy of the image with the section name set to payload (non allocated);
+        # payload, section name string table and section header table are appended.
+        # When the section is already at the end of the file (an index embedded
+        # before) the file is cut there, so updating the index does not grow it;
+        # otherwise the bytes of the replaced section stay in the file unreferenced
+        out = bytearray(data)
+        headers = [list(header) for header in self.headers]
+        shstrtab = self.shstrtab
+        index = self.find(name)
+        moveShstrtab = False
+        if index is None:
+            shstrtab += name.encode() + b"\0"
+            headers.append([len(self.shstrtab), SHT_PROGBITS, 0, 0, 0, 0, 0, 0, BLOCK_ALIGN, 0])
+            index = len(headers) - 1
+            moveShstrtab = True
+        else:
+            cut = self.trailingOffset(index)
+            if cut is not None:
+                del out[cut:]
+                moveShstrtab = headers[self.shstrndx][4] >= cut
+        out.extend(b"\0" * (alignUp(len(out), BLOCK_ALIGN) - len(out)))
+        headers[index][4] = len(out)
+        headers[index][5] = len(payload)
+        out.extend(payload)
+        if moveShstrtab:
+            headers[self.shstrndx][4] = len(out)
+            headers[self.shstrndx][5] = len(shstrtab)
+            out.extend(shstrtab)
+        out.extend(b"\0" * (alignUp(len(out), BLOCK_ALIGN) - len(out)))
+        if len(headers) >= 0xff00:
+            raise ValueError("too many sections")
+        struct.pack_into(self.order + ("Q" if self.is64 else "I"), out, self.shoffAt, len(out))
+        struct.pack_into(self.order + "H", out, self.shnumAt, len(headers))
+        for header in headers:
+            out.extend(self.entry.pack(*header))
+        return bytes(out)
+
+class SymbolIndex:
+    # Post-link index of an elf: the memory regions, the section totals per region
+    # (the layouts with and without .rodata) and the symbol table columns of
+    # dissect.py, in a versioned binary block embedded as the .memory_index
+    # section. Integer columns are narrowed to 32 bits when they fit and string
+    # columns keep their interned codes, with the string tables NUL separated.
+    # A digest of the allocated sections tells whether the index belongs to the
+    # elf it is read from.
+    def __init__(self, regions, layouts, symbolTable, digest=None):
+        self.regions = regions
+        # toDict() of the layouts without and with .rodata
+        self.layouts = layouts
+        self.symbolTable = symbolTable
+        self.digest = digest
+
+    @classmethod
+    def fromFirmware(cls, firmware):
+        with open(firmware.elfFile, 'rb') as f:
+            data = f.read()
+        layouts = [firmware.layout(rodata).toDict() for rodata in (False, True)]
+        return cls(firmware.regions, layouts, firmware.symbolTable, ElfHeaders(data).digest(data))
+
+    def layout(self, rodata=False):
+        from LayoutEngine import LayoutResult
+        return LayoutResult.fromDict(self.layouts[1 if rodata else 0], self.regions)
+
+    def toBytes(self):
+        blocks = []
+        meta = {"digest": self.digest, "regions": self.regions, "layouts": self.layouts}
+        blocks.append((b"meta", b"s", 0, json.dumps(meta).encode()))
+        columns = self.symbolTable.columns
+        for name, typecode, interned in SymbolTable.COLUMNS:
+            column = columns[name]
+            if 'Q' == typecode and all(value < (1 << 32) for value in column):
+                column = array('I', column)
+            if "big" == sys.byteorder:
+                column = array(column.typecode, column)
+                column.byteswap()
+            blocks.append((name.encode(), column.typecode.encode(), len(column), column.tobytes()))
+            if interned:
+                strings = self.symbolTable.strings[name].strings
+                blocks.append((b"s:" + name.encode(), b"s", len(strings), "\0".join(strings).encode()))
+        offset = alignUp(HEADER.size + BLOCK.size * len(blocks), BLOCK_ALIGN)
+        directory = [HEADER.pack(MAGIC, VERSION, len(blocks))]
+        payload = []
+        for name, typecode, count, blob in blocks:
+            directory.append(BLOCK.pack(name, typecode, count, offset, len(blob)))
+            padding = alignUp(len(blob), BLOCK_ALIGN) - len(blob)
+            payload.append(blob + b"\0" * padding)
+            offset += len(blob) + padding
+        directory = b"".join(directory)
+        return directory + b"\0" * (alignUp(len(directory), BLOCK_ALIGN) - len(directory)) + b"".join(payload)
+
+    @classmethod
+    def fromBytes(cls, data):
+        magic, version, count = HEADER.unpack_from(data, 0)
+        if MAGIC != magic:
+            raise ValueError("not a memory index")
+        if VERSION != version:
+            raise ValueError("memory index version %d, %d expected" % (version, VERSION))
+        # a truncated or foreign index is a ValueError, as a stale one, never a crash
+        if HEADER.size + count * BLOCK.size > len(data):
+            raise ValueError("memory index directory out of range")
+        blocks = {}
+        for index in range(count):
+            name, typecode, items, offset, size = BLOCK.unpack_from(data, HEADER.size + index * BLOCK.size)
+            if offset + size > len(data):
+                raise ValueError("memory index block %r out of range" % name)
+            blocks[name.rstrip(b"\0").decode()] = (typecode.decode(), items, data[offset:offset + size])
+
+        def block(name):
+            if name not in blocks:
+                raise ValueError("memory index without the %s block" % name)
+            return blocks[name]
+        meta = json.loads(bytes(block("meta")[2]))
+        if not isinstance(meta, dict) or any(key not in meta for key in ("regions", "layouts", "digest")):
+            raise ValueError("memory index with an invalid meta block")
+        columns = {}
+        strings = {}
+        for name, typecode, interned in SymbolTable.COLUMNS:
+            storedTypecode, items, blob = block(name)
+            column = array(storedTypecode)
+            column.frombytes(blob)
+            if "big" == sys.byteorder:
+                column.byteswap()
+            if len(column) != items or len(column) != len(columns.get("addr", column)):
+                raise ValueError("memory index column %s of %d items, %d expected" % (name, len(column), items))
+            columns[name] = column if storedTypecode == typecode else array(typecode, column)
+            if interned:
+                _, items, blob = block("s:" + name)
+                table = StringTable()
+                table.strings = bytes(blob).decode().split("\0") if items else []
+                table.indexes = dict((string, code) for code, string in enumerate(table.strings))
+                if len(column) and max(column) >= len(table.strings):
+                    raise ValueError("memory index column %s with codes out of its string table" % name)
+                strings[name] = table
+        return cls(meta["regions"], meta["layouts"], SymbolTable(columns, strings), meta["digest"])
+
+    @classmethod
+    def fromElf(cls, elfFile):
+        # the index embedded in elfFile, None when there is none or it is stale
+        # (of another link or of another version of this module)
+        with open(elfFile, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                headers = ElfHeaders(data)
+                index = headers.find(SECTION_NAME)
+                if index is None:
+                    return None
+                try:
+                    symbolIndex = cls.fromBytes(bytes(headers.sectionData(data, index)))
+                except (ValueError, struct.error):
+                    return None
+                if symbolIndex.digest != headers.digest(data):
+                    return None
+                return symbolIndex
+
+def embed(elfFile, outFile, payload):
+    # writes outFile as elfFile with the .memory_index section set to payload
+    with open(elfFile, 'rb') as f:
+        data = f.read()
+    data = ElfHeaders(data).withSection(data, SECTION_NAME, payload)
+    with open(outFile, 'wb') as f:
+        f.write(data)
@@ -0,0 +1,70 @@
+from elftools.elf.elffile import ELFFile
+from elftools.elf.sections import SymbolTableSection
+from elftools.elf.constants import SH_FLAGS
+
+class SymbolRetriever:
+    def __init__(self, elfFile, elf=None):
+        # elf is the ELFFile of elfFile when it is already open
+        def sectionType(section):
+            # same classification as binutils' decode_section_type()
+            flags = section['sh_flags']
+            if 0 != (flags & SH_FLAGS.SHF_EXECINSTR):
+                return 't'
+            if 0 != (flags & SH_FLAGS.SHF_ALLOC):
+                if section['sh_type'] == 'SHT_NOBITS':
+                    return 'b'
+                if 0 == (flags & SH_FLAGS.SHF_WRITE):
+                    return 'r'
+                return 'd'
+            if section.name.startswith(".debug"):
+                return 'N'
+            return 'n'
+
+        def symbolType(symbol, sectionTypes):
+            bind = symbol['st_info']['bind']
+            stype = symbol['st_info']['type']
+            if 'STT_GNU_IFUNC' == stype:
+                return 'i'
+            if 'STB_WEAK' == bind:
+                return 'V' if 'STT_OBJECT' == stype else 'W'
+            if 'STB_GNU_UNIQUE' == bind:
+                return 'u'
+            if 'SHN_ABS' == symbol['st_shndx']:
+                attr = 'a'
+            else:
+                attr = sectionTypes.get(symbol['st_shndx'], '?')
+            if 'STB_GLOBAL' == bind:
+                attr = attr.upper()
+            return attr
+
+        def retreiveRecords(elfFileObj):
+            records = []
+            sectionTypes = {}
+            for index, section in enumerate(elfFileObj.iter_sections()):
+                sectionTypes[index] = sectionType(section)
+            for symtab in elfFileObj.iter_sections():
+                if not isinstance(symtab, SymbolTableSection) or symtab['sh_type'] != 'SHT_SYMTAB':
+                    continue
+                for symbol in symtab.iter_symbols():
+                    if ( 0 == symbol['st_size'] or
+                            symbol['st_shndx'] in ('SHN_UNDEF', 'SHN_COMMON') or
+                            symbol['st_info']['type'] in ('STT_SECTION', 'STT_FILE') ):
+                        continue
+                    records.append((symbol['st_value'], symbol['st_size'], symbolType(symbol, sectionTypes), symbol.name, ""))
+            return records
+
+        def retreiveSymbolRecords(elfFile):
+            # emulates "nm -n -S --defined-only": only defined symbols with a size,
+            # sorted by address (and by name for symbols at the same address)
+            if elf is None:
+                with open(elfFile, 'rb') as f:
+                    records = retreiveRecords(ELFFile(f))
+            else:
+                records = retreiveRecords(elf)
+            records.sort(key=lambda record: (record[0], record[3]))
+            return records
+
+        self.symbolRecords = retreiveSymbolRecords(elfFile)
+
+    def GetSymbols(self):
+        return self.symbolRecords
@@ -0,0 +1,194 @@
+import os
+from array import array
+
+# numpy is optional: when available, filters and rollups run on whole columns
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.indexes = {}
+
+    def intern(self, string):
+        index = self.indexes.get(string)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(string)
+            self.indexes[string] = index
+        return index
+
+# nm types of the symbols that can be thumb functions (their address has bit 0 set)
+CODE_TYPES = "tTwWiI"
+
+def libraryName(objectFile):
+    # "/path/libfoo.a(bar.o)" -> "libfoo.a", plain objects have no library
+    if objectFile.endswith(")") and "(" in objectFile:
+        return os.path.basename(objectFile[:objectFile.index("(")])
+    return ""
+
+class SymbolTable:
+    GROUP_KEYS = ('region', 'file', 'object', 'library', 'type')
+    # column name, array typecode, interned
+    COLUMNS = ( ("addr", 'Q', False),
+                ("dim", 'Q', False),
+                ("attr", 'I', True),
+                ("name", 'I', True),
+                ("file", 'I', True),
+                ("line", 'I', False),
+                ("object", 'I', True),
+                ("region", 'I', True),
+                ("fill", 'B', False))
+
+    def __init__(self, columns=None, strings=None):
+        if strings is None:
+            strings = dict((name, StringTable()) for name, _, interned in self.COLUMNS if interned)
+        if columns is None:
+            columns = dict((name, array(typecode)) for name, typecode, _ in self.COLUMNS)
+        self.strings = strings
+        self.columns = columns
+
+    def appender(self):
+        # a function appending a row, with the values in COLUMNS order: the rows
+        # go straight into the columns, no dict is built
+        addrs, dims, attrs, names, files, lines, objects, regions, fills = (self.columns[name].append for name, _, _ in self.COLUMNS)
+        internAttr, internName, internFile, internObject, internRegion = (self.strings[name].intern for name in ("attr", "name", "file", "object", "region"))
+
+        def append(addr, dim, attr, name, fileName, line, objectFile, region, fill):
+            addrs(addr)
+            dims(dim)
+            attrs(internAttr(attr))
+            names(internName(name))
+            files(internFile(fileName))
+            lines(line)
+            objects(internObject(objectFile))
+            regions(internRegion(region))
+            fills(fill)
+        return append
+
+    @classmethod
+    def fromSymbols(cls, symbolsList):
+        table = cls()
+        append = table.appender()
+        for symbol in symbolsList:
+            append(*(symbol.get(name, "") if interned else int(symbol.get(name) or 0) for name, _, interned in cls.COLUMNS))
+        return table
+
+    def __len__(self):
+        return len(self.columns["addr"])
+
+    def __getitem__(self, index):
+        row = {}
+        for name, _, interned in self.COLUMNS:
+            value = self.columns[name][index]
+            row[name] = self.strings[name].strings[value] if interned else value
+        row["fill"] = bool(row["fill"])
+        return row
+
+    def __iter__(self):
+        # the rows as dicts, for the callers that want records
+        names = [name for name, _, _ in self.COLUMNS]
+        for values in self.rows(*names):
+            row = dict(zip(names, values))
+            row["fill"] = bool(row["fill"])
+            yield row
+
+    def rows(self, *names):
+        # tuples of the values of the given columns, row by row, without dicts
+        return zip(*[map(self.strings[name].strings.__getitem__, self.columns[name]) if name in self.strings else self.columns[name]
+                     for name in names])
+
+    def column(self, name):
+        # values (not codes) of a column
+        column = self.columns[name]
+        if name in self.strings:
+            strings = self.strings[name].strings
+            return [strings[code] for code in column]
+        return column
+
+    def take(self, indices):
+        columns = {}
+        for name, typecode, _ in self.COLUMNS:
+            source = self.columns[name]
+            if numpy is not None:
+                columns[name] = array(typecode, numpy.frombuffer(source, dtype=source.typecode)[numpy.asarray(indices, dtype=numpy.intp)].tobytes()) if len(source) else array(typecode)
+            else:
+                columns[name] = array(typecode, [source[index] for index in indices])
+        return SymbolTable(columns, self.strings)
+
+    def where(self, name, value):
+        # indices of the rows whose column `name` is equal to `value`
+        column = self.columns[name]
+        if name in self.strings:
+            value = self.strings[name].indexes.get(value)
+            if value is None:
+                return []
+        if numpy is not None and len(column):
+            return numpy.flatnonzero(numpy.frombuffer(column, dtype=column.typecode) == value)
+        return [index for index, code in enumerate(column) if code == value]
+
+    def filter(self, region=None, fill=True, uniq=False):
+        indices = range(len(self)) if region is None else self.where("region", region)
+        if not fill:
+            fillColumn = self.columns["fill"]
+            indices = [index for index in indices if not fillColumn[index]]
+        if uniq:
+            # symbols @address already populated are dropped (the table is sorted by address)
+            addrColumn = self.columns["addr"]
+            uniqIndices = []
+            lastaddr = -1
+            for index in indices:
+                if addrColumn[index] != lastaddr:
+                    uniqIndices.append(index)
+                    lastaddr = addrColumn[index]
+            indices = uniqIndices
+        return self.take(indices)
+
+    def sortBy(self, name, reverse=False):
+        column = self.columns[name]
+        if name in self.strings:
+            strings = self.strings[name].strings
+            indices = sorted(range(len(column)), key=lambda index: strings[column[index]], reverse=reverse)
+        elif numpy is not None and len(column):
+            indices = numpy.argsort(numpy.frombuffer(column, dtype=column.typecode), kind='stable')
+            if reverse:
+                indices = indices[::-1]
+        else:
+            indices = sorted(range(len(column)), key=column.__getitem__, reverse=reverse)
+        return self.take(indices)
+
+    def groupBy(self, key):
+        # (key, symbols, size) per group, biggest groups first
+        if 'type' == key:
+            key = 'attr'
+        if 'library' == key:
+            objectStrings = self.strings["object"].strings
+            libraries = StringTable()
+            translation = [libraries.intern(libraryName(objectFile)) for objectFile in objectStrings]
+            codes = self.columns["object"]
+            groupNames = libraries.strings
+        else:
+            translation = None
+            codes = self.columns[key]
+            groupNames = self.strings[key].strings
+        groupCount = len(groupNames)
+        dims = self.columns["dim"]
+        if numpy is not None and len(codes):
+            codeArray = numpy.frombuffer(codes, dtype=codes.typecode)
+            if translation is not None:
+                codeArray = numpy.asarray(translation, dtype=numpy.intp)[codeArray]
+            counts = numpy.bincount(codeArray, minlength=groupCount).tolist()
+            sizes = numpy.bincount(codeArray, weights=numpy.frombuffer(dims, dtype=dims.typecode), minlength=groupCount).astype(numpy.int64).tolist()
+        else:
+            counts = [0] * groupCount
+            sizes = [0] * groupCount
+            for code, dim in zip(codes, dims):
+                if translation is not None:
+                    code = translation[code]
+                counts[code] += 1
+                sizes[code] += dim
+        groups = [(groupNames[code], counts[code], sizes[code]) for code in range(groupCount) if counts[code]]
+        groups.sort(key=lambda group: (-group[2], group[0]))
+        return groups
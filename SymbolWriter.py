@@ -0,0 +1,183 @@
+import csv
+import gzip
+import json
+import re
+import sys
+
+# zstandard is optional: without it only gzip compression is available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# field, header
+FIELDS = ( ("region", "Region"),
+           ("addr", "addr(hex)"),
+           ("addr-dec", "addr(dec)"),
+           ("size", "size(dec)"),
+           ("type", "type"),
+           ("symbol", "symbol"),
+           ("path", "path"))
+FIELD_NAMES = tuple(field for field, _ in FIELDS)
+OUT_TYPES = ('normal', 'csv', 'ndjson')
+COMPRESSIONS = {'gzip': ".gz", 'zstd': ".zst"}
+# rows formatted and written at once
+CHUNK = 1 << 14
+
+def compressionOf(fileName):
+    for compression, suffix in COMPRESSIONS.items():
+        if fileName is not None and fileName.endswith(suffix):
+            return compression
+    return None
+
+def openOutput(fileName=None, compression=None):
+    # a text stream on the file (stdout when None), compressed on the fly
+    if compression is None:
+        return sys.stdout if fileName is None else open(fileName, "w")
+    target = sys.stdout.buffer if fileName is None else fileName
+    if 'zstd' == compression:
+        if zstandard is None:
+            raise ImportError("zstd compression needs the zstandard package")
+        return zstandard.open(target, "wt", closefd=fileName is not None)
+    # the compression level is a trade off: the output should be I/O bound
+    return gzip.open(target, "wt", compresslevel=6)
+
+def parseFields(text):
+    fields = [field.strip() for field in text.split(",") if field.strip()]
+    for field in fields:
+        if field not in FIELD_NAMES:
+            raise ValueError("unknown column %s (choose among %s)" % (field, ", ".join(FIELD_NAMES)))
+    return fields
+
+def pathColumn(files, lines, noline):
+    if noline:
+        return files
+    return [fileName + ":%d" % line if line > 0 and fileName else fileName for fileName, line in zip(files, lines)]
+
+class TextWriter:
+    # the fixed width columns of dissect.py, one % per row and one write per chunk
+    encodeStrings = False
+    FORMATS = {"region": "%%%ds", "addr": "0x%08x", "addr-dec": "%12d", "size": "%9d", "type": "%5s", "symbol": "%%%ds", "path": "%s"}
+
+    def __init__(self, file2out, fields, regionWidth=16, symbolWidth=40):
+        self.file2out = file2out
+        self.fields = fields
+        widths = {"region": max(regionWidth, 16), "symbol": max(symbolWidth, 40)}
+        self.formatStr = " ".join(self.FORMATS[field] % widths[field] if field in widths else self.FORMATS[field] for field in fields) + "\n"
+        headerFormats = {"addr": "%10s", "addr-dec": "%12s", "size": "%9s"}
+        self.headerStr = " ".join(headerFormats.get(field, self.FORMATS[field] % widths[field] if field in widths else self.FORMATS[field])
+                                  for field in fields) + "\n"
+
+    def prepare(self, strings):
+        pass
+
+    def writeHeader(self):
+        self.file2out.write(self.headerStr % tuple(dict(FIELDS)[field] for field in self.fields))
+
+    def writeRows(self, columns):
+        formatStr = self.formatStr
+        self.file2out.write("".join([formatStr % row for row in zip(*[columns[field] for field in self.fields])]))
+
+class CsvWriter:
+    # quoting through the csv module, so names with commas or quotes stay one
+    # field; when no string needs quotes the rows are formatted as plain text
+    encodeStrings = False
+    FORMATS = {"region": "%s", "addr": "0x%08x", "addr-dec": "%d", "size": "%d", "type": "%s", "symbol": "%s", "path": "%s"}
+    QUOTE_RE = re.compile(r'[,"\r\n]')
+
+    def __init__(self, file2out, fields):
+        self.file2out = file2out
+        self.writer = csv.writer(file2out, lineterminator="\n")
+        self.fields = fields
+        self.formatStr = ",".join(self.FORMATS[field] for field in fields) + "\n"
+        self.plain = False
+
+    def prepare(self, strings):
+        # the distinct strings of the fields written
+        self.plain = not any(self.QUOTE_RE.search(value) for values in strings.values() for value in values)
+
+    def writeHeader(self):
+        self.writer.writerow([dict(FIELDS)[field] for field in self.fields])
+
+    def writeRows(self, columns):
+        rows = zip(*[columns[field] for field in self.fields])
+        if self.plain:
+            formatStr = self.formatStr
+            self.file2out.write("".join([formatStr % row for row in rows]))
+            return
+        if "addr" in self.fields:
+            addrIndex = self.fields.index("addr")
+            rows = (row[:addrIndex] + ("0x%08x" % row[addrIndex],) + row[addrIndex + 1:] for row in rows)
+        self.writer.writerows(rows)
+
+class NdjsonWriter:
+    # a JSON object per line; the strings are encoded once per distinct value
+    encodeStrings = True
+    KEYS = {"region": ("region", "%s"), "addr": ("addr", "%d"), "addr-dec": ("addr", "%d"), "size": ("size", "%d"),
+            "type": ("type", "%s"), "symbol": ("symbol", "%s"), "path": ("file", "%s")}
+
+    def __init__(self, file2out, fields, noline=False):
+        self.file2out = file2out
+        self.columnNames = []
+        parts = []
+        for field in fields:
+            key, valueFormat = self.KEYS[field]
+            if key in [name for name, _ in self.columnNames]:
+                continue
+            self.columnNames.append((key, field))
+            parts.append('"%s": %s' % (key, valueFormat))
+            if "path" == field and not noline:
+                self.columnNames.append(("line", "line"))
+                parts.append('"line": %d')
+        self.formatStr = "{" + ", ".join(parts) + "}\n"
+        self.fields = [field for _, field in self.columnNames if "line" != field]
+
+    def prepare(self, strings):
+        pass
+
+    def writeHeader(self):
+        pass
+
+    def writeRows(self, columns):
+        formatStr = self.formatStr
+        self.file2out.write("".join([formatStr % row for row in zip(*[columns[field] for _, field in self.columnNames])]))
+
+def makeWriter(outType, file2out, fields, noline=False, regionWidth=16, symbolWidth=40):
+    if 'csv' == outType:
+        return CsvWriter(file2out, fields)
+    if 'ndjson' == outType:
+        return NdjsonWriter(file2out, fields, noline)
+    return TextWriter(file2out, fields, regionWidth, symbolWidth)
+
+def writeSymbols(writer, symbolTable, noline=False):
+    # the columns are built a chunk at a time, only for the fields written; the
+    # interned strings are looked up (and JSON encoded) once per distinct value
+    fields = set(writer.fields)
+    strings = {}
+    for field, column in (("region", "region"), ("type", "attr"), ("symbol", "name"), ("path", "file")):
+        if field in fields:
+            values = symbolTable.strings[column].strings
+            strings[field] = [json.dumps(value) for value in values] if writer.encodeStrings else values
+    writer.prepare(strings)
+    columns = symbolTable.columns
+    count = len(symbolTable)
+    for start in range(0, count, CHUNK):
+        end = min(start + CHUNK, count)
+        chunk = {}
+        for field, column in (("region", "region"), ("type", "attr"), ("symbol", "name")):
+            if field in fields:
+                values = strings[field]
+                chunk[field] = [values[code] for code in columns[column][start:end]]
+        if "addr" in fields or "addr-dec" in fields:
+            chunk["addr"] = chunk["addr-dec"] = columns["addr"][start:end]
+        if "size" in fields:
+            chunk["size"] = columns["dim"][start:end]
+        if "path" in fields:
+            files = [strings["path"][code] for code in columns["file"][start:end]]
+            if writer.encodeStrings:
+                chunk["path"] = files
+                chunk["line"] = columns["line"][start:end]
+            else:
+                chunk["path"] = pathColumn(files, columns["line"][start:end], noline)
+        writer.writeRows(chunk)
+    return count
@@ -0,0 +1,125 @@
+import bisect
+from IntervalIndex import IntervalIndex
+from SymbolTable import CODE_TYPES
+
+# numpy is optional: when available, a batch of addresses is looked up at once
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def flatten(index):
+    # bounds and values of the disjoint segments of an IntervalIndex (the value
+    # that wins in each one, -1 where none does); the first bound is always 0, so
+    # every address falls in a segment
+    bounds = [0]
+    values = [-1]
+    for bound, owner in zip(index.bounds, index.owners):
+        value = index.values[owner] if owner is not None else -1
+        if bound == bounds[-1]:
+            values[-1] = value
+        elif value != values[-1]:
+            bounds.append(bound)
+            values.append(value)
+    return bounds, values
+
+def sortedSegments(ranges):
+    # the same for (start, end) ranges sorted by start, which should not overlap:
+    # when they do, a range is cut where the next one starts
+    bounds = [0]
+    values = [-1]
+    for index, (start, end) in enumerate(ranges):
+        if end <= start:
+            continue
+        while len(bounds) > 1 and bounds[-1] > start:
+            bounds.pop()
+            values.pop()
+        if bounds[-1] == start:
+            values[-1] = index
+        else:
+            bounds.append(start)
+            values.append(index)
+        bounds.append(end)
+        values.append(-1)
+    return bounds, values
+
+class Symbolizer:
+    # Resolves addresses to region, symbol, offset and file:line. The symbols are
+    # flattened once in disjoint segments, where the smallest symbol containing
+    # the segment wins (a function rather than the object it belongs to), so each
+    # lookup is a binary search.
+    def __init__(self, symbolTable, regions, lineRanges=None, thumb=False):
+        self.table = symbolTable
+        addrs = symbolTable.columns["addr"]
+        dims = symbolTable.columns["dim"]
+        fills = symbolTable.columns["fill"]
+        attrs = symbolTable.strings["attr"].strings
+        attrCodes = symbolTable.columns["attr"]
+        self.starts = {}
+        rows = []
+        for row in range(len(symbolTable)):
+            if fills[row] or 0 == dims[row]:
+                continue
+            start = addrs[row]
+            if thumb and start & 1 and attrs[attrCodes[row]] in CODE_TYPES:
+                start -= 1
+            self.starts[row] = start
+            rows.append((dims[row], start, row))
+        rows.sort()
+        self.symbolBounds, self.symbolRows = flatten(IntervalIndex((start, start + dim, row) for dim, start, row in rows))
+
+        self.regionNames = list(regions)
+        self.regionBounds, self.regionValues = flatten(IntervalIndex(
+            (desc["Origin"], desc["Origin"] + desc["Length"], index) for index, desc in enumerate(regions.values())))
+
+        # the line table of the debug info, for the line of the address itself
+        # rather than the one declaring the symbol
+        self.lineRanges = lineRanges or []
+        self.lineBounds, self.lineValues = sortedSegments((lineRange[0], lineRange[1]) for lineRange in self.lineRanges)
+
+        if numpy is not None:
+            self.arrays = [(numpy.asarray(bounds, dtype=numpy.uint64), numpy.asarray(values, dtype=numpy.int64))
+                           for bounds, values in ((self.symbolBounds, self.symbolRows),
+                                                  (self.regionBounds, self.regionValues),
+                                                  (self.lineBounds, self.lineValues))]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def lookup(self, addresses):
+        # (symbol row, region index, line range index) per address, -1 when missing
+        if numpy is not None and len(addresses) > 1:
+            addrArray = numpy.asarray(addresses, dtype=numpy.uint64)
+            return list(zip(*[values[numpy.searchsorted(bounds, addrArray, side='right') - 1].tolist()
+                              for bounds, values in self.arrays]))
+        return [(self.symbolRows[bisect.bisect_right(self.symbolBounds, addr) - 1],
+                 self.regionValues[bisect.bisect_right(self.regionBounds, addr) - 1],
+                 self.lineValues[bisect.bisect_right(self.lineBounds, addr) - 1]) for addr in addresses]
+
+    def resolve(self, addresses):
+        # {addr, region, symbol, offset, file, line} per address; symbol is "" and
+        # offset is None outside of any symbol
+        names = self.table.strings["name"].strings
+        nameCodes = self.table.columns["name"]
+        files = self.table.strings["file"].strings
+        fileCodes = self.table.columns["file"]
+        lines = self.table.columns["line"]
+        results = []
+        for addr, (row, region, lineRange) in zip(addresses, self.lookup(addresses)):
+            result = {"addr": addr, "region": self.regionNames[region] if region >= 0 else "unknown"}
+            if row >= 0:
+                result["symbol"] = names[nameCodes[row]]
+                result["offset"] = addr - self.starts[row]
+                result["file"] = files[fileCodes[row]]
+                result["line"] = lines[row]
+            else:
+                result["symbol"] = ""
+                result["offset"] = None
+                result["file"] = ""
+                result["line"] = 0
+            # outside of the symbols the line table has only the leftovers of the
+            # sections dropped by the linker (moved at address 0)
+            if lineRange >= 0 and row >= 0:
+                result["file"], result["line"] = self.lineRanges[lineRange][2:4]
+            results.append(result)
+        return results
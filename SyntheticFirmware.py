@@ -0,0 +1,372 @@
+import json
+import random
+import struct
+
+# ELF constants used by the writer
+SHT_PROGBITS = 1
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_NOBITS = 8
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+STB_LOCAL = 0
+STB_GLOBAL = 1
+STT_OBJECT = 1
+STT_FUNC = 2
+STT_FILE = 4
+PT_LOAD = 1
+EM_ARM = 40
+
+FLASH_ORIGIN = 0x60000000
+RAM_ORIGIN = 0x20000000
+RAM_STRIDE = 0x02000000
+COMP_DIR = "/build/synth"
+LIBRARY = "/opt/toolchain/arm-none-eabi/lib/libsynth.a"
+
+elfHeader = struct.Struct("<16sHHIIIIIHHHHHH")
+programHeader = struct.Struct("<IIIIIIII")
+sectionHeader = struct.Struct("<IIIIIIIIII")
+symbolEntry = struct.Struct("<IIIBBH")
+
+def uleb(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def sleb(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if (value == 0 and not byte & 0x40) or (value == -1 and byte & 0x40):
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+def powerOfTwo(size, minimum):
+    length = minimum
+    while length < size:
+        length <<= 1
+    return length
+
+def alignUp(value, align):
+    return (value + align - 1) & ~(align - 1)
+
+class SyntheticFirmware:
+    # Deterministic (per seed) firmware with consistent ELF and GNU ld map files:
+    # one flash region holding .text, .rodata and the load images of the .data
+    # sections, plus `regions - 1` RAM regions with a .data_RAMn (LMA != VMA) and a
+    # .bss_RAMn output section each. Objects have DWARF debug info, except the
+    # members of a library.
+    def __init__(self, symbols=1000, regions=4, seed=0, symbolsPerObject=40, dwarf=True, memoryConfiguration=True):
+        self.regionCount = max(2, regions)
+        self.dwarf = dwarf
+        self.memoryConfiguration = memoryConfiguration
+        rng = random.Random(seed)
+
+        objectCount = max(1, symbols // symbolsPerObject)
+        self.objects = []
+        for index in range(objectCount):
+            if index % 10 == 9:
+                path = "%s(member%d.o)" % (LIBRARY, index)
+                directory = None
+            else:
+                directory = "src/dir%d" % (index % 16)
+                path = "./%s/mod%d.o" % (directory, index)
+            self.objects.append({"path": path, "dir": directory, "source": "mod%d.c" % index,
+                                 "ram": index % (self.regionCount - 1), "symbols": []})
+
+        # symbols: [name, kind, bind, size, align, addr, line]
+        for index in range(symbols):
+            objectIndex = index % objectCount
+            objectData = self.objects[objectIndex]
+            number = len(objectData["symbols"])
+            draw = rng.random()
+            bind = STB_LOCAL if rng.random() < 0.25 else STB_GLOBAL
+            if draw < 0.55:
+                kind, size, align = "text", rng.randrange(2, 400, 2), 4
+            elif draw < 0.7:
+                kind, size = "rodata", rng.randrange(1, 256)
+                align = 4 if size >= 4 else 1
+            elif draw < 0.8:
+                kind, size = "data", rng.randrange(1, 128)
+                align = 4 if size >= 4 else 1
+            else:
+                kind, size = "bss", rng.randrange(1, 128)
+                align = 4 if size >= 4 else 1
+            if STB_LOCAL == bind:
+                # static names are reused by many objects
+                name = "s_%s%d" % (kind, number % 8)
+            else:
+                name = "m%d_%s%d" % (objectIndex, kind, number)
+            objectData["symbols"].append([name, kind, bind, size, align, 0, 10 + 20 * number])
+
+        self.layout()
+        self.crossReferences = {}
+        for objectIndex, objectData in enumerate(self.objects):
+            for symbol in objectData["symbols"]:
+                if STB_GLOBAL == symbol[2]:
+                    refs = [self.objects[rng.randrange(objectCount)]["path"] for _ in range(rng.randrange(3))]
+                    self.crossReferences[symbol[0]] = [objectData["path"]] + [ref for ref in refs if ref != objectData["path"]]
+
+    def layout(self):
+        # output sections: [name, type, flags, region, addr, loadAddr, size, entries]
+        # where entries are (inputSectionName, addr, size, objectPath, symbol) and
+        # fills are (None, addr, size, None, None)
+        self.outputSections = []
+
+        def place(name, sectionType, flags, region, addr, kinds, objectFilter=None):
+            entries = []
+            start = addr
+            for objectData in self.objects:
+                if objectFilter is not None and not objectFilter(objectData):
+                    continue
+                for symbol in objectData["symbols"]:
+                    if symbol[1] not in kinds:
+                        continue
+                    aligned = alignUp(addr, symbol[4])
+                    if aligned != addr:
+                        entries.append((None, addr, aligned - addr, None, None))
+                    symbol[5] = aligned
+                    entries.append((".%s.%s" % (symbol[1], symbol[0]), aligned, symbol[3], objectData["path"], symbol))
+                    addr = aligned + symbol[3]
+            section = [name, sectionType, flags, region, start, start, addr - start, entries]
+            self.outputSections.append(section)
+            return section
+
+        addr = FLASH_ORIGIN
+        for name, kinds, flags in ((".text", ("text",), SHF_ALLOC | SHF_EXECINSTR), (".rodata", ("rodata",), SHF_ALLOC)):
+            section = place(name, SHT_PROGBITS, flags, "FLASH", addr, kinds)
+            addr = alignUp(addr + section[6], 4)
+        self.flashEnd = addr
+
+        self.regions = {}
+        loadAddr = addr
+        for ram in range(self.regionCount - 1):
+            regionName = "RAM%d" % ram
+            ramAddr = RAM_ORIGIN + ram * RAM_STRIDE
+            inRam = lambda objectData, ram=ram: objectData["ram"] == ram
+            data = place(".data_" + regionName, SHT_PROGBITS, SHF_ALLOC | SHF_WRITE, regionName, ramAddr, ("data",), inRam)
+            data[5] = loadAddr
+            loadAddr = alignUp(loadAddr + data[6], 4)
+            bss = place(".bss_" + regionName, SHT_NOBITS, SHF_ALLOC | SHF_WRITE, regionName, alignUp(ramAddr + data[6], 4), ("bss",), inRam)
+            self.regions[regionName] = {"Origin": ramAddr, "Length": powerOfTwo(bss[4] + bss[6] - ramAddr, 0x10000), "Attributes": "xrw"}
+        self.imageEnd = loadAddr
+        self.regions = dict([("FLASH", {"Origin": FLASH_ORIGIN, "Length": powerOfTwo(loadAddr - FLASH_ORIGIN, 0x100000), "Attributes": "xr"})] +
+                            list(self.regions.items()))
+
+    def symbolCount(self):
+        return sum(len(objectData["symbols"]) for objectData in self.objects)
+
+    def writeMap(self, mapFile):
+        with open(mapFile, "w") as f:
+            f.write("Memory Configuration\n\nName             Origin             Length             Attributes\n")
+            for regionName, region in self.regions.items():
+                f.write("%-16s 0x%016x 0x%016x %s\n" % (regionName, region["Origin"], region["Length"], region["Attributes"]))
+            f.write("*default*        0x%016x 0x%016x\n\nLinker script and memory map\n\n" % (0, 0xffffffffffffffff))
+            for objectData in self.objects:
+                if objectData["dir"] is not None:
+                    f.write("LOAD %s\n" % objectData["path"])
+            f.write("START GROUP\nLOAD %s\nEND GROUP\n" % LIBRARY)
+
+            for name, sectionType, flags, region, addr, loadAddr, size, entries in self.outputSections:
+                if size == 0:
+                    continue
+                lines = []
+                header = "%-15s" % name if len(name) < 15 else name + "\n               "
+                lines.append("\n%s 0x%016x %#10x" % (header, addr, size))
+                if loadAddr != addr:
+                    lines.append(" load address 0x%016x" % loadAddr)
+                lines.append("\n *(%s*)\n" % name)
+                for inputName, entryAddr, entrySize, path, symbol in entries:
+                    if inputName is None:
+                        lines.append(" *fill*         0x%016x %#10x \n" % (entryAddr, entrySize))
+                        continue
+                    if len(inputName) < 15:
+                        lines.append(" %-15s0x%016x %#10x %s\n" % (inputName, entryAddr, entrySize, path))
+                    else:
+                        lines.append(" %s\n                0x%016x %#10x %s\n" % (inputName, entryAddr, entrySize, path))
+                    if STB_GLOBAL == symbol[2]:
+                        lines.append("                0x%016x                %s\n" % (entryAddr, symbol[0]))
+                f.write("".join(lines))
+            f.write("OUTPUT(synth.axf elf32-littlearm)\n\nCross Reference Table\n\nSymbol                                            File\n")
+            lines = []
+            for name in sorted(self.crossReferences):
+                paths = self.crossReferences[name]
+                lines.append("%-50s%s\n" % (name, paths[0]))
+                for path in paths[1:]:
+                    lines.append("%-50s%s\n" % ("", path))
+            f.write("".join(lines))
+
+    def buildDwarf(self):
+        abbrev = b"".join((
+            uleb(1), uleb(0x11), b"\x01", bytes((0x03, 0x08, 0x1b, 0x08, 0x10, 0x17, 0, 0)),
+            uleb(2), uleb(0x2e), b"\x00", bytes((0x03, 0x08, 0x3a, 0x0f, 0x3b, 0x0f, 0x11, 0x01, 0x12, 0x06, 0x3f, 0x0c, 0, 0)),
+            uleb(3), uleb(0x34), b"\x00", bytes((0x03, 0x08, 0x3a, 0x0f, 0x3b, 0x0f, 0x3f, 0x0c, 0x02, 0x18, 0, 0)),
+            b"\x00"))
+        info = []
+        infoSize = 0
+        line = []
+        lineSize = 0
+        for objectData in self.objects:
+            if objectData["dir"] is None:
+                continue
+            functions = sorted((symbol for symbol in objectData["symbols"] if "text" == symbol[1]), key=lambda symbol: symbol[5])
+
+            # line program: one sequence covering the functions of the object
+            program = []
+            if functions:
+                currentLine = 1
+                currentAddr = functions[0][5]
+                program.append(b"\x00" + uleb(5) + b"\x02" + struct.pack("<I", currentAddr))
+                for symbol in functions:
+                    if symbol[5] != currentAddr:
+                        program.append(b"\x02" + uleb(symbol[5] - currentAddr))
+                    program.append(b"\x03" + sleb(symbol[6] - currentLine) + b"\x01")
+                    currentAddr = symbol[5]
+                    currentLine = symbol[6]
+                    # the body of the function, one line below the declaration
+                    program.append(b"\x02" + uleb(2) + b"\x03" + sleb(1) + b"\x01")
+                    currentAddr += 2
+                    currentLine += 1
+                end = functions[-1][5] + functions[-1][3]
+                program.append(b"\x02" + uleb(end - currentAddr) + b"\x00" + uleb(1) + b"\x01")
+            program = b"".join(program)
+            headerRest = (bytes((1, 1, 1, (-5) & 0xff, 14, 13)) + bytes((0, 1, 1, 1, 1, 0, 0, 0, 1, 0, 0, 1)) +
+                          objectData["dir"].encode() + b"\x00\x00" +
+                          objectData["source"].encode() + b"\x00" + uleb(1) + uleb(0) + uleb(0) + b"\x00")
+            unit = struct.pack("<HI", 4, len(headerRest)) + headerRest + program
+            stmtList = lineSize
+            line.append(struct.pack("<I", len(unit)) + unit)
+            lineSize += 4 + len(unit)
+
+            dies = [uleb(1), ("%s/%s" % (objectData["dir"], objectData["source"])).encode() + b"\x00",
+                    COMP_DIR.encode() + b"\x00", struct.pack("<I", stmtList)]
+            for name, kind, bind, size, align, addr, declLine in objectData["symbols"]:
+                external = b"\x01" if STB_GLOBAL == bind else b"\x00"
+                if "text" == kind:
+                    dies.append(uleb(2) + name.encode() + b"\x00" + uleb(1) + uleb(declLine) +
+                                struct.pack("<II", addr, size) + external)
+                else:
+                    dies.append(uleb(3) + name.encode() + b"\x00" + uleb(1) + uleb(declLine) + external +
+                                uleb(5) + b"\x03" + struct.pack("<I", addr))
+            dies.append(b"\x00")
+            body = struct.pack("<HIB", 4, 0, 4) + b"".join(dies)
+            info.append(struct.pack("<I", len(body)) + body)
+            infoSize += 4 + len(body)
+        return [(".debug_abbrev", abbrev), (".debug_info", b"".join(info)), (".debug_line", b"".join(line))]
+
+    def writeElf(self, elfFile):
+        sections = []   # name, type, flags, addr, offset, size, link, info, align, entsize, data
+        segments = []   # type, offset, vaddr, paddr, filesz, memsz, flags, align
+        headersEnd = elfHeader.size + programHeader.size * (1 + self.regionCount - 1)
+
+        def segmentOffset(offset, addr):
+            # file offset congruent with the address modulo the segment alignment
+            offset = alignUp(offset, 4)
+            delta = (addr - offset) & 0xffff
+            return offset + delta
+
+        offset = segmentOffset(headersEnd, FLASH_ORIGIN)
+        flashOffset = offset
+        for name, sectionType, flags, region, addr, loadAddr, size, entries in self.outputSections:
+            if "FLASH" != region:
+                continue
+            sections.append([name, sectionType, flags, addr, offset + addr - FLASH_ORIGIN, size, 0, 0, 4, 0, None])
+        segments.append((PT_LOAD, flashOffset, FLASH_ORIGIN, FLASH_ORIGIN, self.flashEnd - FLASH_ORIGIN, self.flashEnd - FLASH_ORIGIN, 5, 0x10000))
+        offset = flashOffset + self.flashEnd - FLASH_ORIGIN
+
+        outputs = [section for section in self.outputSections if "FLASH" != section[3]]
+        for data, bss in zip(outputs[0::2], outputs[1::2]):
+            offset = segmentOffset(offset, data[4])
+            sections.append([data[0], SHT_PROGBITS, data[2], data[4], offset, data[6], 0, 0, 4, 0, None])
+            sections.append([bss[0], SHT_NOBITS, bss[2], bss[4], offset + bss[4] - data[4], bss[6], 0, 0, 4, 0, None])
+            segments.append((PT_LOAD, offset, data[4], data[5], data[6], bss[4] + bss[6] - data[4], 6, 0x10000))
+            offset += data[6]
+
+        extra = []
+        if self.dwarf:
+            extra += self.buildDwarf()
+        if self.memoryConfiguration:
+            extra.append((".memory_configuration", json.dumps(self.regions).encode()))
+        for name, data in extra:
+            sections.append([name, SHT_PROGBITS, 0, 0, offset, len(data), 0, 0, 1, 0, data])
+            offset += len(data)
+
+        # symbol table: a file symbol followed by the locals of each object, then the globals
+        sectionIndexes = dict((section[0], index + 1) for index, section in enumerate(sections))
+        strtab = bytearray(b"\x00")
+        stringOffsets = {}
+
+        def string(name):
+            offset = stringOffsets.get(name)
+            if offset is None:
+                offset = stringOffsets[name] = len(strtab)
+                strtab.extend(name.encode() + b"\x00")
+            return offset
+
+        def entry(symbol, objectData, bind):
+            name, kind, _, size, _, addr, _ = symbol
+            if "text" == kind:
+                # thumb functions have the lowest bit set
+                return symbolEntry.pack(string(name), addr | 1, size, (bind << 4) | STT_FUNC, 0, sectionIndexes[".text"])
+            if "rodata" == kind:
+                sectionName = ".rodata"
+            else:
+                sectionName = ".%s_RAM%d" % (kind, objectData["ram"])
+            return symbolEntry.pack(string(name), addr, size, (bind << 4) | STT_OBJECT, 0, sectionIndexes[sectionName])
+
+        entries = [symbolEntry.pack(0, 0, 0, 0, 0, 0)]
+        for objectData in self.objects:
+            source = objectData["source"]
+            entries.append(symbolEntry.pack(string(source), 0, 0, (STB_LOCAL << 4) | STT_FILE, 0, 0xfff1))
+            entries.extend(entry(symbol, objectData, STB_LOCAL) for symbol in objectData["symbols"] if STB_LOCAL == symbol[2])
+        firstGlobal = len(entries)
+        for objectData in self.objects:
+            entries.extend(entry(symbol, objectData, STB_GLOBAL) for symbol in objectData["symbols"] if STB_GLOBAL == symbol[2])
+        symtab = b"".join(entries)
+
+        offset = alignUp(offset, 4)
+        symtabIndex = len(sections) + 1
+        sections.append([".symtab", SHT_SYMTAB, 0, 0, offset, len(symtab), symtabIndex + 1, firstGlobal, 4, symbolEntry.size, symtab])
+        offset += len(symtab)
+        sections.append([".strtab", SHT_STRTAB, 0, 0, offset, len(strtab), 0, 0, 1, 0, bytes(strtab)])
+        offset += len(strtab)
+
+        shstrtab = bytearray(b"\x00")
+        nameOffsets = []
+        for section in sections + [[".shstrtab"]]:
+            nameOffsets.append(len(shstrtab))
+            shstrtab.extend(section[0].encode() + b"\x00")
+        sections.append([".shstrtab", SHT_STRTAB, 0, 0, offset, len(shstrtab), 0, 0, 1, 0, bytes(shstrtab)])
+        offset += len(shstrtab)
+        sectionHeadersOffset = alignUp(offset, 4)
+
+        with open(elfFile, "wb") as f:
+            ident = b"\x7fELF" + bytes((1, 1, 1, 0))
+            entryPoint = FLASH_ORIGIN | 1 if self.outputSections[0][6] else 0
+            f.write(elfHeader.pack(ident, 2, EM_ARM, 1, entryPoint, elfHeader.size, sectionHeadersOffset, 0x05000400,
+                                   elfHeader.size, programHeader.size, len(segments), sectionHeader.size, len(sections) + 1, len(sections)))
+            for segment in segments:
+                f.write(programHeader.pack(*segment))
+            # allocated contents are left as holes (zeros): only the layout matters
+            for section in sections:
+                if section[10] is not None:
+                    f.seek(section[4])
+                    f.write(section[10])
+            f.seek(sectionHeadersOffset)
+            f.write(sectionHeader.pack(0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+            for nameOffset, section in zip(nameOffsets, sections):
+                name, sectionType, flags, addr, sectionOffset, size, link, info, align, entsize, _ = section
+                f.write(sectionHeader.pack(nameOffset, sectionType, flags, addr, sectionOffset, size, link, info, align, entsize))
+
+    def write(self, elfFile, mapFile):
+        self.writeElf(elfFile)
+        self.writeMap(mapFile)
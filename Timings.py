@@ -0,0 +1,144 @@
+import atexit
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+class NullPhase:
+    # returned by phase() while no Timings is active: entering it costs nothing
+    items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        return False
+
+NULL_PHASE = NullPhase()
+
+def cpuTime():
+    # this process and its terminated children (e.g. the nm subprocess or the
+    # workers decoding the debug info)
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+class Phase:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+        self.items = None
+        self.childrenPeak = 0
+
+    def __enter__(self):
+        timings = self.timings
+        self.record = {"name": self.name, "depth": len(timings.stack)}
+        timings.phases.append(self.record)
+        if timings.memory:
+            # the peak of the enclosing phase so far is saved before resetting it
+            peak = tracemalloc.get_traced_memory()[1]
+            if timings.stack:
+                timings.stack[-1].childrenPeak = max(timings.stack[-1].childrenPeak, peak)
+            tracemalloc.reset_peak()
+        timings.stack.append(self)
+        self.cpuStart = cpuTime()
+        self.wallStart = time.perf_counter()
+        return self
+
+    def __exit__(self, *excInfo):
+        wall = time.perf_counter() - self.wallStart
+        cpu = cpuTime() - self.cpuStart
+        timings = self.timings
+        timings.stack.pop()
+        self.record["wall"] = wall
+        self.record["cpu"] = cpu
+        self.record["items"] = self.items
+        if timings.memory:
+            peak = max(self.childrenPeak, tracemalloc.get_traced_memory()[1])
+            self.record["peak"] = peak
+            if timings.stack:
+                timings.stack[-1].childrenPeak = max(timings.stack[-1].childrenPeak, peak)
+        return False
+
+class Timings:
+    # the instance collecting the phases, None when timings are off
+    active = None
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.phases = []
+        self.stack = []
+        self.startedTracemalloc = False
+        self.outType = 'table'
+        self.outFile = None
+
+    @classmethod
+    def addArguments(cls, parser):
+        parser.add_argument("--timings", help="report wall and cpu time and items of every phase", action='store_true', default=False)
+        parser.add_argument("--profile", help="like --timings, with the peak of the traced memory of every phase", action='store_true', default=False)
+        parser.add_argument("--timings-type", help="timings report type (default: table)", choices=['table', 'json'], default='table')
+        parser.add_argument("--timings-out", help="timings report file (default: stderr)", default=None, metavar='FILE')
+
+    @classmethod
+    def fromArguments(cls, args):
+        if not args.timings and not args.profile:
+            return None
+        timings = cls(memory=args.profile)
+        timings.outType = args.timings_type
+        timings.outFile = args.timings_out
+        timings.start()
+        # scripts may leave with sys.exit(), the report is written anyway
+        atexit.register(timings.report)
+        return timings
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.startedTracemalloc = True
+        Timings.active = self
+
+    def stop(self):
+        Timings.active = None
+        if self.startedTracemalloc:
+            tracemalloc.stop()
+            self.startedTracemalloc = False
+
+    def toDict(self):
+        return {"memory": self.memory, "phases": self.phases}
+
+    def toJson(self, indent=None):
+        return json.dumps(self.toDict(), indent=indent)
+
+    def writeTable(self, file2out):
+        nameLen = max([2 * phase["depth"] + len(phase["name"]) for phase in self.phases] + [16,])
+        header = "%-*s %10s %10s %10s" % (nameLen, "phase", "wall(s)", "cpu(s)", "items")
+        if self.memory:
+            header += " %12s" % "peak(KiB)"
+        print(header, file=file2out)
+        for phase in self.phases:
+            if "wall" not in phase:
+                # still running (e.g. the report is written from inside a phase)
+                continue
+            line = "%-*s %10.3f %10.3f %10s" % (nameLen, "  " * phase["depth"] + phase["name"], phase["wall"], phase["cpu"],
+                                              "" if phase["items"] is None else phase["items"])
+            if self.memory:
+                line += " %12d" % (phase["peak"] >> 10)
+            print(line, file=file2out)
+
+    def report(self):
+        self.stop()
+        file2out = sys.stderr if self.outFile is None else open(self.outFile, "w")
+        try:
+            if 'json' == self.outType:
+                print(self.toJson(indent=1), file=file2out)
+            else:
+                self.writeTable(file2out)
+        finally:
+            if file2out is not sys.stderr:
+                file2out.close()
+
+def phase(name):
+    timings = Timings.active
+    if timings is None:
+        return NULL_PHASE
+    return Phase(timings, name)
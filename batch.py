@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+from Firmware import Firmware
+from AnalysisCache import AnalysisCache
+from LayoutEngine import SECTION_CLASSES
+
+def readManifest(manifestFile):
+    pairs = []
+    with open(manifestFile, "r") as f:
+        for line in f:
+            fields = line.split("#")[0].split()
+            if fields:
+                pairs.append((fields[0], fields[1] if len(fields) > 1 else None))
+    return pairs
+
+def expandPatterns(patterns):
+    pairs = []
+    for pattern in patterns:
+        for elfFile in sorted(glob.glob(pattern)) or [pattern]:
+            mapFile = os.path.splitext(elfFile)[0] + ".map"
+            pairs.append((elfFile, mapFile if os.path.isfile(mapFile) else None))
+    return pairs
+
+def analyse(job):
+    index, elfFile, mapFile, symbols, useCache = job
+    result = {"index": index, "elf": elfFile, "map": mapFile}
+    try:
+        if not os.path.isfile(elfFile):
+            raise FileNotFoundError("%s does not exist" % elfFile)
+        # pool workers cannot have children, so debug info is decoded in-process
+        with Firmware(elfFile, mapFile, jobs=1, cache=AnalysisCache() if useCache else None) as firmware:
+            memConf = firmware.regions
+            MemLayout = firmware.layout(True).usage
+            regions = {}
+            for regionName, usage in MemLayout.items():
+                regions[regionName] = dict(usage)
+                regions[regionName]["Length"] = memConf[regionName]["Length"]
+            if symbols:
+                if mapFile is None:
+                    raise ValueError("map file is required to retrieve the symbols")
+                for regionName in regions:
+                    regions[regionName]["Symbols"] = 0
+                    regions[regionName]["SymbolsSize"] = 0
+                for regionName, count, size in firmware.symbolTable.filter(fill=False).groupBy("region"):
+                    if regionName in regions:
+                        regions[regionName]["Symbols"] = count
+                        regions[regionName]["SymbolsSize"] = size
+        result["regions"] = regions
+    except Exception as e:
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+    return result
+
+class JsonReport:
+    def __init__(self, file2out):
+        self.file2out = file2out
+        self.count = 0
+        file2out.write("[")
+
+    def emit(self, result):
+        self.file2out.write(("\n" if 0 == self.count else ",\n") + json.dumps(result))
+        self.file2out.flush()
+        self.count += 1
+
+    def close(self):
+        self.file2out.write("\n]\n")
+
+class CsvReport:
+    def __init__(self, file2out, symbols):
+        self.file2out = file2out
+        self.columns = ["elf", "map", "region"] + list(SECTION_CLASSES + ("Tot",)) + ["Length"]
+        if symbols:
+            self.columns += ["Symbols", "SymbolsSize"]
+        self.columns.append("error")
+        self.writer = csv.writer(file2out)
+        self.writer.writerow(self.columns)
+
+    def emit(self, result):
+        rows = []
+        if "error" in result:
+            rows.append({"error": result["error"]})
+        else:
+            for regionName, usage in result["regions"].items():
+                row = dict(usage)
+                row["region"] = regionName
+                rows.append(row)
+        for row in rows:
+            row["elf"] = result["elf"]
+            row["map"] = result["map"] or ""
+            self.writer.writerow([row.get(column, "") for column in self.columns])
+        self.file2out.flush()
+
+    def close(self):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--manifest", help="file listing an elf file and (optionally) its map file per line", default=None)
+    parser.add_argument("-j", "--jobs", help="worker processes (default: one per core)", type=int, default=None)
+    parser.add_argument("-t", "--type", help="report type (default: json)", choices=['json', 'csv'], default='json')
+    parser.add_argument("-o", "--out", help="out file (default: stdout)", type=argparse.FileType('w'), default=sys.stdout)
+    parser.add_argument("-s", "--symbols", help="also count the symbols of every region (map files needed)", action='store_true')
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    parser.add_argument("elffiles", help="elf files or glob patterns; map files are looked up replacing the extension with .map", nargs='*')
+
+    args = parser.parse_args()
+
+    pairs = []
+    if args.manifest:
+        try:
+            pairs += readManifest(args.manifest)
+        except OSError:
+            print("Error occurred! Does %s file exist?" % args.manifest)
+            sys.exit(2)
+    pairs += expandPatterns(args.elffiles)
+    if not pairs:
+        parser.error("no elf file to analyse")
+
+    if args.type == 'csv':
+        report = CsvReport(args.out, args.symbols)
+    else:
+        report = JsonReport(args.out)
+
+    jobs = [(index, elfFile, mapFile, args.symbols, not args.no_cache) for index, (elfFile, mapFile) in enumerate(pairs)]
+    failures = 0
+    with multiprocessing.Pool(args.jobs) as pool:
+        for result in pool.imap_unordered(analyse, jobs):
+            if "error" in result:
+                failures += 1
+                print("%s: %s" % (result["elf"], result["error"]), file=sys.stderr)
+            report.emit(result)
+    report.close()
+
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
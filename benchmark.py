@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baseline.json")
+SIZES = ("1k", "10k", "100k")
+
+# the modules the tools import on first use (pyelftools, the symbol modules of
+# Firmware) are imported by the setup of the stages, before the clock starts, so
+# the stages time the work and not the loading of the modules
+def warmUp(*modules):
+    for module in modules:
+        importlib.import_module(module)
+
+# every stage runs in a child process of its own, so its peak memory is measured alone
+def stageRegions(elfFile, mapFile):
+    from RegionRetriever import RegionRetriever
+    warmUp("elftools.elf.elffile")
+    return lambda: RegionRetriever(elfFile, mapFile).GetRegions()
+
+def stageRegionsFromMap(elfFile, mapFile):
+    from RegionRetriever import RegionRetriever
+    return lambda: RegionRetriever(None, mapFile).GetRegions()
+
+def stageSymbols(elfFile, mapFile):
+    from RegionRetriever import RegionRetriever
+    from MetadataRetriever import MetadataRetriever
+    regions = RegionRetriever(elfFile, mapFile).GetRegions()
+    return lambda: MetadataRetriever(elfFile, mapFile, regions).retreiveSymbolTable()
+
+def stageLayout(elfFile, mapFile):
+    from LayoutEngine import LayoutEngine
+    from RegionRetriever import RegionRetriever
+    regions = RegionRetriever(elfFile, mapFile).GetRegions()
+    return lambda: LayoutEngine(elfFile).compute(regions, True)
+
+def stageScript(module, *args, modules=()):
+    def setup(elfFile, mapFile):
+        script = __import__(module)
+        warmUp(*modules)
+        argv = [module + ".py"] + [arg.format(elf=elfFile, map=mapFile, out=os.devnull) for arg in args]
+
+        def run():
+            sys.argv = argv
+            script.main()
+        return run
+    return setup
+
+FIRMWARE_MODULES = ("elftools.elf.elffile", "SymbolIndex", "RegionRetriever", "MetadataRetriever")
+
+STAGES = {
+    "regions": stageRegions,
+    "regions-map": stageRegionsFromMap,
+    "symbols": stageSymbols,
+    "layout": stageLayout,
+    "dissect": stageScript("dissect", "--no-cache", "{elf}", "{map}", modules=FIRMWARE_MODULES),
+    "dissectSvg": stageScript("dissectSvg", "--no-cache", "{elf}", "{map}", "RAM0", "{out}", modules=FIRMWARE_MODULES + ("SymbolTable",)),
+}
+
+def runStage(stage, elfFile, mapFile):
+    run = STAGES[stage](elfFile, mapFile)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds}))
+
+def measure(stage, elfFile, mapFile):
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--run-stage", stage, elfFile, mapFile],
+                               stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__)))
+    output = process.stdout.read()
+    process.stdout.close()
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in KiB on Linux
+        peakKiB = usage.ru_maxrss
+    else:
+        process.wait()
+        peakKiB = None
+    if process.returncode != 0:
+        raise RuntimeError("stage %s failed on %s" % (stage, elfFile))
+    return json.loads(output)["seconds"], peakKiB
+
+def fixture(workDir, size, regions, seed):
+    # fixtures are deterministic, so they are generated once and reused; the
+    # generator runs in a child, to not inflate the peak memory of the next stages
+    base = os.path.join(os.path.abspath(workDir), "synth-%s-r%d-s%d" % (size, regions, seed))
+    elfFile, mapFile = base + ".elf", base + ".map"
+    if not (os.path.isfile(elfFile) and os.path.isfile(mapFile)):
+        os.makedirs(workDir, exist_ok=True)
+        subprocess.check_call([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "synthFirmware.py"),
+                               "-s", size, "-r", str(regions), "--seed", str(seed), elfFile + ".tmp", mapFile + ".tmp"])
+        os.replace(elfFile + ".tmp", elfFile)
+        os.replace(mapFile + ".tmp", mapFile)
+    return elfFile, mapFile
+
+def compare(result, baseline, timeTolerance, memoryTolerance, minSeconds):
+    if baseline is None:
+        return "new"
+    if result["seconds"] > baseline["seconds"] * (1 + timeTolerance) and result["seconds"] - baseline["seconds"] > minSeconds:
+        return "SLOWER"
+    if result["peakKiB"] and baseline.get("peakKiB") and result["peakKiB"] > baseline["peakKiB"] * (1 + memoryTolerance):
+        return "BIGGER"
+    return "ok"
+
+def main():
+    if len(sys.argv) == 5 and "--run-stage" == sys.argv[1]:
+        runStage(*sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="time every stage on synthetic firmware and check the results against a baseline")
+    parser.add_argument("-s", "--sizes", help="comma separated symbol counts (default: %s)" % ",".join(SIZES), default=",".join(SIZES))
+    parser.add_argument("-r", "--regions", help="memory regions of the synthetic firmware (default: 4)", type=int, default=4)
+    parser.add_argument("--seed", help="seed of the synthetic firmware (default: 0)", type=int, default=0)
+    parser.add_argument("--stages", help="comma separated stages (default: all of %s)" % ",".join(STAGES), default=",".join(STAGES))
+    parser.add_argument("-n", "--repeat", help="runs per stage, the best one is kept (default: 3)", type=int, default=3)
+    parser.add_argument("-w", "--work-dir", help="directory of the generated fixtures (default: memoryLayout-bench in the temp dir)",
+                        default=os.environ.get("MEMORYLAYOUT_BENCH_DIR") or os.path.join(tempfile.gettempdir(), "memoryLayout-bench"))
+    parser.add_argument("-b", "--baseline", help="baseline file (default: benchmarks/baseline.json)", default=DEFAULT_BASELINE)
+    parser.add_argument("-u", "--update", help="store the results as the new baseline", action='store_true', default=False)
+    parser.add_argument("--time-tolerance", help="allowed slowdown (default: 0.5, i.e. 50%%)", type=float, default=0.5)
+    parser.add_argument("--memory-tolerance", help="allowed peak memory growth (default: 0.2, i.e. 20%%)", type=float, default=0.2)
+    parser.add_argument("--min-seconds", help="slowdowns smaller than this are never regressions (default: 0.25)", type=float, default=0.25)
+    parser.add_argument("-t", "--type", help="output type (default: normal)", choices=['normal', 'json'], default='normal')
+
+    args = parser.parse_args()
+    stages = args.stages.split(",")
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error("unknown stage %s" % stage)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    results = {}
+    rows = []
+    for size in args.sizes.split(","):
+        elfFile, mapFile = fixture(args.work_dir, size, args.regions, args.seed)
+        results[size] = {}
+        for stage in stages:
+            runs = [measure(stage, elfFile, mapFile) for _ in range(max(1, args.repeat))]
+            result = {"seconds": min(run[0] for run in runs), "peakKiB": min(run[1] for run in runs) if runs[0][1] is not None else None}
+            results[size][stage] = result
+            reference = baseline.get(size, {}).get(stage)
+            status = compare(result, reference, args.time_tolerance, args.memory_tolerance, args.min_seconds)
+            rows.append((size, stage, result, reference, status))
+            if 'normal' == args.type:
+                print("%6s %-12s %9.3f s %9s  %s" % (size, stage, result["seconds"],
+                      "%.1f MB" % (result["peakKiB"] / 1024) if result["peakKiB"] else "-",
+                      "%s (%+.0f%%)" % (status, 100 * (result["seconds"] / reference["seconds"] - 1)) if reference else status))
+                sys.stdout.flush()
+
+    if 'json' == args.type:
+        print(json.dumps({"results": results, "status": dict(("%s/%s" % (size, stage), status) for size, stage, _, _, status in rows)}, indent=1))
+
+    if args.update:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        merged = dict(baseline)
+        for size, stageResults in results.items():
+            merged.setdefault(size, {}).update(stageResults)
+        with open(args.baseline, "w") as f:
+            json.dump({"regions": args.regions, "seed": args.seed, "results": merged}, f, indent=1, sort_keys=True)
+            f.write("\n")
+        return
+
+    if any(status in ("SLOWER", "BIGGER") for _, _, _, _, status in rows):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
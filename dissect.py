@@ -1,102 +1,110 @@
 #!/usr/bin/env python3
 
-# is required that the GNU ARM toolchais is in PATH
+# the GNU ARM toolchain is required in PATH only when --nm is used
 
 import argparse
+import csv
+import json
 import sys
-from RegionRetriever import RegionRetriever
-from MetadataRetriever import MetadataRetriever
-
-
-class LineEmitter:
-    def __init__(self, regionStringExtent=16, symbolStringExtent=40, csv=False):
-        charactersForRegion = max(regionStringExtent, 16)
-        charactersForSymbol = max(symbolStringExtent, 40)
-        self.formatStr = "%%%ds %%10s %%12s %%9s %%5s %%%ds %%s" % (charactersForRegion, charactersForSymbol)
-        self.csv = csv
-
-    def emitLine(self, elementlist, file2out):
-        if(True == self.csv):
-            stroutline = ','.join(elementlist)
-        else:
-            stroutline = self.formatStr % tuple(elementlist)
-        file2out.write(stroutline+"\n")
+from Firmware import Firmware
+from AnalysisCache import AnalysisCache
+from SymbolTable import SymbolTable
+from SymbolWriter import OUT_TYPES, COMPRESSIONS, FIELD_NAMES, compressionOf, openOutput, parseFields, makeWriter, writeSymbols
+from Timings import Timings, phase
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("-t", "--type", help="output type (default: normal)", choices=['normal', 'csv'], default='normal')
-    parser.add_argument("-o", "--out", help="out file (default: stdout)", type=argparse.FileType('w'), default=sys.stdout)
+    parser.add_argument("-t", "--type", help="output type (default: normal)", choices=OUT_TYPES, default='normal')
+    parser.add_argument("-o", "--out", help="out file (default: stdout)", default=None)
+    parser.add_argument("-z", "--compress", help="compress the output (default: from the out file extension, .gz or .zst)", choices=list(COMPRESSIONS), default=None)
+    parser.add_argument("-c", "--columns", help="comma separated columns to write (default: all of %s)" % ",".join(FIELD_NAMES), default=None)
     parser.add_argument("-r", "--region", help="memory region to dissect (default: all)", default='all', metavar='REG')
     parser.add_argument("-u", "--uniq", help="filter symbols @address already populated", action='store_true')
     parser.add_argument("-f", "--fill", help="try to guess the *fill* fields", action='store_true')
     parser.add_argument("-l", "--noline", help="remove any line number from files", action='store_true')
+    parser.add_argument("-g", "--group-by", help="print the totals per group instead of the symbols", choices=SymbolTable.GROUP_KEYS, default=None)
     parser.add_argument("-p", "--prefix", help="prefix for nm tool (e.g. arm-none-eabi-, default: \"\")", default='', metavar='PREFIX')
+    parser.add_argument("-n", "--nm", help="read symbols with binutils nm instead of the built-in ELF reader", action='store_true')
+    parser.add_argument("-j", "--jobs", help="processes decoding the debug info (default: one per core)", type=int, default=None)
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    Timings.addArguments(parser)
     parser.add_argument("elffile", help="input elf file")
-    parser.add_argument("mapfile", help="input map file")
+    parser.add_argument("mapfile", help="input map file (not needed when the elf file embeds a .memory_index section)", nargs='?', default=None)
 
     args = parser.parse_args()
-    if args.type == 'csv':
-        csv = True
-    else:
-        csv = False
+    Timings.fromArguments(args)
+    try:
+        fields = parseFields(args.columns) if args.columns else list(FIELD_NAMES)
+    except ValueError as e:
+        parser.error(str(e))
+
+    cache = None if args.no_cache else AnalysisCache()
 
+    firmware = Firmware(args.elffile, args.mapfile, args.prefix, args.nm, args.jobs, cache)
     try:
-        memMapRetriever = RegionRetriever(mapFile=args.mapfile)
+        Regions = firmware.regions
     except:
         print("Error occurred! Does %s file exist?" % args.mapfile)
         sys.exit()
-    Regions = memMapRetriever.GetRegions()
 
-    metadataRetriever = MetadataRetriever(args.elffile, args.mapfile, Regions, args.prefix)
-    symbolList = metadataRetriever.retreiveSymbols()
+    if not firmware.hasSymbols:
+        if args.nm:
+            print("the map file is needed with --nm")
+        else:
+            print("%s has no up to date .memory_index section (see memIndex.py): the map file is needed" % args.elffile)
+        sys.exit()
+
+    symbolTable = firmware.symbolTable
 
     regionNameMaxLen = len(max(Regions.keys(), key=len))
 
-    symbolNameMaxLen = len(max([sym["name"] for sym in symbolList], key=len))
+    symbolNameMaxLen = len(max(symbolTable.strings["name"].strings, key=len))
 
     if "all" != args.region:
         if args.region in Regions.keys():
-            symbolList = [d for d in symbolList if args.region == d["region"]]
+            symbolTable = symbolTable.filter(region=args.region)
         else:
             print("Region %s does not exist in %s" % (args.region, args.elffile))
             sys.exit()
 
-    emitter = LineEmitter(regionNameMaxLen, symbolNameMaxLen, csv)
-
-    fields = [  "Region",
-                "addr(hex)",
-                "addr(dec)",
-                "size(dec)",
-                "type",
-                "symbol",
-                "path"]
-
-    emitter.emitLine(fields, args.out)
-
-    lastaddr = -1
-    for symbol in symbolList:
-        if args.uniq and lastaddr == symbol["addr"]:
-            continue
-        if (not args.fill) and symbol["fill"]:
-            continue
-        if symbol["file"] != "":
-            fileField = symbol["file"]
-            if False == args.noline and symbol["line"] > 0:
-                fileField += ":%d" % symbol["line"]
-        else:
-            fileField = ""
-
-        fields = [  symbol["region"],
-                    "0x%08x" % symbol["addr"],
-                    "%d" % symbol["addr"],
-                    "%d" % symbol["dim"],
-                    "%c" % symbol["attr"],
-                    symbol["name"],
-                    fileField
-        ]
-        emitter.emitLine(fields, args.out)
-        lastaddr = symbol["addr"]
+    try:
+        file2out = openOutput(args.out, args.compress or compressionOf(args.out))
+    except (OSError, ImportError) as e:
+        print("Error occurred! %s" % e)
+        sys.exit()
+
+    try:
+        if args.group_by:
+            with phase("group by") as currentPhase:
+                groups = symbolTable.filter(fill=args.fill, uniq=args.uniq).groupBy(args.group_by)
+                currentPhase.items = len(groups)
+            with phase("output") as currentPhase:
+                if 'csv' == args.type:
+                    writer = csv.writer(file2out, lineterminator="\n")
+                    writer.writerow([args.group_by, "symbols", "size(dec)"])
+                    writer.writerows((groupName or "(none)", count, size) for groupName, count, size in groups)
+                elif 'ndjson' == args.type:
+                    file2out.write("".join(json.dumps({args.group_by: groupName, "symbols": count, "size": size}) + "\n" for groupName, count, size in groups))
+                else:
+                    groupNameMaxLen = max([len(group[0]) for group in groups] + [16,])
+                    formatStr = "%%%ds %%8s %%12s\n" % groupNameMaxLen
+                    file2out.write(formatStr % (args.group_by, "symbols", "size(dec)"))
+                    file2out.write("".join(formatStr % (groupName or "(none)", count, size) for groupName, count, size in groups))
+                currentPhase.items = len(groups)
+            return
+
+        with phase("filter") as currentPhase:
+            symbolTable = symbolTable.filter(fill=args.fill, uniq=args.uniq)
+            currentPhase.items = len(symbolTable)
+
+        with phase("output") as currentPhase:
+            writer = makeWriter(args.type, file2out, fields, args.noline, regionNameMaxLen, symbolNameMaxLen)
+            writer.writeHeader()
+            currentPhase.items = writeSymbols(writer, symbolTable, args.noline)
+    finally:
+        if file2out is not sys.stdout:
+            file2out.close()
 
 
 if __name__ == '__main__':
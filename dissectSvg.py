@@ -1,69 +1,63 @@
 import argparse
 import sys
-import svgwrite
-from RegionRetriever import RegionRetriever
-from MetadataRetriever import MetadataRetriever
+from Firmware import Firmware
+from AnalysisCache import AnalysisCache
+from RegionRenderer import writeSvg, writeHtml
+from Timings import Timings, phase
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-p", "--prefix", help="prefix for nm tool (e.g. arm-none-eabi-, default: \"\")", default='', metavar='PREFIX')
+    parser.add_argument("-n", "--nm", help="read symbols with binutils nm instead of the built-in ELF reader", action='store_true')
+    parser.add_argument("-j", "--jobs", help="processes decoding the debug info (default: one per core)", type=int, default=None)
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    parser.add_argument("-t", "--type", help="output type (default: html for .html outputs, svg otherwise)", choices=['svg', 'html'], default=None)
+    parser.add_argument("-s", "--scale", help="bytes per pixel (default: 160, or more to stay within --max-height)", type=float, default=None, metavar='BYTES')
+    parser.add_argument("--max-height", help="maximum height in pixels of the whole region (default: 4096)", type=float, default=4096, metavar='PIXELS')
+    parser.add_argument("--min-pixels", help="symbols smaller than this are merged with the nearby ones of the same object file (default: 1)", type=float, default=1.0, metavar='PIXELS')
+    parser.add_argument("--max-levels", help="levels of detail embedded in the html output, each one doubling the resolution; past the last one the symbols stay merged, and every level adds up to a block per symbol to the file (default: 8)", type=int, default=8, metavar='N')
+    Timings.addArguments(parser)
     parser.add_argument("elffile", help="input elf file")
     parser.add_argument("mapfile", help="input map file")
     parser.add_argument("region", help="memory region to dissect")
     parser.add_argument("output", help="output file")
 
     args = parser.parse_args()
+    Timings.fromArguments(args)
 
+    cache = None if args.no_cache else AnalysisCache()
+
+    firmware = Firmware(args.elffile, args.mapfile, args.prefix, args.nm, args.jobs, cache)
     try:
-        memMapRetriever = RegionRetriever(mapFile=args.mapfile)
+        Regions = firmware.regions
     except:
         print("Error occurred! Does %s file exist?" % args.mapfile)
         sys.exit()
-    Regions = memMapRetriever.GetRegions()
 
-    metadataRetriever = MetadataRetriever(args.elffile, args.mapfile, Regions, args.prefix)
-    symbolList = metadataRetriever.retreiveSymbols()
+    symbolTable = firmware.symbolTable
 
     if args.region in Regions.keys():
-        symbolList = [d for d in symbolList if args.region == d["region"]]
+        symbolList = symbolTable.filter(region=args.region, fill=False)
     else:
         print("Region %s does not exist in %s" % (args.region, args.elffile))
         sys.exit()
 
-    regionOffset = Regions[args.region]["Origin"]
-
-    div = 160
-    heigth = Regions[args.region]["Length"]/div
-    width = (heigth)/8
-
-    bgColor = svgwrite.rgb(75, 75, 85, '%')
-
-    fgColor = [ svgwrite.rgb(70, 60, 50, '%'),
-                svgwrite.rgb(60, 70, 50, '%')]
-    
-    dwg = svgwrite.Drawing(args.output, profile='full', size=(str(width), str(heigth)))
-    dwg.add(dwg.rect((0, 0), (width, heigth), fill=bgColor))
-
-    fgColorVectorDim = len(fgColor)
-    fgColorIndex = 0
-    lastaddr = -1
-    for symbol in symbolList:
-        if lastaddr == symbol["addr"]:
-            continue
-        if symbol["fill"]:
-            continue
-
-        symbolY = (symbol["addr"] - regionOffset) / div
+    region = Regions[args.region]
 
-        dwg.add(dwg.rect((0, symbolY), (width, symbol["dim"]/div), fill=fgColor[fgColorIndex]))
+    # the original 160 bytes per pixel, unless the region would be taller than --max-height
+    div = args.scale
+    if div is None:
+        div = max(160, region["Length"] / args.max_height)
 
-        lastaddr = symbol["addr"]
-        fgColorIndex += 1
-        if fgColorIndex >= fgColorVectorDim:
-            fgColorIndex = 0
+    outType = args.type
+    if outType is None:
+        outType = 'html' if args.output.lower().endswith(('.html', '.htm')) else 'svg'
+    with phase("render " + outType) as currentPhase:
+        if 'html' == outType:
+            currentPhase.items = writeHtml(args.output, args.region, region, symbolList, div, args.min_pixels, maxLevels=max(1, args.max_levels))
+        else:
+            currentPhase.items = writeSvg(args.output, region, symbolList, div, args.min_pixels)
 
-    dwg.save()
-    
 if __name__ == '__main__':
     main()
\ No newline at end of file
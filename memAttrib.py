@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import sys
+from Firmware import Firmware
+from AnalysisCache import AnalysisCache
+from AttributionEngine import AttributionResult
+from Timings import Timings, phase
+
+TREE_LEVELS = ("region", "library", "object", "section")
+
+def pruneTree(nodes, depth, limit):
+    # the first depth levels, at most limit children per node (the others summed
+    # in a "(N others)" node); objects not in a library go to "(none)"
+    pruned = {}
+    for index, (name, node) in enumerate(nodes.items()):
+        if limit and index == limit and len(nodes) > limit + 1:
+            others = list(nodes.values())[limit:]
+            pruned["(%d others)" % len(others)] = {"size": sum(other["size"] for other in others)}
+            break
+        name = name or "(none)"
+        pruned[name] = {"size": node["size"]}
+        if depth > 1 and "children" in node:
+            pruned[name]["children"] = pruneTree(node["children"], depth - 1, limit)
+    return pruned
+
+def treeRows(nodes, path=(), leaves=False):
+    # (path, size) of every node (of the leaves only), depth first
+    for name, node in nodes.items():
+        if not leaves or "children" not in node:
+            yield path + (name,), node["size"]
+        if "children" in node:
+            yield from treeRows(node["children"], path + (name,), leaves)
+
+def main():
+    parser = argparse.ArgumentParser(description="attribute the input sections of the map file to archives, objects, sections and memory regions")
+    parser.add_argument("-t", "--type", help="output type (default: normal)", choices=['normal', 'csv', 'json'], default='normal')
+    parser.add_argument("-o", "--out", help="out file (default: stdout)", type=argparse.FileType('w'), default=sys.stdout)
+    parser.add_argument("-g", "--group-by", help="the totals per group, one column per region (default: library)",
+                        choices=AttributionResult.GROUP_KEYS, default='library')
+    parser.add_argument("-T", "--tree", help="print the region, library, object, section tree instead of the groups", action='store_true')
+    parser.add_argument("-d", "--depth", help="levels of the tree (default: 4)", type=int, choices=range(1, 5), default=4)
+    parser.add_argument("-n", "--limit", help="at most N children per node of the tree (default: 0, all)", type=int, default=0, metavar='N')
+    parser.add_argument("-r", "--region", help="report only REG memory region (repeatable)", action='append', default=None, metavar='REG')
+    parser.add_argument("-j", "--jobs", help="processes parsing the map file (default: one per core)", type=int, default=None)
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    Timings.addArguments(parser)
+    parser.add_argument("elffile", help="input elf file")
+    parser.add_argument("mapfile", help="input map file")
+
+    args = parser.parse_args()
+    Timings.fromArguments(args)
+
+    cache = None if args.no_cache else AnalysisCache()
+
+    firmware = Firmware(args.elffile, args.mapfile, jobs=args.jobs, cache=cache)
+    try:
+        Regions = firmware.regions
+        attribution = firmware.attribution
+    except:
+        print("Error occurred! Does %s file exist?" % args.mapfile)
+        sys.exit()
+
+    for regionName in args.region or ():
+        if regionName not in Regions:
+            print("unknown region %s (choose among %s)" % (regionName, ", ".join(Regions)))
+            sys.exit()
+
+    if args.tree:
+        with phase("tree") as currentPhase:
+            tree = attribution.tree()
+            if args.region:
+                tree = dict((regionName, node) for regionName, node in tree.items() if regionName in args.region)
+            tree = pruneTree(tree, args.depth, args.limit)
+            currentPhase.items = len(tree)
+        with phase("output"):
+            if 'json' == args.type:
+                json.dump(tree, args.out, indent=1)
+                args.out.write("\n")
+            elif 'csv' == args.type:
+                writer = csv.writer(args.out, lineterminator="\n")
+                writer.writerow(TREE_LEVELS[:args.depth] + ("size(dec)",))
+                writer.writerows(path + ("",) * (args.depth - len(path)) + (size,) for path, size in treeRows(tree, leaves=True))
+            else:
+                rows = [("  " * (len(path) - 1) + path[-1], size) for path, size in treeRows(tree)]
+                nameLen = max([len(name) for name, _ in rows] + [16])
+                for name, size in rows:
+                    print("%-*s %10d B" % (nameLen, name, size), file=args.out)
+        return
+
+    with phase("group by") as currentPhase:
+        regionNames = [regionName for regionName in Regions if regionName in (args.region or Regions)]
+        if args.region is None and "unknown" in attribution.strings["region"].indexes and "unknown" not in Regions:
+            # input sections out of every region
+            regionNames.append("unknown")
+        groups = attribution.groupBy(args.group_by) if args.region is None else None
+        perRegion = dict((regionName, dict((groupName, size) for groupName, _, size in attribution.groupBy(args.group_by, regionName)))
+                         for regionName in regionNames)
+        if groups is None:
+            # the totals of the regions reported
+            totals = {}
+            for regionName in regionNames:
+                for groupName, entries, size in attribution.groupBy(args.group_by, regionName):
+                    total = totals.setdefault(groupName, [0, 0])
+                    total[0] += entries
+                    total[1] += size
+            groups = sorted(((groupName, entries, size) for groupName, (entries, size) in totals.items()), key=lambda group: (-group[2], group[0]))
+        currentPhase.items = len(groups)
+
+    with phase("output"):
+        if 'json' == args.type:
+            json.dump([{args.group_by: groupName, "entries": entries, "size": size,
+                        "regions": dict((regionName, perRegion[regionName][groupName]) for regionName in regionNames if groupName in perRegion[regionName])}
+                       for groupName, entries, size in groups], args.out, indent=1)
+            args.out.write("\n")
+        elif 'csv' == args.type:
+            writer = csv.writer(args.out, lineterminator="\n")
+            writer.writerow([args.group_by, "entries"] + regionNames + ["Total"])
+            writer.writerows([groupName, entries] + [perRegion[regionName].get(groupName, 0) for regionName in regionNames] + [size]
+                             for groupName, entries, size in groups)
+        else:
+            groupNameLen = max([len(groupName) for groupName, _, _ in groups] + [16])
+            columnLens = [max(len(regionName), 12) for regionName in regionNames]
+            print("%-*s %8s %s %12s" % (groupNameLen, args.group_by, "entries", " ".join("%*s" % (columnLen, regionName) for columnLen, regionName in zip(columnLens, regionNames)), "Total"), file=args.out)
+            for groupName, entries, size in groups:
+                print("%-*s %8d %s %12d" % (groupNameLen, groupName or "(none)", entries, " ".join("%*d" % (columnLen, perRegion[regionName].get(groupName, 0))
+                      for columnLen, regionName in zip(columnLens, regionNames)), size), file=args.out)
+
+if __name__ == '__main__':
+    main()
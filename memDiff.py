@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import sys
+from AnalysisCache import AnalysisCache
+from BuildDiff import BuildDiff, loadBuild
+
+TABLES = ('regions', 'sections', 'files', 'symbols')
+
+def sortRows(rows, order):
+    if 'growth' == order:
+        rows.sort(key=lambda row: (-row["delta"], row["name"]))
+    elif 'abs' == order:
+        rows.sort(key=lambda row: (-abs(row["delta"]), row["name"]))
+    elif 'name' == order:
+        rows.sort(key=lambda row: row["name"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--type", help="output type (default: normal)", choices=['normal', 'csv', 'json'], default='normal')
+    parser.add_argument("-o", "--out", help="out file (default: stdout)", type=argparse.FileType('w'), default=sys.stdout)
+    parser.add_argument("-s", "--sort", help="order of the rows (default: growth)", choices=['growth', 'abs', 'name', 'none'], default='growth')
+    parser.add_argument("-c", "--compare", help="tables to report (default: all)", choices=TABLES, action='append', default=None)
+    parser.add_argument("-a", "--all", help="report also unchanged entries", action='store_true')
+    parser.add_argument("-n", "--limit", help="report at most N rows per table", type=int, default=None, metavar='N')
+    parser.add_argument("-j", "--jobs", help="processes decoding the debug info (default: one per core)", type=int, default=None)
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    parser.add_argument("oldelf", help="elf file of the old build")
+    parser.add_argument("oldmap", help="map file of the old build")
+    parser.add_argument("newelf", help="elf file of the new build")
+    parser.add_argument("newmap", help="map file of the new build")
+
+    args = parser.parse_args()
+    cache = None if args.no_cache else AnalysisCache()
+
+    try:
+        oldBuild = loadBuild(args.oldelf, args.oldmap, cache, args.jobs)
+        newBuild = loadBuild(args.newelf, args.newmap, cache, args.jobs)
+    except OSError as e:
+        print("Error occurred! Does %s file exist?" % e.filename)
+        sys.exit()
+
+    buildDiff = BuildDiff(oldBuild, newBuild)
+    methods = {'regions': buildDiff.regionDeltas, 'sections': buildDiff.sectionDeltas,
+               'files': buildDiff.fileDeltas, 'symbols': buildDiff.symbolDeltas}
+    report = {}
+    for table in args.compare or TABLES:
+        rows = methods[table]()
+        if not args.all:
+            rows = [row for row in rows if "unchanged" != row["status"]]
+        report[table] = sortRows(rows, args.sort)[:args.limit]
+
+    if 'json' == args.type:
+        json.dump(report, args.out, indent=1)
+        args.out.write("\n")
+    elif 'csv' == args.type:
+        writer = csv.writer(args.out)
+        writer.writerow(["table", "name", "old", "new", "delta", "status", "region", "file", "oldName", "oldRegion"])
+        for table, rows in report.items():
+            for row in rows:
+                writer.writerow([table, row["name"], row["old"], row["new"], row["delta"], row["status"],
+                                 row.get("region", ""), row.get("file", ""), row.get("oldName", ""), row.get("oldRegion", "")])
+    else:
+        for table, rows in report.items():
+            args.out.write("%s:\n" % table)
+            args.out.write("%10s %10s %10s %-9s %s\n" % ("delta", "old", "new", "status", "name"))
+            for row in rows:
+                name = row["name"]
+                if "oldName" in row:
+                    name += " (was %s)" % row["oldName"]
+                if "oldRegion" in row:
+                    name += " (%s -> %s)" % (row["oldRegion"], row["region"])
+                args.out.write("%+10d %10d %10d %-9s %s\n" % (row["delta"], row["old"], row["new"], row["status"], name))
+            args.out.write("\n")
+
+if __name__ == '__main__':
+    main()
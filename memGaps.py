@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# the GNU ARM toolchain is required in PATH only when --nm is used
+
+import argparse
+import csv
+import json
+import sys
+from Firmware import Firmware
+from AnalysisCache import AnalysisCache
+from Timings import Timings, phase
+
+def parseSize(text):
+    # decimal or 0x hex, with an optional K or M suffix
+    scale = {"K": 1 << 10, "M": 1 << 20}.get(text[-1:].upper(), 1)
+    if scale != 1:
+        text = text[:-1]
+    return int(text, 0) * scale
+
+def printReports(reports, symbols, file2out):
+    regionNameLen = max([len(name) for name in reports] + [16])
+    print("%-*s          Used      Padding         Free  Holes  Largest free block        Fragm.  Overflow" % (regionNameLen, "Memory region"), file=file2out)
+    for regionName, report in reports.items():
+        print("%*s: %10d B %10d B %10d B %6d  0x%08x %10d B %6.2f%% %8d B" % (regionNameLen, regionName, report["used"], report["padding"],
+              report["free"], report["holes"], report["largestFree"]["addr"], report["largestFree"]["size"],
+              100 * report["fragmentation"], report["overflow"]), file=file2out)
+    if symbols:
+        print("", file=file2out)
+        print("%-*s       Symbols         Fill   Fill gaps  Largest fill  Aliases  Overlaps   Overlapped" % (regionNameLen, "Memory region"), file=file2out)
+        for regionName, report in reports.items():
+            print("%*s: %10d B %10d B %11d %11d B %8d %9d %10d B" % (regionNameLen, regionName, report["symbolBytes"], report["fill"],
+                  report["fillGaps"], report["largestFill"], report["aliases"], report["overlaps"], report["overlapBytes"]), file=file2out)
+
+def printDetails(reports, file2out):
+    for regionName, report in reports.items():
+        if not (report["holeList"] or report["sectionOverlaps"] or report.get("overlapList")):
+            continue
+        print("", file=file2out)
+        print("%s:" % regionName, file=file2out)
+        for hole in report["holeList"]:
+            print("    hole     0x%08x %10d B" % (hole["addr"], hole["size"]), file=file2out)
+        for overlap in report["sectionOverlaps"] + report.get("overlapList", []):
+            print("    overlap  0x%08x %10d B %s over %s" % (overlap["addr"], overlap["size"], overlap["name"], overlap["with"]), file=file2out)
+
+def main():
+    parser = argparse.ArgumentParser(description="report alignment padding, free holes, fragmentation and overlapping ranges of the memory regions")
+    parser.add_argument("-t", "--type", help="output type (default: normal)", choices=['normal', 'csv', 'json'], default='normal')
+    parser.add_argument("-o", "--out", help="out file (default: stdout)", type=argparse.FileType('w'), default=sys.stdout)
+    parser.add_argument("-r", "--region", help="report only REG memory region (repeatable)", action='append', default=None, metavar='REG')
+    parser.add_argument("-v", "--verbose", help="list the holes and the overlapping ranges of every region", action='store_true')
+    parser.add_argument("-n", "--limit", help="list at most N holes and overlaps per region (default: 10, 0 for all)", type=int, default=10, metavar='N')
+    parser.add_argument("-f", "--fit", help="find the smallest hole where a buffer of SIZE bytes fits (e.g. 4096, 0x1000, 4K)", type=parseSize, default=None, metavar='SIZE')
+    parser.add_argument("-a", "--align", help="alignment of the buffer of --fit (default: 4)", type=parseSize, default=4, metavar='ALIGN')
+    parser.add_argument("-p", "--prefix", help="prefix for nm tool (e.g. arm-none-eabi-, default: \"\")", default='', metavar='PREFIX')
+    parser.add_argument("--nm", help="read symbols with binutils nm instead of the built-in ELF reader", action='store_true')
+    parser.add_argument("-j", "--jobs", help="processes decoding the debug info (default: one per core)", type=int, default=None)
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    Timings.addArguments(parser)
+    parser.add_argument("elffile", help="input elf file")
+    parser.add_argument("mapfile", help="input map file (needed for the symbol level analysis, unless the elf file embeds a .memory_index section)", nargs='?', default=None)
+
+    args = parser.parse_args()
+    Timings.fromArguments(args)
+
+    cache = None if args.no_cache else AnalysisCache()
+
+    firmware = Firmware(args.elffile, args.mapfile, args.prefix, args.nm, args.jobs, cache)
+    try:
+        Regions = firmware.regions
+    except:
+        print("elffile must exist and contain '.memory_configuration' section, or at least map file must be provided.", sys.exc_info()[0])
+        sys.exit()
+
+    for regionName in args.region or ():
+        if regionName not in Regions:
+            print("unknown region %s (choose among %s)" % (regionName, ", ".join(Regions)))
+            sys.exit()
+
+    symbolTable = firmware.symbolTable if firmware.hasSymbols else None
+
+    with phase("sweep") as currentPhase:
+        analyzer = firmware.gaps
+        reports = {regionName: analyzer.analyzeRegion(regionName, args.limit or None) for regionName in args.region or Regions}
+        currentPhase.items = sum(len(analyzer.ranges[regionName]) + len(analyzer.symbols[regionName]) for regionName in reports)
+
+    if args.fit is not None:
+        for regionName, report in reports.items():
+            best = analyzer.fit(regionName, args.fit, args.align)
+            report["fit"] = None if best is None else {"addr": best[0], "holeSize": best[1]}
+
+    if 'json' == args.type:
+        json.dump(reports, args.out, indent=1)
+        args.out.write("\n")
+    elif 'csv' == args.type:
+        columns = ["Origin", "Length", "used", "padding", "free", "holes", "overflow", "fragmentation"]
+        if symbolTable is not None:
+            columns += ["symbolBytes", "fill", "fillGaps", "largestFill", "aliases", "overlaps", "overlapBytes"]
+        writer = csv.writer(args.out)
+        writer.writerow(["region"] + columns + ["largestFreeAddr", "largestFreeSize"] + (["fitAddr"] if args.fit is not None else []))
+        for regionName, report in reports.items():
+            row = [regionName] + ["%.4f" % report[column] if "fragmentation" == column else report[column] for column in columns]
+            row += ["0x%08x" % report["largestFree"]["addr"], report["largestFree"]["size"]]
+            if args.fit is not None:
+                row.append("" if report["fit"] is None else "0x%08x" % report["fit"]["addr"])
+            writer.writerow(row)
+    else:
+        printReports(reports, symbolTable is not None, args.out)
+        if args.verbose:
+            printDetails(reports, args.out)
+        if args.fit is not None:
+            print("", file=args.out)
+            print("a buffer of %d B aligned to %d fits:" % (args.fit, args.align), file=args.out)
+            for regionName, report in reports.items():
+                fit = report["fit"]
+                if fit is None:
+                    print("%16s: nowhere" % regionName, file=args.out)
+                else:
+                    print("%16s: at 0x%08x (hole of %d B)" % (regionName, fit["addr"], fit["holeSize"]), file=args.out)
+
+if __name__ == '__main__':
+    main()
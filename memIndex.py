@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# the GNU ARM toolchain is required in PATH only when --nm or --objcopy is used
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from Firmware import Firmware
+from AnalysisCache import AnalysisCache
+from SymbolIndex import SymbolIndex, SECTION_NAME, embed
+from Timings import Timings, phase
+
+def main():
+    parser = argparse.ArgumentParser(description="embed the regions, the section totals and the symbols of an elf/map pair in a %s section of the elf, "
+                                                 "the other tools then need neither the map file nor nm" % SECTION_NAME)
+    parser.add_argument("-o", "--out", help="output elf file (default: update elffile)", default=None)
+    parser.add_argument("-b", "--blob", help="only write the index to BLOB, e.g. for objcopy --add-section", default=None)
+    parser.add_argument("--objcopy", help="embed the index with binutils objcopy instead of the built-in ELF writer", action='store_true')
+    parser.add_argument("-p", "--prefix", help="prefix for nm and objcopy tools (e.g. arm-none-eabi-, default: \"\")", default='', metavar='PREFIX')
+    parser.add_argument("-n", "--nm", help="read symbols with binutils nm instead of the built-in ELF reader", action='store_true')
+    parser.add_argument("-j", "--jobs", help="processes decoding the debug info (default: one per core)", type=int, default=None)
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    Timings.addArguments(parser)
+    parser.add_argument("elffile", help="input elf file")
+    parser.add_argument("mapfile", help="input map file")
+
+    args = parser.parse_args()
+    Timings.fromArguments(args)
+
+    cache = None if args.no_cache else AnalysisCache()
+
+    # the index is built from the elf/map pair, never from an index already embedded
+    firmware = Firmware(args.elffile, args.mapfile, args.prefix, args.nm, args.jobs, cache, useIndex=False)
+    try:
+        firmware.regions
+    except:
+        print("Error occurred! Does %s file exist?" % args.mapfile)
+        sys.exit()
+
+    index = SymbolIndex.fromFirmware(firmware)
+    firmware.close()
+    with phase("index") as currentPhase:
+        blob = index.toBytes()
+        currentPhase.items = len(index.symbolTable)
+
+    if args.blob is not None:
+        with open(args.blob, 'wb') as f:
+            f.write(blob)
+        return
+
+    out = args.out or args.elffile
+    with phase("embed") as currentPhase:
+        currentPhase.items = len(blob)
+        if args.objcopy:
+            fd, blobFile = tempfile.mkstemp(suffix=".bin")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(blob)
+                subprocess.run([args.prefix + "objcopy", "--remove-section", SECTION_NAME, "--add-section", "%s=%s" % (SECTION_NAME, blobFile),
+                                "--set-section-flags", "%s=contents,readonly" % SECTION_NAME, args.elffile, out], check=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print("Error occurred! %s" % e)
+                sys.exit(1)
+            finally:
+                os.remove(blobFile)
+        else:
+            try:
+                embed(args.elffile, out, blob)
+            except (OSError, ValueError) as e:
+                print("Error occurred! %s" % e)
+                sys.exit(1)
+
+    if SymbolIndex.fromElf(out) is None:
+        print("Error occurred! the index of %s cannot be read back" % out)
+        sys.exit(1)
+    print("%s: %d regions, %d symbols, %d B index" % (out, len(index.regions), len(index.symbolTable), len(blob)))
+
+if __name__ == '__main__':
+    main()
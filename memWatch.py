@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import selectors
+import socket
+import sys
+import time
+from LayoutWatcher import LayoutWatcher
+from memoryLayout import size2string
+from Timings import Timings
+
+class UpdateServer:
+    # every client connected to the socket receives the updates as JSON lines,
+    # starting from the current state
+    def __init__(self, unixPath=None, port=None):
+        self.selector = selectors.DefaultSelector()
+        self.listeners = []
+        self.clients = []
+        self.unixPath = unixPath
+        if unixPath is not None:
+            if os.path.exists(unixPath):
+                os.remove(unixPath)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(unixPath)
+            self.listeners.append(listener)
+        if port is not None:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(("127.0.0.1", port))
+            self.listeners.append(listener)
+        for listener in self.listeners:
+            listener.listen()
+            listener.setblocking(False)
+            self.selector.register(listener, selectors.EVENT_READ)
+        self.lastLine = None
+
+    def wait(self, timeout):
+        if not self.listeners:
+            time.sleep(timeout)
+            return
+        for key, _ in self.selector.select(timeout):
+            try:
+                client, _ = key.fileobj.accept()
+            except OSError:
+                continue
+            client.settimeout(1.0)
+            self.clients.append(client)
+            if self.lastLine is not None:
+                self.send(client, self.lastLine)
+
+    def send(self, client, line):
+        try:
+            client.sendall(line)
+        except OSError:
+            # slow or gone clients are dropped
+            client.close()
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def broadcast(self, update):
+        self.lastLine = (json.dumps(update) + "\n").encode("utf-8")
+        for client in list(self.clients):
+            self.send(client, self.lastLine)
+
+    def close(self):
+        for sock in self.clients + self.listeners:
+            sock.close()
+        if self.unixPath is not None and os.path.exists(self.unixPath):
+            os.remove(self.unixPath)
+
+def printUpdate(update, first, limit, file2out):
+    regionNameLen = max([len(x) for x in update["regions"]] + [16,])
+    if first:
+        print("%s loaded in %.1f ms" % (", ".join(update["files"]), 1000 * update["elapsed"]), file=file2out)
+    else:
+        changes = "%d sections changed" % len(update["sections"]) if update["sections"] else "no section changed"
+        print("[%s] %s changed, updated in %.1f ms: %s" % (time.strftime("%H:%M:%S", time.localtime(update["time"])),
+              ", ".join(os.path.basename(fileName) for fileName in update["files"]), 1000 * update["elapsed"], changes), file=file2out)
+    print("%-*s          Total        Delta  Region Size  %%age Used" % (regionNameLen, "Memory region"), file=file2out)
+    for regionName, region in update["regions"].items():
+        delta = "" if first or 0 == region["delta"]["Tot"] else "%+10d B" % region["delta"]["Tot"]
+        print("%*s: %10d B %12s %s    %6.2f%%" % (regionNameLen, regionName, region["Tot"], delta, size2string(region["Length"]),
+              100 * region["Tot"] / region["Length"] if region["Length"] else 0), file=file2out)
+    if not first:
+        for table in ("objects", "symbols"):
+            rows = sorted(update[table], key=lambda row: (-abs(row["delta"]), row["name"]))[:limit]
+            if rows:
+                print("%s:" % table, file=file2out)
+                for row in rows:
+                    name = row["name"] + (" (%s)" % row["file"] if "file" in row else "")
+                    print("%+10d %-9s %s" % (row["delta"], row["status"], name), file=file2out)
+    print("", file=file2out)
+    file2out.flush()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-ro', "--extract-rodata", help="unbundle .rodata infos", action='store_true', default=False)
+    parser.add_argument('-s', "--symbols", help="report the objects and symbols that changed (needs the map file)", action='store_true', default=False)
+    parser.add_argument('-i', "--interval", help="seconds between two checks of the files (default: 0.1)", type=float, default=0.1)
+    parser.add_argument('-t', "--type", help="output type (default: normal)", choices=['normal', 'json'], default='normal')
+    parser.add_argument('-n', "--limit", help="report at most N objects and N symbols (default: 20)", type=int, default=20, metavar='N')
+    parser.add_argument("--socket", help="also push the updates, as JSON lines, to the clients of this unix socket", default=None, metavar='PATH')
+    parser.add_argument("--port", help="also push the updates, as JSON lines, to the clients of this localhost TCP port", type=int, default=None)
+    Timings.addArguments(parser)
+    parser.add_argument("elffile", help="input elf file")
+    parser.add_argument("mapfile", help="input map file", nargs='?', default=None)
+
+    args = parser.parse_args()
+    Timings.fromArguments(args)
+
+    watcher = LayoutWatcher(args.elffile, args.mapfile, args.extract_rodata, args.symbols)
+    try:
+        update = watcher.load()
+    except Exception:
+        print("elffile must exist and contain '.memory_configuration' section, or at least map file must be provided.", sys.exc_info()[0])
+        sys.exit()
+
+    server = UpdateServer(args.socket, args.port)
+    first = True
+    try:
+        while True:
+            if update is not None:
+                if 'json' == args.type:
+                    print(json.dumps(update), flush=True)
+                else:
+                    printUpdate(update, first, args.limit, sys.stdout)
+                server.broadcast(update)
+                first = False
+            server.wait(args.interval)
+            update = watcher.poll()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == '__main__':
+    main()
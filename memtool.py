@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+# one entry point for all the tools: only the module of the chosen command is
+# imported, so e.g. "memtool.py regions" starts without loading pyelftools
+
+import argparse
+import importlib
+import os
+import sys
+
+# command: (module, description)
+COMMANDS = {"regions":   ("regions", "list the memory regions"),
+            "memregion": ("memRegion", "print the memory regions of a map file"),
+            "layout":    ("memoryLayout", "usage of the memory regions per section class"),
+            "dissect":   ("dissect", "list the symbols of the memory regions"),
+            "svg":       ("dissectSvg", "draw a memory region as svg or html"),
+            "gaps":      ("memGaps", "padding, free holes and fragmentation of the memory regions"),
+            "attrib":    ("memAttrib", "usage per library, object and input section of the memory regions"),
+            "index":     ("memIndex", "embed the regions, the section totals and the symbols in the elf"),
+            "symbolize": ("symbolize", "resolve addresses to region, symbol and file:line"),
+            "why":       ("whyLinked", "explain why symbols and objects are linked in"),
+            "diff":      ("memDiff", "compare the memory usage of two builds"),
+            "watch":     ("memWatch", "report the memory usage at every new build"),
+            "batch":     ("batch", "memory usage of many builds"),
+            "synth":     ("synthFirmware", "write a synthetic elf/map pair")}
+
+def main():
+    parser = argparse.ArgumentParser(description="memory usage of a firmware from its elf and map files",
+                                     epilog="commands:\n" + "\n".join("  %-10s %s" % (command, description) for command, (_, description) in COMMANDS.items()) +
+                                            "\n\n\"%(prog)s COMMAND --help\" describes the arguments of a command",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", help="the tool to run", choices=list(COMMANDS), metavar='COMMAND')
+    parser.add_argument("args", help="arguments of the command", nargs=argparse.REMAINDER)
+
+    args = parser.parse_args()
+    module = importlib.import_module(COMMANDS[args.command][0])
+    # the command parses its own arguments, with its name in the usage
+    sys.argv = ["%s %s" % (os.path.basename(sys.argv[0]), args.command)] + args.args
+    module.main()
+
+if __name__ == '__main__':
+    main()
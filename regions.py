@@ -1,4 +1,6 @@
-from RegionRetriever import RegionRetriever
+from Firmware import Firmware
+from AnalysisCache import AnalysisCache
+from Timings import Timings
 import argparse
 import sys
 
@@ -6,14 +8,17 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("elffile", help="input elf file")
     parser.add_argument("mapfile", help="input map file", nargs='?', default=None)
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    Timings.addArguments(parser)
 
     args = parser.parse_args()
+    Timings.fromArguments(args)
     try:
-        memMapRetriever = RegionRetriever(args.elffile, args.mapfile)
+        regions = Firmware(args.elffile, args.mapfile, cache=None if args.no_cache else AnalysisCache()).regions
     except:
         print("elffile must exist and contain '.memory_configuration' section, or at least map file must be provided.", sys.exc_info()[0])
     else:
-        print(*memMapRetriever.GetRegions().keys(), sep = "\n") 
+        print(*regions.keys(), sep = "\n") 
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# the GNU ARM toolchain is required in PATH only when --nm is used
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import socketserver
+import sys
+from Firmware import Firmware
+from AnalysisCache import AnalysisCache
+from Symbolizer import Symbolizer
+from Timings import Timings, phase
+
+# addresses are hex numbers with the 0x prefix, or bare ones of 8 digits or more
+# (the words of a stack dump), anywhere in the lines of a crash log
+ADDRESS_RE = re.compile(r"\b0[xX]([0-9a-fA-F]+)\b|\b([0-9a-fA-F]{8,16})\b")
+BATCH = 65536
+
+def parseAddresses(text):
+    return [int(hexPrefixed or bare, 16) for hexPrefixed, bare in ADDRESS_RE.findall(text)]
+
+def locationOf(result):
+    location = result["file"]
+    if location and result["line"] > 0:
+        location += ":%d" % result["line"]
+    return location
+
+def formatResults(results, outType):
+    if 'csv' == outType:
+        # symbols and paths may hold commas or quotes
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerows(["0x%08x" % result["addr"], result["region"], result["symbol"],
+                          "" if result["offset"] is None else "%d" % result["offset"], locationOf(result)] for result in results)
+        return out.getvalue()
+    lines = []
+    for result in results:
+        if 'json' == outType:
+            lines.append(json.dumps(result))
+        else:
+            symbol = "??" if result["offset"] is None else "%s+0x%x" % (result["symbol"], result["offset"])
+            lines.append("0x%08x %16s %s %s" % (result["addr"], result["region"], symbol, locationOf(result)))
+    return "".join(line + "\n" for line in lines)
+
+def symbolizeStream(symbolizer, lines, outType, file2out):
+    # the addresses are resolved in batches, so big inputs stream through
+    addresses = []
+    count = 0
+    for line in lines:
+        addresses.extend(parseAddresses(line))
+        if len(addresses) >= BATCH:
+            file2out.write(formatResults(symbolizer.resolve(addresses), outType))
+            count += len(addresses)
+            addresses = []
+    if addresses:
+        file2out.write(formatResults(symbolizer.resolve(addresses), outType))
+        count += len(addresses)
+    return count
+
+def serve(symbolizer, outType, unixPath, port):
+    # every client writes lines of addresses and reads back the resolved ones;
+    # whatever has been received is resolved at once, so bulk requests go in batches
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            pending = b""
+            while True:
+                data = self.request.recv(1 << 16)
+                if not data:
+                    break
+                pending += data
+                complete, _, pending = pending.rpartition(b"\n")
+                if complete:
+                    addresses = parseAddresses(complete.decode("utf-8", "replace"))
+                    self.request.sendall(formatResults(symbolizer.resolve(addresses), outType).encode("utf-8"))
+            if pending:
+                addresses = parseAddresses(pending.decode("utf-8", "replace"))
+                self.request.sendall(formatResults(symbolizer.resolve(addresses), outType).encode("utf-8"))
+
+    if unixPath is not None:
+        if os.path.exists(unixPath):
+            os.remove(unixPath)
+        server = socketserver.ThreadingUnixStreamServer(unixPath, Handler)
+    else:
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if unixPath is not None and os.path.exists(unixPath):
+            os.remove(unixPath)
+
+def main():
+    parser = argparse.ArgumentParser(description="resolve addresses (e.g. of a crash log) to region, symbol, offset and file:line")
+    parser.add_argument("-t", "--type", help="output type (default: normal)", choices=['normal', 'csv', 'json'], default='normal')
+    parser.add_argument("-o", "--out", help="out file (default: stdout)", type=argparse.FileType('w'), default=sys.stdout)
+    parser.add_argument("-i", "--input", help="file with the addresses, - for stdin (default: stdin, unless addresses are given)", default=None, metavar='FILE')
+    parser.add_argument("-L", "--lines", help="report the line of the address itself, from the line table of the debug info", action='store_true')
+    parser.add_argument("-p", "--prefix", help="prefix for nm tool (e.g. arm-none-eabi-, default: \"\")", default='', metavar='PREFIX')
+    parser.add_argument("-n", "--nm", help="read symbols with binutils nm instead of the built-in ELF reader", action='store_true')
+    parser.add_argument("-j", "--jobs", help="processes decoding the debug info (default: one per core)", type=int, default=None)
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    parser.add_argument("--socket", help="keep the index loaded and serve the clients of this unix socket", default=None, metavar='PATH')
+    parser.add_argument("--port", help="keep the index loaded and serve the clients of this localhost TCP port", type=int, default=None)
+    Timings.addArguments(parser)
+    parser.add_argument("elffile", help="input elf file")
+    parser.add_argument("mapfile", help="input map file")
+    parser.add_argument("address", help="addresses to resolve", nargs='*')
+
+    args = parser.parse_args()
+    Timings.fromArguments(args)
+
+    cache = None if args.no_cache else AnalysisCache()
+
+    firmware = Firmware(args.elffile, args.mapfile, args.prefix, args.nm, args.jobs, cache)
+    try:
+        Regions = firmware.regions
+    except:
+        print("Error occurred! Does %s file exist?" % args.mapfile)
+        sys.exit()
+
+    symbolTable = firmware.symbolTable
+    lineRanges = firmware.lineRanges if args.lines else None
+
+    with phase("index") as currentPhase:
+        symbolizer = Symbolizer(symbolTable, Regions, lineRanges, firmware.thumb)
+        currentPhase.items = len(symbolizer)
+    firmware.close()
+
+    if args.socket is not None or args.port is not None:
+        serve(symbolizer, args.type, args.socket, args.port)
+        return
+
+    with phase("resolve") as currentPhase:
+        if args.address and args.input is None:
+            currentPhase.items = symbolizeStream(symbolizer, args.address, args.type, args.out)
+        elif args.input is None or '-' == args.input:
+            currentPhase.items = symbolizeStream(symbolizer, sys.stdin, args.type, args.out)
+        else:
+            with open(args.input) as f:
+                currentPhase.items = symbolizeStream(symbolizer, f, args.type, args.out)
+
+
+if __name__ == '__main__':
+    main()
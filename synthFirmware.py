@@ -0,0 +1,29 @@
+import argparse
+from SyntheticFirmware import SyntheticFirmware
+
+def symbolCount(text):
+    # 1000, 10k, 1m
+    text = text.lower()
+    for suffix, factor in (("k", 1000), ("m", 1000000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+def main():
+    parser = argparse.ArgumentParser(description="write a synthetic elf file and the matching map file")
+    parser.add_argument("-s", "--symbols", help="number of symbols, k and m suffixes allowed (default: 1k)", type=symbolCount, default=1000)
+    parser.add_argument("-r", "--regions", help="memory regions, the first one is the flash (default: 4)", type=int, default=4)
+    parser.add_argument("--seed", help="seed of the random generator (default: 0)", type=int, default=0)
+    parser.add_argument("--no-dwarf", help="do not write debug info", action='store_true', default=False)
+    parser.add_argument("--no-memory-configuration", help="do not write the .memory_configuration section", action='store_true', default=False)
+    parser.add_argument("elffile", help="output elf file")
+    parser.add_argument("mapfile", help="output map file")
+
+    args = parser.parse_args()
+
+    firmware = SyntheticFirmware(args.symbols, args.regions, args.seed, dwarf=not args.no_dwarf,
+                                 memoryConfiguration=not args.no_memory_configuration)
+    firmware.write(args.elffile, args.mapfile)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# the GNU ARM toolchain is required in PATH only when --nm is used
+
+import argparse
+import json
+import sys
+from Firmware import Firmware
+from AnalysisCache import AnalysisCache
+from Timings import Timings, phase
+
+def printReport(report, attributable, limit, file2out):
+    if "symbol" == report["kind"]:
+        print("symbol %s (%d B) defined in %s" % (report["name"], report["size"], report["object"]), file=file2out)
+    else:
+        print("object %s (%d B)" % (report["name"], report["size"]), file=file2out)
+    referencedBy = report["referencedBy"]
+    print("referenced by %d objects%s" % (len(referencedBy), ":" if referencedBy else ""), file=file2out)
+    for referencer in referencedBy[:limit]:
+        print("    %s (%s)" % (referencer["object"], ", ".join(referencer["symbols"])), file=file2out)
+    if limit and len(referencedBy) > limit:
+        print("    ...", file=file2out)
+    print("linked in through:", file=file2out)
+    for depth, step in enumerate(report["chain"]):
+        print("    %s%s%s" % ("  " * depth, step["object"], " -> " + step["symbol"] if step["symbol"] else ""), file=file2out)
+    if attributable is not None:
+        print("pulls in %d B in %d objects, %d B only through it:" % (attributable["reachable"], attributable["reachableObjects"],
+              attributable["exclusive"]), file=file2out)
+        for objectName, size in attributable["exclusiveObjects"][:limit]:
+            print("%12d %s" % (size, objectName), file=file2out)
+    print("", file=file2out)
+
+def main():
+    parser = argparse.ArgumentParser(description="explain why symbols and objects are linked in, from the cross reference table of the map file")
+    parser.add_argument("-t", "--type", help="output type (default: normal)", choices=['normal', 'json'], default='normal')
+    parser.add_argument("-o", "--out", help="out file (default: stdout)", type=argparse.FileType('w'), default=sys.stdout)
+    parser.add_argument("-n", "--limit", help="report at most N rows per list (default: 20, 0 for all)", type=int, default=20, metavar='N')
+    parser.add_argument("-p", "--prefix", help="prefix for nm tool (e.g. arm-none-eabi-, default: \"\")", default='', metavar='PREFIX')
+    parser.add_argument("--nm", help="read symbols with binutils nm instead of the built-in ELF reader", action='store_true')
+    parser.add_argument("-j", "--jobs", help="processes decoding the debug info (default: one per core)", type=int, default=None)
+    parser.add_argument("--no-cache", help="do not use the cache of parsed results", action='store_true', default=False)
+    Timings.addArguments(parser)
+    parser.add_argument("elffile", help="input elf file")
+    parser.add_argument("mapfile", help="input map file")
+    parser.add_argument("name", help="symbols or objects to explain (default: the objects pulling in the most)", nargs='*')
+
+    args = parser.parse_args()
+    Timings.fromArguments(args)
+
+    cache = None if args.no_cache else AnalysisCache()
+
+    firmware = Firmware(args.elffile, args.mapfile, args.prefix, args.nm, args.jobs, cache)
+    try:
+        firmware.regions
+    except:
+        print("Error occurred! Does %s file exist?" % args.mapfile)
+        sys.exit()
+
+    graph = firmware.crossReference
+
+    if 0 == len(graph):
+        print("%s has no cross reference table (link with -Wl,--cref)" % args.mapfile)
+        sys.exit()
+
+    limit = args.limit or None
+    with phase("queries") as currentPhase:
+        if not args.name:
+            rows = graph.topAttributable(limit)
+            if 'json' == args.type:
+                print(json.dumps([{"object": name, "size": size, "exclusive": exclusive} for name, size, exclusive in rows], indent=1), file=args.out)
+            else:
+                print("%12s %12s %s" % ("exclusive", "size", "object"), file=args.out)
+                for name, size, exclusive in rows:
+                    print("%12d %12d %s" % (exclusive, size, name), file=args.out)
+            currentPhase.items = len(rows)
+            return
+
+        reports = []
+        for name in args.name:
+            report = graph.whyLinked(name)
+            if report is None:
+                print("%s is not in the cross reference table of %s" % (name, args.mapfile), file=sys.stderr)
+                continue
+            attributable = graph.attributable(name) if "object" == report["kind"] else None
+            if 'json' == args.type:
+                if attributable is not None:
+                    report["attributable"] = attributable
+                reports.append(report)
+            else:
+                printReport(report, attributable, limit, args.out)
+        if 'json' == args.type:
+            print(json.dumps(reports, indent=1), file=args.out)
+        currentPhase.items = len(args.name)
+
+
+if __name__ == '__main__':
+    main()